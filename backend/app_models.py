@@ -44,7 +44,7 @@ class ChatResponse(BaseModel):
 class QuizRequest(BaseModel):
     topic: str = Field(..., example="NCC General")
     difficulty: str = Field(..., example="Medium")
-    numQuestions: int = Field(..., example=5, ge=1, le=10)
+    numQuestions: int = Field(..., example=5, ge=1, le=30)
     timedMode: Optional[bool] = Field(False, description="Enable timed mode with countdown")
     timeLimit: Optional[int] = Field(None, description="Time limit in seconds (if timed mode)")
     custom_topic: Optional[str] = Field(None, description="Custom topic name")
@@ -122,6 +122,27 @@ class QuizTopicsResponse(BaseModel):
     topics: List[str]
     topic_stats: Optional[dict] = None
 
+class ExamBlueprintRequest(BaseModel):
+    blueprint: Dict[str, float] = Field(..., example={"Drill": 20, "Map Reading": 15, "NCC General": 65},
+                                        description="Topic weights (percentages or any relative weights)")
+    total_questions: int = Field(50, ge=1, le=200)
+    difficulties: Optional[List[str]] = Field(None, description="Restrict to these difficulty levels")
+    timedMode: Optional[bool] = Field(False, description="Enable timed mode with countdown")
+    timeLimit: Optional[int] = Field(None, description="Time limit in seconds (if timed mode)")
+
+class QuestionBankSearchResponse(BaseModel):
+    query: str
+    results: List[QuizQuestion]
+    total_results: int
+
+class SimilarQuestion(BaseModel):
+    question: QuizQuestion
+    similarity: float = Field(..., description="Estimated Jaccard similarity (0-1)")
+
+class SimilarQuestionsResponse(BaseModel):
+    query: str
+    results: List[SimilarQuestion]
+
 class QuizAnalyticsResponse(BaseModel):
     total_quizzes: int
     average_score: float
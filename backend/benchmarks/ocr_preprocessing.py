@@ -0,0 +1,115 @@
+"""
+OCR preprocessing benchmark for NCC ABYAS
+Compares Tesseract on raw full-resolution colour pages (the old path) against the preprocessing
+pipeline in services/ocr_service.py (grayscale, downscale, binarize, deskew), reporting pages per
+second and word accuracy against known ground truth.
+
+Pages are synthetic scans: handbook-style text drawn on a tinted background, with noise and a
+slight rotation. Pass --pdf to also time a real scanned PDF (needs poppler; no accuracy figure).
+
+Run from the backend directory:
+    python -m benchmarks.ocr_preprocessing --pages 5
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import difflib
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+from services.ocr_service import preprocess_image, OCR_PDF_DPI  # noqa: E402
+
+SAMPLE_LINES = [
+    "The National Cadet Corps was raised on 15 July 1948 under the NCC Act.",
+    "The motto of the NCC is Unity and Discipline, adopted in 1978.",
+    "Cadets attend annual training camps to build leadership and character.",
+    "Map reading covers grid references, contours and the service protractor.",
+    "Drill teaches smartness, alertness and the habit of instant obedience.",
+    "First aid begins with the ABC of airway, breathing and circulation.",
+    "Weapon training is conducted only under the supervision of instructors.",
+    "The NCC flag has red, navy blue and light blue bands for the three wings.",
+]
+# A4 at 300 DPI, the size a phone scan or flatbed typically produces
+PAGE_SIZE = (2480, 3508)
+
+
+def _font(size: int):
+    for path in ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/Library/Fonts/Arial.ttf", "C:\\Windows\\Fonts\\arial.ttf"):
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def synthetic_page(seed: int) -> Tuple[Image.Image, str]:
+    """A noisy, tinted, slightly rotated page and the text printed on it"""
+    rng = random.Random(seed)
+    background = (rng.randint(215, 245), rng.randint(205, 235), rng.randint(180, 215))
+    page = Image.new("RGB", PAGE_SIZE, background)
+    draw = ImageDraw.Draw(page)
+    font = _font(44)
+    lines = [rng.choice(SAMPLE_LINES) for _ in range(30)]
+    for i, line in enumerate(lines):
+        draw.text((180, 200 + i * 100), line, fill=(rng.randint(20, 70),) * 3, font=font)
+    noise = Image.effect_noise(PAGE_SIZE, 40).convert("RGB")
+    page = Image.blend(page, noise, 0.15)
+    page = page.rotate(rng.uniform(-3, 3), resample=Image.BICUBIC, expand=True, fillcolor=background)
+    return page, "\n".join(lines)
+
+
+def word_accuracy(expected: str, actual: str) -> float:
+    return difflib.SequenceMatcher(None, expected.split(), actual.split(), autojunk=False).ratio()
+
+
+def run(label: str, pages: List[Tuple[Image.Image, str]], preprocess: bool) -> None:
+    import pytesseract
+    elapsed = 0.0
+    accuracy = 0.0
+    for image, expected in pages:
+        start = time.perf_counter()
+        prepared = preprocess_image(image) if preprocess else image
+        text = pytesseract.image_to_string(prepared)
+        elapsed += time.perf_counter() - start
+        if expected:
+            accuracy += word_accuracy(expected, text)
+    scored = sum(1 for _, expected in pages if expected)
+    accuracy_text = f"{accuracy / scored:6.1%}" if scored else "   n/a"
+    print(f"{label:<28} {len(pages) / elapsed:8.2f} pages/s   {elapsed / len(pages):7.2f} s/page   accuracy {accuracy_text}")
+
+
+def pdf_pages(pdf_path: str, dpi: int, grayscale: bool, limit: int) -> List[Tuple[Image.Image, str]]:
+    from pdf2image import convert_from_path
+    return [(image, "") for image in convert_from_path(pdf_path, dpi=dpi, grayscale=grayscale, last_page=limit)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5, help="synthetic pages to OCR")
+    parser.add_argument("--pdf", help="scanned PDF to time as well")
+    args = parser.parse_args()
+
+    if shutil.which("tesseract") is None:
+        print("tesseract is not installed; install it to run this benchmark")
+        return 1
+
+    pages = [synthetic_page(seed) for seed in range(args.pages)]
+    print(f"Synthetic scans: {args.pages} pages at {PAGE_SIZE[0]}x{PAGE_SIZE[1]}")
+    run("raw colour (before)", pages, preprocess=False)
+    run("preprocessed (after)", pages, preprocess=True)
+
+    if args.pdf:
+        print(f"\n{args.pdf}: first {args.pages} pages")
+        run("200 DPI colour (before)", pdf_pages(args.pdf, 200, False, args.pages), preprocess=False)
+        run(f"{OCR_PDF_DPI} DPI gray + preprocess (after)", pdf_pages(args.pdf, OCR_PDF_DPI, True, args.pages), preprocess=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Handbook transfer benchmark for NCC ABYAS
+Bytes served per reading session before and after conditional/range support on /api/pdf/view.
+
+Before: every visit downloads the whole PDF (no validators to revalidate against, no ranges).
+After: the first visit loads the way PDF.js does with range support (the first chunk, the
+trailer/xref at the end, then the chunks holding the pages read); later visits revalidate
+with If-None-Match and get 304 Not Modified.
+
+Run from the backend directory:
+    python -m benchmarks.pdf_transfer --visits 5 --pages-read 10
+    python -m benchmarks.pdf_transfer --synthetic-mb 12    # if the local handbook is a stub
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import FileResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from services.http_conditional import conditional_file_response  # noqa: E402
+from services.handbook_index import HANDBOOK_PATH  # noqa: E402
+
+# PDF.js default rangeChunkSize
+PDFJS_CHUNK_BYTES = 65536
+
+
+def build_app(path: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before")
+    async def before():
+        return FileResponse(path, media_type="application/pdf")
+
+    @app.get("/after")
+    async def after(request: Request):
+        return conditional_file_response(request, path, media_type="application/pdf")
+
+    return app
+
+
+def before_session(client: TestClient, visits: int) -> int:
+    served = 0
+    for _ in range(visits):
+        served += len(client.get("/before").content)
+    return served
+
+
+def after_session(client: TestClient, size: int, visits: int, pages_read: int, seed: int) -> int:
+    rng = random.Random(seed)
+    served = 0
+    # First visit: probe, then fetch the chunks PDF.js needs
+    probe = client.get("/after", headers={"Range": f"bytes=0-{PDFJS_CHUNK_BYTES - 1}"})
+    assert probe.status_code in (200, 206), probe.status_code
+    etag = probe.headers["etag"]
+    served += len(probe.content)
+    chunks = max(1, -(-size // PDFJS_CHUNK_BYTES))
+    wanted = {chunks - 1} | {rng.randrange(chunks) for _ in range(pages_read)}
+    wanted.discard(0)
+    for chunk in sorted(wanted):
+        start = chunk * PDFJS_CHUNK_BYTES
+        end = min(start + PDFJS_CHUNK_BYTES, size) - 1
+        response = client.get("/after", headers={"Range": f"bytes={start}-{end}", "If-Range": etag})
+        assert response.status_code == 206, response.status_code
+        served += len(response.content)
+    # Revisits: the cached copy is still current
+    for _ in range(visits - 1):
+        response = client.get("/after", headers={"If-None-Match": etag})
+        assert response.status_code == 304, response.status_code
+        served += len(response.content)
+    return served
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=HANDBOOK_PATH, help="PDF to serve (default: the handbook)")
+    parser.add_argument("--synthetic-mb", type=float, help="serve a random file of this size instead")
+    parser.add_argument("--visits", type=int, default=5, help="visits per session")
+    parser.add_argument("--pages-read", type=int, default=10, help="pages read on the first visit")
+    args = parser.parse_args()
+
+    path = args.file
+    if args.synthetic_mb:
+        handle, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(handle, 'wb') as f:
+            f.write(os.urandom(int(args.synthetic_mb * 1024 * 1024)))
+    try:
+        size = os.path.getsize(path)
+        client = TestClient(build_app(path))
+        before = before_session(client, args.visits)
+        after = after_session(client, size, args.visits, args.pages_read, seed=1)
+    finally:
+        if args.synthetic_mb:
+            os.remove(path)
+
+    print(f"File: {size / 1024 / 1024:.2f} MB, {args.visits} visits, {args.pages_read} pages read")
+    print(f"before: {before / 1024 / 1024:8.2f} MB served per session")
+    print(f"after:  {after / 1024 / 1024:8.2f} MB served per session ({after / before:.1%} of before)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,33 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from routers.chat import router as chat_router
 from routers.auth import router as auth_router
-from routers.quiz import router as quiz_router
+from routers.quiz import router as quiz_router, NCC_TOPICS, DIFFICULTY_CONFIG
 from routers.syllabus import router as syllabus_router
 from routers.pdf import router as pdf_router
 from routers.video import router as videos_router
 from routers.progress import router as progress_router
+from routers.jobs import router as jobs_router
+from services.ai_service import ai_quiz_service
+from services.question_pool import question_pool
+from services.retrieval_service import retrieval_service
+from services.handbook_index import handbook_index
+from services.handbook_search import handbook_search
+from services.page_render_service import page_render_service
+from services.pdf_service import pdf_service
+from services.chapter_slice_service import chapter_slice_service
+from services.ocr_service import ocr_service
+from services.job_service import job_service
+from services.upload_spool import purge_stale_spool_files, UploadSizeLimitMiddleware
 
 app = FastAPI(title="NCC ABYAS Backend", version="2.0.0")
 
-# Configure CORS
+# Refuse oversized uploads from their Content-Length before the body is spooled
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Configure CORS (added last so it wraps every other middleware's responses too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -35,6 +51,37 @@ app.include_router(pdf_router, prefix="/api")  # Enable PDF API
 app.include_router(videos_router, prefix="/api")  # Enable videos API
 app.include_router(videos_router, prefix="")  # Also enable videos API at root
 app.include_router(progress_router, prefix="/api/progress")  # Add progress API
+app.include_router(jobs_router, prefix="/api")  # Background document-processing jobs
+
+
+async def _warm_up_indexes():
+    await asyncio.to_thread(handbook_index.load)
+    # Chapter PDFs are cut by a background job once per handbook version
+    chapter_slice_service.ensure_current(pdf_service.get_chapter_page_mapping())
+    await asyncio.to_thread(handbook_search.ensure_built)
+    await retrieval_service.ensure_built()
+    await page_render_service.prerender(page_render_service.popular_pages(fallback=pdf_service.get_chapter_start_pages()))
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Keep the standard-topic quiz pool topped up in the background
+    question_pool.start_refiller(ai_quiz_service, NCC_TOPICS, list(DIFFICULTY_CONFIG))
+    # Map the handbook page index (re-extracting only if the PDF changed), then build the
+    # handbook search and chat retrieval indexes from it, then prerender popular page images,
+    # all off the request path
+    app.state.retrieval_warmup = asyncio.create_task(_warm_up_indexes())
+    # Workers for queued document-processing jobs
+    job_service.start()
+    purge_stale_spool_files()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await question_pool.stop_refiller()
+    await job_service.stop()
+    ocr_service.shutdown()
+    page_render_service.shutdown()
 
 
 @app.get("/")
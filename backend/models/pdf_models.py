@@ -15,10 +15,12 @@ class PDFPageResponse(BaseModel):
     page_number: int
     total_pages: int
     content_url: str  # URL to the PDF content for that page
+    image_url: Optional[str] = None  # Rendered page image (append ?width= to size it)
 
 class PDFSearchRequest(BaseModel):
     query: str = Field(..., min_length=1, description="Search query for PDF content")
     page_range: Optional[List[int]] = Field(None, description="Search within specific page range")
+    top_k: Optional[int] = Field(None, ge=1, le=50, description="Maximum number of results (default PDF_SEARCH_TOP_K)")
 
 class PDFSearchResult(BaseModel):
     page_number: int
@@ -1,80 +1,149 @@
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse
 from app_models import ChatRequest, ChatResponse
-from services.ai_service import AIQuizService
-import io
-from PyPDF2 import PdfReader
-from PIL import Image
-import pytesseract
+from services.ai_service import get_ai_quiz_service
+from services.chat_cache import get_chat_cache
+from services.retrieval_service import get_retrieval_service
+from services.resilience import CircuitOpenError
+from services.ocr_service import get_ocr_service, OCRQueueFullError
+from services.upload_spool import spool_upload, UploadTooLargeError
+import json
 
 router = APIRouter()
 
-# Use the same Gemini AI service as quiz, but for chat
-ai_service = AIQuizService()
+# Use the same Gemini AI service as quiz, but for chat (shares its concurrency limit)
+ai_service = get_ai_quiz_service()
+chat_cache = get_chat_cache()
+retrieval_service = get_retrieval_service()
+ocr_service = get_ocr_service()
+
+
+async def _build_chat_prompt(message: str) -> str:
+    """Chat prompt grounded on the top-k syllabus/handbook passages for the question"""
+    passages = await retrieval_service.retrieve(message)
+    if not passages:
+        return f"You are an expert NCC (National Cadet Corps) assistant. Answer the following user question in a clear, helpful, and concise way.\n\nUser: {message}\n\nAssistant:"
+    context = retrieval_service.format_context(passages)
+    return (
+        "You are an expert NCC (National Cadet Corps) assistant. Answer the following user question in a clear, helpful, and concise way.\n"
+        "Use the reference passages from the NCC syllabus and Cadet Handbook below when they are relevant, "
+        "and cite the page you used like (p. 45). If they do not cover the question, answer from general NCC knowledge.\n\n"
+        f"Reference passages:\n{context}\n\nUser: {message}\n\nAssistant:"
+    )
+
+
+def build_upload_prompt(file_name: str, extracted_text: str = None, message: str = None) -> str:
+    """Prompt for a question about an uploaded file (shared with the document job runner)"""
+    if extracted_text:
+        prompt = f"You are an expert NCC (National Cadet Corps) assistant. The user uploaded a file named '{file_name}' with the following extracted content:\n\n{extracted_text}\n\n"
+    else:
+        # fallback to raw bytes as text
+        prompt = f"You are an expert NCC (National Cadet Corps) assistant. The user uploaded a file named '{file_name}'. Unable to extract readable text."
+    if message and message.strip():
+        prompt += f"User's question: {message.strip()}\n\nAssistant:"
+    else:
+        prompt += "Assistant:"
+    return prompt
+
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
+    cached_reply = chat_cache.get(request.message)
+    if cached_reply is not None:
+        return ChatResponse(reply=cached_reply)
     if ai_service.model_error or not ai_service.model:
         raise HTTPException(status_code=503, detail=f"AI model unavailable: {ai_service.model_error}")
     try:
-        prompt = f"You are an expert NCC (National Cadet Corps) assistant. Answer the following user question in a clear, helpful, and concise way.\n\nUser: {request.message}\n\nAssistant:"
-        response = ai_service.model.generate_content(prompt)
-        reply = response.text.strip() if hasattr(response, 'text') else str(response)
+        prompt = await _build_chat_prompt(request.message)
+        reply = (await ai_service.generate_text(prompt)).strip()
+        chat_cache.put(request.message, reply)
         return ChatResponse(reply=reply)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"AI chat temporarily unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI chat error: {str(e)}")
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Stream the chat reply as Server-Sent Events.
+    Emits `data: {"delta": ...}` per chunk, then an `event: done` with the full reply
+    (or `event: error`). Generation stops as soon as the client disconnects.
+    """
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+    cached_reply = chat_cache.get(request.message)
+    if cached_reply is None and (ai_service.model_error or not ai_service.model):
+        raise HTTPException(status_code=503, detail=f"AI model unavailable: {ai_service.model_error}")
+
+    async def event_stream():
+        if cached_reply is not None:
+            yield _sse_event({"delta": cached_reply})
+            yield _sse_event({"reply": cached_reply}, event="done")
+            return
+        reply_parts = []
+        chunks = None
+        try:
+            # Retrieval failures surface as an `error` event, like generation failures
+            chunks = ai_service.stream_text(await _build_chat_prompt(request.message))
+            async for text in chunks:
+                if await http_request.is_disconnected():
+                    return
+                reply_parts.append(text)
+                yield _sse_event({"delta": text})
+            reply = "".join(reply_parts).strip()
+            chat_cache.put(request.message, reply)
+            yield _sse_event({"reply": reply}, event="done")
+        except Exception as e:
+            yield _sse_event({"detail": f"AI chat error: {str(e)}"}, event="error")
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/chat/cache/stats")
+async def chat_cache_stats():
+    """Hit/miss counters and size of the chat answer cache"""
+    return chat_cache.stats()
+
+@router.get("/chat/ocr/stats")
+async def chat_ocr_stats():
+    """OCR process pool queue and timeout counters"""
+    return ocr_service.stats()
+
 # File upload chat endpoint
 @router.post("/chat/upload")
 async def chat_upload_endpoint(file: UploadFile = File(...), message: str = Form(None)):
     if ai_service.model_error or not ai_service.model:
         raise HTTPException(status_code=503, detail=f"AI model unavailable: {ai_service.model_error}")
     try:
-        file_content = await file.read()
-        file_name = file.filename
-        extracted_text = None
-        # PDF extraction with OCR fallback
-        if file.content_type == "application/pdf":
-            try:
-                pdf_reader = PdfReader(io.BytesIO(file_content))
-                extracted_text = "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
-                if not extracted_text.strip():
-                    # OCR fallback for scanned PDFs
-                    from pdf2image import convert_from_bytes
-                    images = convert_from_bytes(file_content)
-                    ocr_texts = []
-                    for img in images:
-                        ocr_texts.append(pytesseract.image_to_string(img))
-                    extracted_text = "\n".join(ocr_texts)
-                    if not extracted_text.strip():
-                        extracted_text = None
-            except Exception as e:
-                extracted_text = None
-        # Image extraction
-        elif file.content_type in ["image/png", "image/jpeg", "image/jpg", "image/gif"]:
-            try:
-                image = Image.open(io.BytesIO(file_content))
-                extracted_text = pytesseract.image_to_string(image)
-                if not extracted_text.strip():
-                    extracted_text = None
-            except Exception as e:
-                extracted_text = None
-        # Fallback: treat as text
-        if extracted_text:
-            prompt = f"You are an expert NCC (National Cadet Corps) assistant. The user uploaded a file named '{file_name}' with the following extracted content:\n\n{extracted_text}\n\n"
-        else:
-            # fallback to raw bytes as text
-            prompt = f"You are an expert NCC (National Cadet Corps) assistant. The user uploaded a file named '{file_name}'. Unable to extract readable text."
-        if message and message.strip():
-            prompt += f"User's question: {message.strip()}\n\nAssistant:"
-        else:
-            prompt += "Assistant:"
-        response = ai_service.model.generate_content(prompt)
-        reply = response.text.strip() if hasattr(response, 'text') else str(response)
+        # Stream to a temp file under the size limit instead of reading the whole upload into memory
+        with await spool_upload(file) as upload:
+            # PDF text with OCR fallback for scans, or image OCR; runs in the OCR process pool
+            extracted_text = await ocr_service.extract_text(upload)
+        prompt = build_upload_prompt(file.filename, extracted_text, message)
+        reply = (await ai_service.generate_text(prompt)).strip()
         return {"reply": reply}
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except OCRQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"AI chat temporarily unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI chat upload error: {str(e)}")
 
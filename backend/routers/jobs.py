@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import JSONResponse
+from services.ai_service import get_ai_quiz_service
+from services.ocr_service import get_ocr_service
+from services.job_service import get_job_service, Job, JobQueueFullError, STAGE_RUNNING, STAGE_DONE
+from services.upload_spool import spool_upload, SpooledUpload, UploadTooLargeError
+from routers.chat import build_upload_prompt
+
+router = APIRouter()
+
+ai_service = get_ai_quiz_service()
+ocr_service = get_ocr_service()
+job_service = get_job_service()
+
+CHAT_UPLOAD_STAGES = ["extract", "ocr", "generate"]
+
+
+async def _run_chat_upload(job: Job, upload: SpooledUpload, message: str = None) -> dict:
+    """Extract text (OCR for scans and images, cached by content hash), then answer the question about the file"""
+    with upload:
+        pages = await ocr_service.extract_pages(upload, on_stage=job.stage)
+    extracted_text = "\n".join(pages)
+    extracted_text = extracted_text if extracted_text.strip() else None
+
+    job.stage("generate", STAGE_RUNNING)
+    reply = (await ai_service.generate_text(build_upload_prompt(upload.file_name, extracted_text, message))).strip()
+    job.stage("generate", STAGE_DONE)
+    return {"reply": reply, "extracted_characters": len(extracted_text or "")}
+
+
+@router.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...), message: str = Form(None), kind: str = Form("chat_upload")):
+    """
+    Queue document processing for an uploaded file and return the job id immediately.
+    Poll GET /api/jobs/{job_id} for stage progress and the result.
+    """
+    if kind != "chat_upload":
+        raise HTTPException(status_code=400, detail="Unsupported job kind. Use: chat_upload")
+    if ai_service.model_error or not ai_service.model:
+        raise HTTPException(status_code=503, detail=f"AI model unavailable: {ai_service.model_error}")
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        record = job_service.submit(
+            kind,
+            CHAT_UPLOAD_STAGES,
+            lambda job: _run_chat_upload(job, upload, message),
+            meta={"file_name": upload.file_name, "content_type": upload.content_type, "size_bytes": upload.size}
+        )
+    except JobQueueFullError as e:
+        upload.cleanup()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": record["id"], "status": record["status"], "status_url": f"/api/jobs/{record['id']}"},
+        headers={"Location": f"/api/jobs/{record['id']}"}
+    )
+
+
+@router.get("/jobs/stats")
+async def job_stats():
+    """Worker and queue counters"""
+    return job_service.stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, per-stage progress and, once finished, the result or error"""
+    record = job_service.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return record
@@ -2,17 +2,21 @@
 PDF Router for NCC ABYAS
 Provides endpoints for PDF viewing, metadata, and content search.
 """
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import FileResponse
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import Optional
 import logging
 import sys
 import os
+import re
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.pdf_models import PDFMetadata, PDFPageRequest, PDFPageResponse, PDFSearchRequest, PDFSearchResponse
+from models.pdf_models import PDFMetadata, PDFPageResponse, PDFSearchRequest, PDFSearchResponse
 from services.pdf_service import pdf_service
+from services.http_conditional import conditional_file_response
+from services.chapter_slice_service import chapter_slice_service
+from services.page_render_service import page_render_service, PageRenderError, webp_supported
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/pdf", tags=["PDF"])
@@ -46,14 +50,16 @@ async def get_pdf_metadata():
         raise HTTPException(status_code=500, detail="Failed to get PDF metadata")
 
 @router.get("/download")
-async def download_pdf():
-    """Download the complete PDF file."""
+@router.head("/download")
+async def download_pdf(request: Request):
+    """Download the complete PDF file (supports ETag/Last-Modified revalidation and byte ranges)."""
     try:
-        pdf_path = pdf_service.get_pdf_file_path()
-        return FileResponse(
-            path=pdf_path,
-            filename="NCC-Cadet-Handbook.pdf",
-            media_type="application/pdf"
+        return conditional_file_response(
+            request,
+            pdf_service.get_pdf_file_path(),
+            media_type="application/pdf",
+            digest=pdf_service.get_pdf_digest(),
+            headers={"Content-Disposition": 'attachment; filename="NCC-Cadet-Handbook.pdf"'}
         )
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="PDF file not found")
@@ -63,13 +69,14 @@ async def download_pdf():
 
 @router.get("/view")
 @router.head("/view") 
-async def view_pdf():
-    """View the PDF file in browser."""
+async def view_pdf(request: Request):
+    """View the PDF file in browser (supports ETag/Last-Modified revalidation and byte ranges for PDF.js)."""
     try:
-        pdf_path = pdf_service.get_pdf_file_path()
-        return FileResponse(
-            path=pdf_path,
+        return conditional_file_response(
+            request,
+            pdf_service.get_pdf_file_path(),
             media_type="application/pdf",
+            digest=pdf_service.get_pdf_digest(),
             headers={"Content-Disposition": "inline; filename=NCC-Cadet-Handbook.pdf"}
         )
     except FileNotFoundError:
@@ -92,13 +99,42 @@ async def get_page_info(page_number: int):
         logger.error(f"Error getting page info: {e}")
         raise HTTPException(status_code=500, detail="Failed to get page information")
 
+@router.get("/page/{page_number}/image")
+async def get_page_image(
+    request: Request,
+    page_number: int,
+    width: Optional[int] = Query(None, ge=100, le=4000, description="Target width in pixels (rounded up to a cached size)"),
+    format: Optional[str] = Query(None, pattern="^(webp|png)$", description="Image format; defaults to WebP when the client accepts it")
+):
+    """Rendered image of a single handbook page, so clients need not download the whole PDF."""
+    image_format = format or ("webp" if "image/webp" in request.headers.get("accept", "") else "png")
+    if image_format == "webp" and not webp_supported():
+        image_format = "png"
+    try:
+        content = await page_render_service.render(page_number, width, image_format)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PageRenderError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return Response(
+        content=content,
+        media_type=f"image/{image_format}",
+        headers={"Cache-Control": "public, max-age=86400", "Vary": "Accept"}
+    )
+
+@router.get("/render/stats")
+async def page_render_stats():
+    """Page image render and cache counters"""
+    return page_render_service.stats()
+
 @router.post("/search", response_model=PDFSearchResponse)
 async def search_pdf(request: PDFSearchRequest):
     """Search for content within the PDF."""
     try:
         return pdf_service.search_pdf_content(
             query=request.query,
-            page_range=request.page_range
+            page_range=request.page_range,
+            top_k=request.top_k
         )
     except Exception as e:
         logger.error(f"Error searching PDF: {e}")
@@ -108,7 +144,8 @@ async def search_pdf(request: PDFSearchRequest):
 async def search_pdf_get(
     q: str = Query(..., description="Search query"),
     page_start: Optional[int] = Query(None, description="Start page for search range"),
-    page_end: Optional[int] = Query(None, description="End page for search range")
+    page_end: Optional[int] = Query(None, description="End page for search range"),
+    limit: Optional[int] = Query(None, ge=1, le=50, description="Maximum number of results")
 ):
     """Search for content within the PDF (GET method for convenience)."""
     try:
@@ -120,7 +157,8 @@ async def search_pdf_get(
         
         return pdf_service.search_pdf_content(
             query=q,
-            page_range=page_range
+            page_range=page_range,
+            top_k=limit
         )
     except Exception as e:
         logger.error(f"Error searching PDF: {e}")
@@ -157,3 +195,31 @@ async def get_chapter_pages(chapter_title: str):
     except Exception as e:
         logger.error(f"Error getting chapter pages: {e}")
         raise HTTPException(status_code=500, detail="Failed to get chapter page information")
+
+@router.get("/chapter/{chapter_title}/file")
+@router.head("/chapter/{chapter_title}/file")
+async def get_chapter_file(request: Request, chapter_title: str):
+    """A standalone PDF with only this chapter's pages (supports revalidation and byte ranges)."""
+    mapping = pdf_service.get_chapter_page_mapping()
+    if chapter_title not in mapping:
+        raise HTTPException(status_code=404, detail=f"Chapter '{chapter_title}' not found")
+    entry = chapter_slice_service.get(chapter_title, mapping)
+    if entry is None:
+        if chapter_slice_service.is_current(mapping):
+            raise HTTPException(status_code=404, detail=f"Chapter '{chapter_title}' pages are not in this handbook")
+        job_id = chapter_slice_service.ensure_current(mapping)
+        detail = "Chapter files are being prepared; try again shortly"
+        if job_id:
+            detail += f" (status: /api/jobs/{job_id})"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "10"})
+    file_name = re.sub(r"[^A-Za-z0-9]+", "-", chapter_title).strip("-")
+    return conditional_file_response(
+        request,
+        entry["path"],
+        media_type="application/pdf",
+        digest=entry["digest"],
+        headers={
+            "Content-Disposition": f"inline; filename=NCC-Handbook-{file_name}.pdf",
+            "X-Chapter-Pages": f"{entry['start']}-{entry['end']}"
+        }
+    )
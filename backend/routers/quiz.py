@@ -1,18 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Set, Tuple
 from datetime import datetime
+import asyncio
+import hashlib
 import json
-import os
+import random
+import re
+import uuid
 from app_models import (
     QuizRequest, QuizResponse, QuizQuestion, 
     QuizSubmissionRequest, QuizSubmissionResponse,
     QuizHistoryResponse, BookmarkRequest, QuizBookmarkResponse,
-    QuizTopicsResponse, QuizAnalyticsResponse
+    QuizTopicsResponse, QuizAnalyticsResponse,
+    ExamBlueprintRequest, QuestionBankSearchResponse,
+    SimilarQuestion, SimilarQuestionsResponse
 )
 from services.ai_service import get_ai_quiz_service, AIQuizService
+from services.question_pool import get_question_pool, QuestionPool
+from services.request_coalescer import SingleFlight
+from services.quiz_session_store import get_quiz_session_store, QuizSessionStore
+from services.question_bank import get_question_bank, QuestionBank
 
 router = APIRouter()
 
+# Identical concurrent generation requests share one Gemini call
+quiz_generation_flight = SingleFlight()
+
+# Explanations that point at an option letter would be wrong after relabelling options
+OPTION_REFERENCE_RE = re.compile(r'\b(?:option|answer|choice)\s*\(?[A-D]\b|\([A-D]\)', re.IGNORECASE)
+
 # NCC Quiz Topics (from original system)
 NCC_TOPICS = [
     "NCC General",
@@ -27,6 +44,12 @@ NCC_TOPICS = [
     "Social Service"
 ]
 
+# Work handed off by streaming responses so a client disconnect cannot cancel it
+_background_tasks: Set[asyncio.Task] = set()
+
+# Largest quiz for a custom topic or uploaded material
+MAX_CUSTOM_QUESTIONS = 30
+
 # Difficulty configurations (updated system)
 DIFFICULTY_CONFIG = {
     "Easy": {"questions": 10, "complexity": "basic concepts and definitions"},
@@ -34,6 +57,101 @@ DIFFICULTY_CONFIG = {
     "Hard": {"questions": 5, "complexity": "advanced understanding and critical thinking"}
 }
 
+def _validate_quiz_request(request: QuizRequest) -> Tuple[bool, int]:
+    """Validate topic and difficulty, returning (is_custom, clamped number of questions)"""
+    # Check if this is a custom topic or file-based request
+    is_custom = request.custom_topic is not None or request.source_material is not None
+    
+    if not is_custom:
+        # Validate predefined topic
+        if request.topic not in NCC_TOPICS:
+            raise HTTPException(status_code=400, detail=f"Invalid topic. Available topics: {NCC_TOPICS}")
+    
+    # Validate difficulty
+    if request.difficulty not in DIFFICULTY_CONFIG:
+        raise HTTPException(status_code=400, detail="Invalid difficulty. Use: Easy, Medium, or Hard")
+    
+    # Clamp number of questions based on content type
+    if is_custom:
+        # Custom topics and uploaded materials allow longer quizzes (generated in parallel sub-batches)
+        num_questions = min(request.numQuestions, MAX_CUSTOM_QUESTIONS)
+    else:
+        # For predefined topics, use difficulty-based limits
+        max_questions = DIFFICULTY_CONFIG[request.difficulty]["questions"]
+        num_questions = min(request.numQuestions, max_questions)
+    return is_custom, num_questions
+
+def _new_quiz_id(topic: str, difficulty: str) -> str:
+    # Random suffix keeps ids unique for concurrent requesters sharing one generation
+    return f"{topic}_{difficulty}_{datetime.now().timestamp()}_{uuid.uuid4().hex[:8]}"
+
+def _performance_level(score: float) -> str:
+    if score >= 90:
+        return "Excellent"
+    if score >= 75:
+        return "Good"
+    if score >= 50:
+        return "Average"
+    return "Needs Improvement"
+
+def _speed_rank(time_per_question: float) -> str:
+    if time_per_question < 30:
+        return "Fast"
+    if time_per_question <= 90:
+        return "Average"
+    return "Slow"
+
+def _bank_source(request: QuizRequest) -> str:
+    """Question bank `source` tag for questions generated for this request"""
+    if request.source_material:
+        return "uploaded_content"
+    return "custom_topic" if request.custom_topic else "generated"
+
+def _effective_topic(request: QuizRequest) -> str:
+    if request.source_material:
+        return request.custom_topic or f"Custom Content ({request.file_type})"
+    return request.custom_topic or request.topic
+
+def _keep_in_background(work) -> None:
+    """Run `work` as a task that outlives the request (a reference is held until it finishes)"""
+    task = asyncio.create_task(work)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def _sse_event(data: dict, event: str) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _generation_key(request: QuizRequest, effective_topic: str, num_questions: int) -> str:
+    """Normalized key identifying requests that would produce interchangeable quizzes"""
+    material_hash = (
+        hashlib.sha256(request.source_material.encode('utf-8')).hexdigest()
+        if request.source_material else ""
+    )
+    parts = [
+        " ".join(effective_topic.lower().split()),
+        request.difficulty,
+        str(num_questions),
+        " ".join((request.custom_topic or "").lower().split()),
+        material_hash
+    ]
+    return "|".join(parts)
+
+def _shuffle_for_requester(questions: List[QuizQuestion]) -> List[QuizQuestion]:
+    """Give each requester of a shared quiz its own question order and option order"""
+    shuffled = []
+    for question in random.sample(questions, len(questions)):
+        letters = sorted(question.options)
+        if OPTION_REFERENCE_RE.search(question.explanation or ""):
+            shuffled.append(question.model_copy())
+            continue
+        texts = [question.options[letter] for letter in letters]
+        order = random.sample(range(len(letters)), len(letters))
+        options = {letters[new]: texts[old] for new, old in enumerate(order)}
+        answer = letters[order.index(letters.index(question.answer))]
+        shuffled.append(question.model_copy(update={"options": options, "answer": answer}))
+    return shuffled
+
 @router.get("/topics", response_model=QuizTopicsResponse)
 async def get_quiz_topics():
     """Get available quiz topics"""
@@ -42,37 +160,22 @@ async def get_quiz_topics():
 @router.post("/generate", response_model=QuizResponse)
 async def generate_quiz(
     request: QuizRequest, 
-    ai_service: AIQuizService = Depends(get_ai_quiz_service)
+    ai_service: AIQuizService = Depends(get_ai_quiz_service),
+    question_pool: QuestionPool = Depends(get_question_pool),
+    session_store: QuizSessionStore = Depends(get_quiz_session_store),
+    question_bank: QuestionBank = Depends(get_question_bank)
 ):
     """Generate AI-powered quiz questions"""
     try:
-        # Check if this is a custom topic or file-based request
-        is_custom = request.custom_topic is not None or request.source_material is not None
-        
-        if not is_custom:
-            # Validate predefined topic
-            if request.topic not in NCC_TOPICS:
-                raise HTTPException(status_code=400, detail=f"Invalid topic. Available topics: {NCC_TOPICS}")
-        
-        # Validate difficulty
-        if request.difficulty not in DIFFICULTY_CONFIG:
-            raise HTTPException(status_code=400, detail="Invalid difficulty. Use: Easy, Medium, or Hard")
-        
-        # Clamp number of questions based on content type
-        if is_custom:
-            # For custom topics and uploaded materials, allow up to 15 questions
-            num_questions = min(request.numQuestions, 15)
-        else:
-            # For predefined topics, use difficulty-based limits
-            max_questions = DIFFICULTY_CONFIG[request.difficulty]["questions"]
-            num_questions = min(request.numQuestions, max_questions)
+        is_custom, num_questions = _validate_quiz_request(request)
         
         # Determine the effective topic and content for AI generation
+        served_from_pool = False
         if request.source_material:
             # File-based quiz generation
-            effective_topic = request.custom_topic or f"Custom Content ({request.file_type})"
+            effective_topic = _effective_topic(request)
             print(f"Generating quiz from uploaded content: {effective_topic}")
-            questions, error = ai_service.generate_quiz_from_content(
+            generate = lambda: ai_service.generate_quiz_from_content(
                 content=request.source_material,
                 topic=effective_topic,
                 difficulty=request.difficulty,
@@ -82,21 +185,52 @@ async def generate_quiz(
             # Custom topic quiz generation
             effective_topic = request.custom_topic
             print(f"Generating quiz for custom topic: {effective_topic}")
-            questions, error = ai_service.generate_quiz_questions(
+            generate = lambda: ai_service.generate_quiz_questions(
                 topic=effective_topic,
                 difficulty=request.difficulty,
                 num_questions=num_questions,
                 is_custom=True
             )
         else:
-            # Standard NCC topic quiz generation
+            # Standard NCC topic: serve from the pre-generated pool, fall back to live generation
             effective_topic = request.topic
-            questions, error = ai_service.generate_quiz_questions(
-                topic=request.topic,
-                difficulty=request.difficulty,
-                num_questions=num_questions
-            )
+
+            async def generate():
+                generated, generation_error = await ai_service.generate_quiz_questions(
+                    topic=request.topic,
+                    difficulty=request.difficulty,
+                    num_questions=num_questions
+                )
+                if generated:
+                    question_pool.add(request.topic, request.difficulty, generated)
+                return generated, generation_error
+
+            pooled = question_pool.draw(request.topic, request.difficulty, num_questions)
+            served_from_pool = bool(pooled)
+
+        if served_from_pool:
+            questions, error = pooled, None
+        else:
+            # Concurrent identical requests share one generation; each gets its own shuffle
+            key = _generation_key(request, effective_topic, num_questions)
+
+            async def generate_and_bank():
+                generated, generation_error = await generate()
+                if generated and not generation_error:
+                    await asyncio.to_thread(question_bank.add, generated, source=_bank_source(request))
+                return generated, generation_error
+
+            questions, error = await quiz_generation_flight.do(key, generate_and_bank)
+            questions = _shuffle_for_requester(questions)
+
+        if error and not is_custom:
+            # Provider degraded: serve whatever the pool holds rather than failing the quiz
+            fallback = question_pool.draw(request.topic, request.difficulty, num_questions, allow_partial=True)
+            if fallback:
+                questions, error, served_from_pool = fallback, None, True
         
+        if error and ai_service.circuit_open:
+            raise HTTPException(status_code=503, detail=f"AI service error: {error}")
         if error:
             raise HTTPException(status_code=500, detail=f"AI service error: {error}")
         
@@ -106,10 +240,13 @@ async def generate_quiz(
         time_limit = None
         if request.timedMode:
             time_limit = request.timeLimit or (num_questions * 120)
+        # Keep the answer key server-side so /submit can grade this quiz
+        quiz_id = _new_quiz_id(effective_topic, request.difficulty)
+        session_store.put(quiz_id, effective_topic, request.difficulty, questions)
         return QuizResponse(
             questions=questions,
             metadata={
-                "quiz_id": f"{effective_topic}_{request.difficulty}_{datetime.now().timestamp()}",
+                "quiz_id": quiz_id,
                 "topic": effective_topic,
                 "difficulty": request.difficulty,
                 "generated_at": datetime.now().isoformat(),
@@ -119,21 +256,208 @@ async def generate_quiz(
                 "max_points": sum(getattr(q, 'points', 1) for q in questions),
                 "custom_topic": is_custom,
                 "source_material": "uploaded_file" if request.source_material else None,
-                "ai_generated": error is None
+                "ai_generated": error is None,
+                "served_from_pool": served_from_pool
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
 
+@router.post("/generate/stream")
+async def generate_quiz_stream(
+    request: QuizRequest,
+    http_request: Request,
+    ai_service: AIQuizService = Depends(get_ai_quiz_service),
+    question_pool: QuestionPool = Depends(get_question_pool),
+    session_store: QuizSessionStore = Depends(get_quiz_session_store),
+    question_bank: QuestionBank = Depends(get_question_bank)
+):
+    """
+    Stream quiz questions as Server-Sent Events so the first question renders
+    while the rest are still being generated.
+    Events: `meta` (quiz metadata), `question` (one QuizQuestion each), then `done` or `error`.
+    """
+    is_custom, num_questions = _validate_quiz_request(request)
+    effective_topic = _effective_topic(request)
+    pooled = [] if is_custom else question_pool.draw(request.topic, request.difficulty, num_questions)
+    if not pooled and (ai_service.model_error or not ai_service.model):
+        raise HTTPException(status_code=503, detail=f"AI model unavailable: {ai_service.model_error}")
+
+    quiz_id = _new_quiz_id(effective_topic, request.difficulty)
+
+    async def event_stream():
+        yield _sse_event({
+            "quiz_id": quiz_id,
+            "topic": effective_topic,
+            "difficulty": request.difficulty,
+            "total_questions": num_questions,
+            "custom_topic": is_custom,
+            "served_from_pool": bool(pooled)
+        }, "meta")
+        if pooled:
+            session_store.put(quiz_id, effective_topic, request.difficulty, pooled)
+            for question in pooled:
+                yield _sse_event(question.dict(), "question")
+            yield _sse_event({"total_questions": len(pooled)}, "done")
+            return
+
+        streamed = []
+        questions = ai_service.stream_quiz_questions(
+            topic=effective_topic,
+            difficulty=request.difficulty,
+            num_questions=num_questions,
+            content=request.source_material
+        )
+        try:
+            async for question in questions:
+                if await http_request.is_disconnected():
+                    return
+                streamed.append(question)
+                yield _sse_event(question.dict(), "question")
+            if streamed:
+                session_store.put(quiz_id, effective_topic, request.difficulty, streamed)
+                yield _sse_event({"total_questions": len(streamed)}, "done")
+            else:
+                yield _sse_event({"detail": "Failed to parse valid quiz questions from AI response"}, "error")
+        except Exception as e:
+            yield _sse_event({"detail": f"Error generating quiz: {str(e)}"}, "error")
+        finally:
+            # A disconnect cancels this generator, so nothing here may wait before the questions are kept
+            if streamed:
+                _keep_in_background(asyncio.to_thread(question_bank.add, streamed, source=_bank_source(request)))
+            if streamed and not is_custom:
+                question_pool.add(request.topic, request.difficulty, streamed)
+            await questions.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/generate/stats")
+async def quiz_generation_stats(
+    ai_service: AIQuizService = Depends(get_ai_quiz_service),
+    question_pool: QuestionPool = Depends(get_question_pool),
+    session_store: QuizSessionStore = Depends(get_quiz_session_store)
+):
+    """Generation, repair, coalescing, pool and session counters"""
+    return {
+        **ai_service.generation_stats(),
+        "coalescing": quiz_generation_flight.stats(),
+        "sessions": session_store.stats(),
+        "pool_size": question_pool.total_size(),
+        "pool_similarity": question_pool.similarity.stats()
+    }
+
+@router.get("/bank/search", response_model=QuestionBankSearchResponse)
+async def search_question_bank(
+    q: str,
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    limit: int = 20,
+    question_bank: QuestionBank = Depends(get_question_bank)
+):
+    """Full-text search over every question generated so far"""
+    results = await asyncio.to_thread(question_bank.search, q, topic=topic, difficulty=difficulty,
+                                      limit=max(1, min(limit, 100)))
+    return QuestionBankSearchResponse(query=q, results=results, total_results=len(results))
+
+@router.get("/bank/similar", response_model=SimilarQuestionsResponse)
+async def similar_questions(
+    q: Optional[str] = None,
+    question_id: Optional[str] = None,
+    limit: int = 5,
+    question_bank: QuestionBank = Depends(get_question_bank)
+):
+    """Banked questions similar to a banked question (`question_id`, e.g. bank_12) or to free text (`q`)"""
+    limit = max(1, min(limit, 50))
+    if question_id:
+        try:
+            bank_id = int(question_id.removeprefix("bank_"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="question_id must look like bank_<number>")
+        source = await asyncio.to_thread(question_bank.get, bank_id)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Question not found in the bank")
+        matches = await asyncio.to_thread(question_bank.similar, source.question, list(source.options.values()),
+                                          limit, exclude_id=bank_id)
+        query = source.question
+    elif q:
+        matches = await asyncio.to_thread(question_bank.similar, q, limit=limit)
+        query = q
+    else:
+        raise HTTPException(status_code=400, detail="Provide q or question_id")
+    return SimilarQuestionsResponse(
+        query=query,
+        results=[SimilarQuestion(question=question, similarity=score) for question, score in matches]
+    )
+
+@router.get("/bank/stats")
+async def question_bank_stats(question_bank: QuestionBank = Depends(get_question_bank)):
+    """Banked question counts per topic and difficulty"""
+    return question_bank.stats()
+
+@router.post("/exam/assemble", response_model=QuizResponse)
+async def assemble_exam(
+    request: ExamBlueprintRequest,
+    question_bank: QuestionBank = Depends(get_question_bank),
+    session_store: QuizSessionStore = Depends(get_quiz_session_store)
+):
+    """
+    Assemble a mock exam from the question bank following a topic blueprint,
+    e.g. {"Drill": 20, "Map Reading": 15, ...}. No AI call is made.
+    """
+    if not request.blueprint or all(weight <= 0 for weight in request.blueprint.values()):
+        raise HTTPException(status_code=400, detail="Blueprint needs at least one topic with a positive weight")
+    if request.difficulties:
+        invalid = [d for d in request.difficulties if d not in DIFFICULTY_CONFIG]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid difficulty {invalid}. Use: Easy, Medium, or Hard")
+
+    questions, drawn = await asyncio.to_thread(question_bank.assemble_exam, request.blueprint,
+                                               request.total_questions, request.difficulties)
+    if not questions:
+        raise HTTPException(status_code=404, detail="The question bank has no questions for these topics yet")
+
+    quiz_id = _new_quiz_id("Mock Exam", "Mixed")
+    session_store.put(quiz_id, "Mock Exam", "Mixed", questions)
+    time_limit = None
+    if request.timedMode:
+        time_limit = request.timeLimit or (len(questions) * 60)
+    return QuizResponse(
+        questions=questions,
+        metadata={
+            "quiz_id": quiz_id,
+            "topic": "Mock Exam",
+            "difficulty": "Mixed",
+            "generated_at": datetime.now().isoformat(),
+            "total_questions": len(questions),
+            "requested_questions": request.total_questions,
+            "questions_per_topic": drawn,
+            "timed_mode": request.timedMode,
+            "time_limit_seconds": time_limit,
+            "max_points": sum(getattr(q, 'points', 1) for q in questions),
+            "ai_generated": False,
+            "served_from_bank": True
+        }
+    )
+
 @router.post("/submit", response_model=QuizSubmissionResponse)
-async def submit_quiz(submission: QuizSubmissionRequest):
-    """Submit quiz answers and get results"""
+async def submit_quiz(
+    submission: QuizSubmissionRequest,
+    session_store: QuizSessionStore = Depends(get_quiz_session_store)
+):
+    """Submit quiz answers and grade them against the stored answer key"""
+    session = session_store.get(submission.quiz_id) if submission.quiz_id else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Quiz session not found or expired. Please start a new quiz.")
     try:
-        # No answer validation in production (AI only)
-        correct_answers = 0
-        wrong_questions = []
-        total_questions = len(submission.answers)
+        correct_answers, wrong_questions, accuracy_by_topic = session.grade(submission.answers)
+        total_questions = len(session)
         
         score_percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
         
@@ -143,9 +467,10 @@ async def submit_quiz(submission: QuizSubmissionRequest):
             start = datetime.fromisoformat(submission.start_time.replace('Z', '+00:00'))
             end = datetime.fromisoformat(submission.end_time.replace('Z', '+00:00'))
             duration_seconds = (end - start).total_seconds()
+        time_per_question = duration_seconds / total_questions if total_questions > 0 else 0
         
         result = QuizSubmissionResponse(
-            score=score_percentage,
+            score=round(score_percentage, 2),
             correct_answers=correct_answers,
             wrong_answers=len(wrong_questions),
             total_questions=total_questions,
@@ -153,7 +478,11 @@ async def submit_quiz(submission: QuizSubmissionRequest):
             wrong_questions=wrong_questions,
             difficulty=submission.difficulty,
             topic=submission.topic,
-            submitted_at=datetime.now().isoformat()
+            submitted_at=datetime.now().isoformat(),
+            performance_level=_performance_level(score_percentage),
+            time_per_question=round(time_per_question, 2) if duration_seconds else None,
+            accuracy_by_topic=accuracy_by_topic,
+            speed_rank=_speed_rank(time_per_question) if duration_seconds else None
         )
         
         # No quiz history in production (AI only)
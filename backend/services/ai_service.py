@@ -5,38 +5,294 @@ Based on the original NCC ABYAS system's sophisticated AI integration
 import os
 import re
 import json
-from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import math
+import random
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from datetime import datetime
-import google.generativeai as genai
 from app_models import QuizQuestion
+from services.llm_backends import create_backend
+from services.resilience import ResilientCaller, CircuitOpenError
 
 # Configuration constants (from original system)
 TEMP_QUIZ = 0.5
 MAX_TOKENS_QUIZ = 2500
-MODEL_NAME = 'gemini-1.5-flash'
+QUIZ_GENERATION_CONFIG = {"temperature": TEMP_QUIZ, "max_output_tokens": MAX_TOKENS_QUIZ}
+
+# Batch quiz output: "text" (Q:/A)-D)/ANSWER:/EXPLANATION: blocks) or "json" (schema-constrained JSON)
+QUIZ_OUTPUT_MODE = os.getenv("QUIZ_OUTPUT_MODE", "text").lower()
+# Follow-up calls allowed to regenerate only the questions the parser dropped
+QUIZ_REPAIR_ATTEMPTS = int(os.getenv("QUIZ_REPAIR_ATTEMPTS", "2"))
+# Output token budget per question for repair calls
+REPAIR_TOKENS_PER_QUESTION = 300
+
+QUIZ_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "question": {"type": "STRING"},
+            "options": {
+                "type": "OBJECT",
+                "properties": {letter: {"type": "STRING"} for letter in "ABCD"},
+                "required": list("ABCD")
+            },
+            "answer": {"type": "STRING", "enum": list("ABCD")},
+            "explanation": {"type": "STRING"}
+        },
+        "required": ["question", "options", "answer", "explanation"]
+    }
+}
+
+JSON_OUTPUT_INSTRUCTION = """
+OUTPUT FORMAT OVERRIDE: Instead of the Q:/A)/ANSWER:/EXPLANATION: text format, return ONLY a JSON array.
+Each element must be an object with keys "question", "options" (an object with keys "A", "B", "C", "D"),
+"answer" (one of "A", "B", "C", "D") and "explanation".
+"""
+
+# Long source material is split into chunks of about this many tokens (~4 characters per token)
+CONTENT_CHUNK_TOKENS = int(os.getenv("QUIZ_CONTENT_CHUNK_TOKENS", "2000"))
+CHARS_PER_TOKEN = 4
+# Chunk generations allowed in flight for a single content-based quiz
+CONTENT_CHUNK_PARALLELISM = int(os.getenv("QUIZ_CONTENT_CHUNK_PARALLELISM", "4"))
+# Ask for extra questions across chunks so de-duplication still leaves enough to sample from
+CONTENT_OVERGENERATION = 1.5
+
+# Quizzes larger than this are split into concurrent sub-batches of about this many questions;
+# QUIZ_PARALLEL_BATCHES=false keeps the single-call behaviour
+QUIZ_BATCH_SIZE = int(os.getenv("QUIZ_BATCH_SIZE", "5"))
+QUIZ_PARALLEL_BATCHES = os.getenv("QUIZ_PARALLEL_BATCHES", "true").lower() == "true"
+# Once this many seconds pass, the batches that finished are served and the rest are cancelled
+QUIZ_BATCH_DEADLINE_SECONDS = float(os.getenv("QUIZ_BATCH_DEADLINE_SECONDS", "20"))
+# Each sub-batch gets its own angle on the topic so batches do not converge on the same questions
+BATCH_FOCUS_HINTS = [
+    "core definitions, facts and terminology",
+    "history, organisation and structure",
+    "practical procedures and how things are done in the field",
+    "scenario-based situations a cadet may face",
+    "roles, responsibilities and the reasons behind rules",
+    "common mistakes and misconceptions"
+]
+
+# Upper bound on Gemini calls in flight per worker; further callers queue on the event loop
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+
+# Questions in model output are separated by a line of three or more dashes
+QUIZ_BLOCK_SEPARATOR_RE = re.compile(r"\n\s*-{3,}\s*\n")
+
+
+class QuizStreamParser:
+    """
+    Incremental splitter for streamed quiz output.
+    `feed` buffers chunks and returns every question block whose closing separator has arrived;
+    `flush` returns the trailing block once the stream ends.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.blocks_seen = 0
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        blocks = []
+        while True:
+            match = QUIZ_BLOCK_SEPARATOR_RE.search(self.buffer)
+            if not match:
+                break
+            block, self.buffer = self.buffer[:match.start()], self.buffer[match.end():]
+            if block.strip():
+                self.blocks_seen += 1
+                blocks.append(block)
+        return blocks
+
+    def flush(self) -> List[str]:
+        block, self.buffer = self.buffer, ""
+        if not block.strip():
+            return []
+        self.blocks_seen += 1
+        return [block]
+
 
 class AIQuizService:
     def __init__(self):
+        # Generation backend (Gemini unless LLM_BACKEND selects another); None when unavailable
         self.model = None
         self.model_error = None
+        self._generation_slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        self.resilience = ResilientCaller()
+        self.stats = Counter()
         self._initialize_model()
     
     def _initialize_model(self):
-        """Initialize Gemini AI model"""
+        """Initialize the configured generation backend"""
+        backend = create_backend()
+        self.model_error = backend.error
+        self.model = backend if backend.error is None else None
+    
+    @property
+    def circuit_open(self) -> bool:
+        """True while the provider is considered degraded and calls fail fast"""
+        return self.resilience.breaker.is_open
+    
+    async def generate_text(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Run a single generation without blocking the event loop.
+        Concurrent calls are bounded by GEMINI_MAX_CONCURRENCY; each call gets a deadline,
+        jittered retries, optional hedging and the circuit breaker (see services.resilience).
+        """
+        return await self.resilience.call(
+            lambda: self.model.generate(prompt, generation_config=generation_config),
+            slots=self._generation_slots
+        )
+    
+    def stream_text(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Stream a generation chunk by chunk.
+        Closing the iterator early (e.g. client disconnect) stops consuming the stream and frees the slot.
+        Streams are not retried once output has started, but respect the circuit breaker and the
+        per-call deadline for the first chunk and between chunks (see ResilientCaller.stream).
+        """
+        return self.resilience.stream(
+            lambda: self.model.stream(prompt, generation_config=generation_config),
+            slots=self._generation_slots
+        )
+    
+    def _quiz_generation_config(self, max_output_tokens: int = MAX_TOKENS_QUIZ) -> Dict[str, Any]:
+        """Generation config for batch quiz calls, schema-constrained in JSON output mode"""
+        config = {**QUIZ_GENERATION_CONFIG, "max_output_tokens": max_output_tokens}
+        if QUIZ_OUTPUT_MODE == "json":
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = QUIZ_RESPONSE_SCHEMA
+        return config
+    
+    @staticmethod
+    def _with_output_format(prompt: str) -> str:
+        return prompt + JSON_OUTPUT_INSTRUCTION if QUIZ_OUTPUT_MODE == "json" else prompt
+    
+    def _parse_quiz_output(self, response_text: str) -> List[Dict[str, Any]]:
+        """Parse a batch quiz response in the configured output mode"""
+        if QUIZ_OUTPUT_MODE == "json":
+            return self._parse_json_quiz_response(response_text)
+        return self._parse_ai_quiz_response(response_text)
+    
+    async def _generate_and_parse(self, prompt: str, max_output_tokens: int = MAX_TOKENS_QUIZ) -> List[Dict[str, Any]]:
+        response_text = await self.generate_text(
+            self._with_output_format(prompt),
+            generation_config=self._quiz_generation_config(max_output_tokens)
+        )
+        self.stats["generation_calls"] += 1
+        if not response_text:
+            return []
+        return self._parse_quiz_output(response_text)
+    
+    async def _repair_missing_questions(
+        self,
+        questions_data: List[Dict[str, Any]],
+        topic: str,
+        difficulty: str,
+        num_questions: int,
+        content: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-request only the questions the parser dropped, with a compact prompt, and merge them in.
+        Cheaper than the caller retrying the whole generation.
+        """
+        questions_data = list(questions_data)
+        seen = {self._normalize_question_text(q["question"]) for q in questions_data}
+        for _ in range(QUIZ_REPAIR_ATTEMPTS):
+            missing = num_questions - len(questions_data)
+            if missing <= 0:
+                break
+            self.stats["repair_calls"] += 1
+            self.stats["repair_questions_requested"] += missing
+            prompt = self._build_repair_prompt(topic, difficulty, missing, questions_data, content)
+            repaired = await self._generate_and_parse(prompt, max_output_tokens=REPAIR_TOKENS_PER_QUESTION * missing)
+            for q_data in repaired[:missing]:
+                normalized = self._normalize_question_text(q_data["question"])
+                if normalized not in seen:
+                    seen.add(normalized)
+                    questions_data.append(q_data)
+                    self.stats["repair_questions_recovered"] += 1
+        return questions_data[:num_questions]
+    
+    def _build_repair_prompt(
+        self,
+        topic: str,
+        difficulty: str,
+        count: int,
+        existing: List[Dict[str, Any]],
+        content: Optional[str] = None
+    ) -> str:
+        """Compact prompt asking for `count` more questions that avoid the ones already kept"""
+        source = ""
+        if content:
+            max_content_length = CONTENT_CHUNK_TOKENS * CHARS_PER_TOKEN
+            excerpt = content[:max_content_length]
+            source = f"Base every question only on this content:\n{excerpt}\n\n"
+        avoid = "\n".join(f"- {q['question']}" for q in existing)
+        avoid_block = f"Do not repeat these questions:\n{avoid}\n\n" if avoid else ""
+        return f"""Generate exactly {count} multiple-choice questions for NCC cadets on "{topic}" at {difficulty} difficulty.
+{source}{avoid_block}Use exactly this format, with a line containing only --- between questions:
+Q: [question]
+A) [option]
+B) [option]
+C) [option]
+D) [option]
+ANSWER: [A, B, C or D]
+EXPLANATION: [one or two sentences]
+"""
+    
+    def _parse_json_quiz_response(self, response_text: str) -> List[Dict[str, Any]]:
+        """Parse JSON-mode output (a list of question objects) and validate each question"""
+        text = response_text.strip()
+        fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
         try:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key or api_key == "your_api_key_here":
-                self.model_error = "GEMINI_API_KEY environment variable not set"
-                return
-            
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(MODEL_NAME)
-            self.model_error = None
-            
-        except Exception as e:
-            self.model_error = f"Failed to initialize Gemini model: {str(e)}"
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            print(f"[AIQuizService] Invalid JSON quiz response: {e}")
+            self.stats["blocks_rejected"] += 1
+            return []
+        if isinstance(data, dict):
+            data = data.get("questions", [])
+        parsed_questions = []
+        for idx, item in enumerate(data if isinstance(data, list) else []):
+            options = item.get("options") if isinstance(item, dict) else None
+            if isinstance(options, list) and len(options) == 4:
+                options = dict(zip("ABCD", options))
+            question_data = {
+                "question": str(item.get("question", "")).strip() if isinstance(item, dict) else "",
+                "options": {k: str(v).strip() for k, v in options.items()} if isinstance(options, dict) else {},
+                "answer": str(item.get("answer", "")).strip().upper()[:1] if isinstance(item, dict) else "",
+                "explanation": str(item.get("explanation", "")).strip() if isinstance(item, dict) else ""
+            }
+            if (question_data["question"] and
+                sorted(question_data["options"]) == list("ABCD") and
+                question_data["answer"] in question_data["options"] and
+                question_data["explanation"]):
+                question_data["timestamp"] = datetime.now().isoformat()
+                parsed_questions.append(question_data)
+                self.stats["blocks_parsed"] += 1
+            else:
+                print(f"[AIQuizService] JSON item {idx+1}: Incomplete question data. Parsed: {question_data}")
+                self.stats["blocks_rejected"] += 1
+        return parsed_questions
+    
+    def generation_stats(self) -> Dict[str, Any]:
+        """Parse/repair counters plus resilience counters, for measuring wasted generations"""
+        return {
+            "output_mode": QUIZ_OUTPUT_MODE,
+            **{key: self.stats[key] for key in (
+                "generation_calls", "blocks_parsed", "blocks_rejected", "repair_calls",
+                "repair_questions_requested", "repair_questions_recovered", "incomplete_quizzes",
+                "batched_quizzes", "batch_duplicates", "batch_deadline_hits"
+            )},
+            "resilience": self.resilience.stats()
+        }
     
-    def generate_quiz_questions(
+    async def generate_quiz_questions(
         self, 
         topic: str, 
         difficulty: str, 
@@ -51,43 +307,91 @@ class AIQuizService:
             return [], f"Model error: {self.model_error}"
         
         try:
-            prompt = self._build_quiz_prompt(topic, num_questions, difficulty)
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.GenerationConfig(
-                    temperature=TEMP_QUIZ,
-                    max_output_tokens=MAX_TOKENS_QUIZ
+            deadline_hit = False
+            if QUIZ_PARALLEL_BATCHES and num_questions > QUIZ_BATCH_SIZE:
+                parsed_questions, deadline_hit = await self._generate_in_batches(topic, difficulty, num_questions)
+            else:
+                prompt = self._build_quiz_prompt(topic, num_questions, difficulty)
+                parsed_questions = await self._generate_and_parse(prompt)
+            # Past the deadline a partial quiz is served as-is rather than spending more time on repair
+            if len(parsed_questions) < num_questions and not deadline_hit:
+                parsed_questions = await self._repair_missing_questions(
+                    parsed_questions, topic, difficulty, num_questions
                 )
-            )
-            
-            raw_response_text = response.text
-            parsed_questions = self._parse_ai_quiz_response(raw_response_text)
+            if len(parsed_questions) < num_questions:
+                self.stats["incomplete_quizzes"] += 1
             
             if parsed_questions:
                 # Convert to QuizQuestion objects
-                quiz_questions = []
-                for i, q_data in enumerate(parsed_questions):
-                    question = QuizQuestion(
-                        id=f"{topic.lower().replace(' ', '_')}_{i+1}",
-                        question=q_data["question"],
-                        options=q_data["options"],
-                        answer=q_data["answer"],
-                        explanation=q_data["explanation"],
-                        topic=topic,
-                        difficulty=difficulty,
-                        created_at=datetime.now().isoformat()
-                    )
-                    quiz_questions.append(question)
-                
+                quiz_questions = [
+                    self._to_quiz_question(q_data, topic, difficulty, i)
+                    for i, q_data in enumerate(parsed_questions)
+                ]
                 return quiz_questions, None
             else:
                 return [], "Failed to parse valid quiz questions from AI response"
                 
+        except CircuitOpenError as e:
+            return [], f"AI service temporarily unavailable: {str(e)}"
         except Exception as e:
             return [], f"Error generating quiz: {str(e)}"
     
-    def _build_quiz_prompt(self, topic: str, num_q: int, difficulty: str) -> str:
+    async def _generate_in_batches(
+        self,
+        topic: str,
+        difficulty: str,
+        num_questions: int
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Split a large quiz into concurrent sub-batches with distinct focus hints, so wall-clock time
+        is bounded by the slowest small call instead of one long one.
+        Returns (questions de-duplicated across batches in batch order, whether the deadline was hit).
+        """
+        batch_count = math.ceil(num_questions / QUIZ_BATCH_SIZE)
+        sizes = [
+            num_questions // batch_count + (1 if i < num_questions % batch_count else 0)
+            for i in range(batch_count)
+        ]
+        tasks = [
+            asyncio.create_task(self._generate_and_parse(
+                self._build_quiz_prompt(topic, size, difficulty, focus=BATCH_FOCUS_HINTS[i % len(BATCH_FOCUS_HINTS)]),
+                max_output_tokens=min(MAX_TOKENS_QUIZ, REPAIR_TOKENS_PER_QUESTION * size * 2)
+            ))
+            for i, size in enumerate(sizes)
+        ]
+        self.stats["batched_quizzes"] += 1
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=QUIZ_BATCH_DEADLINE_SECONDS)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if pending:
+            self.stats["batch_deadline_hits"] += 1
+            print(f"[AIQuizService] {len(pending)}/{batch_count} quiz batches missed the {QUIZ_BATCH_DEADLINE_SECONDS:.0f}s deadline")
+
+        finished = [task for task in tasks if task not in pending]
+        failures = [task.exception() for task in finished if task.exception() is not None]
+        if failures and len(failures) == len(tasks):
+            raise failures[0]
+        for failure in failures:
+            print(f"[AIQuizService] Quiz batch failed: {failure}")
+
+        seen = set()
+        questions_data = []
+        for task in finished:
+            if task.exception() is not None:
+                continue
+            for q_data in task.result():
+                normalized = self._normalize_question_text(q_data["question"])
+                if normalized in seen:
+                    self.stats["batch_duplicates"] += 1
+                    continue
+                seen.add(normalized)
+                questions_data.append(q_data)
+        return questions_data[:num_questions], bool(pending)
+    
+    def _build_quiz_prompt(self, topic: str, num_q: int, difficulty: str, focus: Optional[str] = None) -> str:
         """
         Build enhanced Gemini prompt for quiz generation
         Based on original system's sophisticated prompt engineering
@@ -126,6 +430,8 @@ Important Guidelines:
 7. Clarity: Ensure questions are well-phrased and easy to understand for NCC cadets.
 8. Originality: Generate fresh questions, not just copied from standard texts if possible, while staying true to NCC doctrine.
 """
+        if focus:
+            prompt += f"9. Focus: Within this topic, concentrate on {focus}.\n"
         return prompt
     
     def _parse_ai_quiz_response(self, response_text: str) -> List[Dict[str, Any]]:
@@ -134,63 +440,130 @@ Important Guidelines:
         Enhanced for robustness, whitespace tolerance, and better error logging
         """
         parsed_questions = []
-        question_blocks = re.split(r"\n\s*-{3,}\s*\n", response_text.strip())
+        question_blocks = QUIZ_BLOCK_SEPARATOR_RE.split(response_text.strip())
+        for idx, block in enumerate(question_blocks):
+            question_data = self._parse_quiz_block(block, idx)
+            if question_data:
+                parsed_questions.append(question_data)
+                self.stats["blocks_parsed"] += 1
+            elif block.strip():
+                self.stats["blocks_rejected"] += 1
+        return parsed_questions
+    
+    def _parse_quiz_block(self, block: str, idx: int) -> Optional[Dict[str, Any]]:
+        """Parse and validate a single Q:/A)-D)/ANSWER:/EXPLANATION: block, or return None"""
         q_re = re.compile(r'Q:\s*(.*)', re.IGNORECASE)
         opt_re = re.compile(r'([A-D])\)\s*(.*)')
         ans_re = re.compile(r'ANSWER:\s*([A-D])', re.IGNORECASE)
         exp_re = re.compile(r'EXPLANATION:\s*(.*)', re.IGNORECASE | re.DOTALL)
 
-        for idx, block in enumerate(question_blocks):
-            block = block.strip()
-            if not block:
-                continue
-            question_data = {
-                "question": "",
-                "options": {},
-                "answer": "",
-                "explanation": ""
-            }
-            # Extract question
-            q_match = q_re.search(block)
-            if q_match:
-                question_data["question"] = q_match.group(1).strip()
-            else:
-                print(f"[AIQuizService] Block {idx+1}: Failed to find question line. Block: {block[:80]}...")
-            # Extract options
-            current_options_text = block[q_match.end():] if q_match else block
-            for opt_match in opt_re.finditer(current_options_text):
-                option_key = opt_match.group(1)
-                option_text = opt_match.group(2).strip()
-                # Remove trailing 'ANSWER:' or 'EXPLANATION:' if AI merged lines
-                option_text = re.split(r'(ANSWER:|EXPLANATION:)', option_text)[0].strip()
-                question_data["options"][option_key] = option_text
-            # Extract answer
-            ans_match = ans_re.search(block)
-            if ans_match:
-                question_data["answer"] = ans_match.group(1).upper()
-            else:
-                print(f"[AIQuizService] Block {idx+1}: Failed to find answer line. Block: {block[:80]}...")
-            # Extract explanation
-            exp_match = exp_re.search(block)
-            if exp_match:
-                explanation = exp_match.group(1).strip()
-                # Remove any trailing option lines if AI hallucinated them
-                explanation = re.split(r'^[A-D]\)', explanation, maxsplit=1, flags=re.MULTILINE)[0].strip()
-                question_data["explanation"] = explanation
-            else:
-                print(f"[AIQuizService] Block {idx+1}: Failed to find explanation line. Block: {block[:80]}...")
-            # Validate extracted data
-            if (question_data["question"] and
-                len(question_data["options"]) == 4 and
-                question_data["answer"] in question_data["options"] and
-                question_data["explanation"]):
-                question_data["timestamp"] = datetime.now().isoformat()
-                parsed_questions.append(question_data)
-            else:
-                print(f"[AIQuizService] Block {idx+1}: Incomplete question data. Parsed: {question_data}")
-        return parsed_questions
+        block = block.strip()
+        if not block:
+            return None
+        question_data = {
+            "question": "",
+            "options": {},
+            "answer": "",
+            "explanation": ""
+        }
+        # Extract question
+        q_match = q_re.search(block)
+        if q_match:
+            question_data["question"] = q_match.group(1).strip()
+        else:
+            print(f"[AIQuizService] Block {idx+1}: Failed to find question line. Block: {block[:80]}...")
+        # Extract options
+        current_options_text = block[q_match.end():] if q_match else block
+        for opt_match in opt_re.finditer(current_options_text):
+            option_key = opt_match.group(1)
+            option_text = opt_match.group(2).strip()
+            # Remove trailing 'ANSWER:' or 'EXPLANATION:' if AI merged lines
+            option_text = re.split(r'(ANSWER:|EXPLANATION:)', option_text)[0].strip()
+            question_data["options"][option_key] = option_text
+        # Extract answer
+        ans_match = ans_re.search(block)
+        if ans_match:
+            question_data["answer"] = ans_match.group(1).upper()
+        else:
+            print(f"[AIQuizService] Block {idx+1}: Failed to find answer line. Block: {block[:80]}...")
+        # Extract explanation
+        exp_match = exp_re.search(block)
+        if exp_match:
+            explanation = exp_match.group(1).strip()
+            # Remove any trailing option lines if AI hallucinated them
+            explanation = re.split(r'^[A-D]\)', explanation, maxsplit=1, flags=re.MULTILINE)[0].strip()
+            question_data["explanation"] = explanation
+        else:
+            print(f"[AIQuizService] Block {idx+1}: Failed to find explanation line. Block: {block[:80]}...")
+        # Validate extracted data
+        if (question_data["question"] and
+            len(question_data["options"]) == 4 and
+            question_data["answer"] in question_data["options"] and
+            question_data["explanation"]):
+            question_data["timestamp"] = datetime.now().isoformat()
+            return question_data
+        print(f"[AIQuizService] Block {idx+1}: Incomplete question data. Parsed: {question_data}")
+        return None
+    
+    async def stream_quiz_questions(
+        self,
+        topic: str,
+        difficulty: str,
+        num_questions: int,
+        content: Optional[str] = None
+    ) -> AsyncIterator[QuizQuestion]:
+        """
+        Stream quiz generation and yield each question as soon as its block is complete.
+        Pass `content` to generate from uploaded source material instead of a topic. Material longer
+        than one chunk goes through the same map-reduce as batch generation, so questions cover the
+        whole document; they are yielded once the chunk generations have been merged.
+        """
+        if content:
+            chunks = self._chunk_content(content, CONTENT_CHUNK_TOKENS * CHARS_PER_TOKEN)
+            if len(chunks) > 1:
+                questions_data = await self._map_reduce_content_questions(chunks, topic, difficulty, num_questions)
+                for index, q_data in enumerate(questions_data):
+                    yield self._to_quiz_question(q_data, topic, difficulty, index)
+                return
+            prompt = self._create_content_quiz_prompt(chunks[0], topic, difficulty, num_questions)
+        else:
+            prompt = self._build_quiz_prompt(topic, num_questions, difficulty)
+        parser = QuizStreamParser()
+        chunks = self.stream_text(
+            prompt,
+            generation_config=QUIZ_GENERATION_CONFIG
+        )
+        emitted = 0
+        try:
+            async for text in chunks:
+                for block in parser.feed(text):
+                    q_data = self._parse_quiz_block(block, parser.blocks_seen - 1)
+                    if q_data:
+                        yield self._to_quiz_question(q_data, topic, difficulty, emitted)
+                        emitted += 1
+                        if emitted >= num_questions:
+                            return
+            for block in parser.flush():
+                q_data = self._parse_quiz_block(block, parser.blocks_seen - 1)
+                if q_data and emitted < num_questions:
+                    yield self._to_quiz_question(q_data, topic, difficulty, emitted)
+                    emitted += 1
+        finally:
+            await chunks.aclose()
     
-    def generate_quiz_from_content(
+    def _to_quiz_question(self, q_data: Dict[str, Any], topic: str, difficulty: str, index: int) -> QuizQuestion:
+        return QuizQuestion(
+            id=f"{topic.lower().replace(' ', '_')}_{index+1}",
+            question=q_data["question"],
+            options=q_data["options"],
+            answer=q_data["answer"],
+            explanation=q_data["explanation"],
+            topic=topic,
+            difficulty=difficulty,
+            created_at=datetime.now().isoformat()
+        )
+    
+    async def generate_quiz_from_content(
         self, 
         content: str, 
         topic: str, 
@@ -205,23 +578,17 @@ Important Guidelines:
             return [], f"Model error: {self.model_error}"
         
         try:
-            # Create specialized prompt for content-based questions
-            prompt = self._create_content_quiz_prompt(content, topic, difficulty, num_questions)
-            
-            # Generate response using Gemini
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=TEMP_QUIZ,
-                    max_output_tokens=MAX_TOKENS_QUIZ
+            chunks = self._chunk_content(content, CONTENT_CHUNK_TOKENS * CHARS_PER_TOKEN)
+            if len(chunks) == 1:
+                questions_data = await self._generate_chunk_questions(chunks[0], topic, difficulty, num_questions)
+            else:
+                questions_data = await self._map_reduce_content_questions(chunks, topic, difficulty, num_questions)
+            if len(questions_data) < num_questions:
+                questions_data = await self._repair_missing_questions(
+                    questions_data, topic, difficulty, num_questions, content=random.choice(chunks)
                 )
-            )
-            
-            if not response or not response.text:
-                return [], "Failed to generate response from AI model"
-            
-            # Parse the response into structured questions
-            questions_data = self._parse_ai_quiz_response(response.text)
+                if len(questions_data) < num_questions:
+                    self.stats["incomplete_quizzes"] += 1
             
             if not questions_data:
                 return [], "Failed to parse quiz questions from AI response"
@@ -243,18 +610,118 @@ Important Guidelines:
             
             return quiz_questions, None
             
+        except CircuitOpenError as e:
+            return [], f"AI service temporarily unavailable: {str(e)}"
         except Exception as e:
             error_msg = f"Error generating content-based quiz: {str(e)}"
             print(error_msg)
             return [], error_msg
 
+    async def _generate_chunk_questions(
+        self,
+        content: str,
+        topic: str,
+        difficulty: str,
+        num_questions: int
+    ) -> List[Dict[str, Any]]:
+        """Generate and parse questions for one piece of source material"""
+        prompt = self._create_content_quiz_prompt(content, topic, difficulty, num_questions)
+        return await self._generate_and_parse(prompt)
+
+    async def _map_reduce_content_questions(
+        self,
+        chunks: List[str],
+        topic: str,
+        difficulty: str,
+        num_questions: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Map: generate a few questions per chunk with bounded parallelism.
+        Reduce: de-duplicate, then sample round-robin across chunks so the quiz covers the whole document.
+        """
+        per_chunk = max(1, math.ceil(num_questions * CONTENT_OVERGENERATION / len(chunks)))
+        slots = asyncio.Semaphore(CONTENT_CHUNK_PARALLELISM)
+
+        async def generate_for_chunk(chunk: str) -> List[Dict[str, Any]]:
+            async with slots:
+                return await self._generate_chunk_questions(chunk, topic, difficulty, per_chunk)
+
+        results = await asyncio.gather(
+            *(generate_for_chunk(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+        failures = [r for r in results if isinstance(r, Exception)]
+        if len(failures) == len(results):
+            raise failures[0]
+        for failure in failures:
+            print(f"[AIQuizService] Chunk generation failed: {failure}")
+
+        seen = set()
+        per_chunk_questions = []
+        for chunk_index, result in enumerate(results):
+            if isinstance(result, Exception):
+                continue
+            unique = []
+            for q_data in result:
+                normalized = self._normalize_question_text(q_data["question"])
+                if normalized not in seen:
+                    seen.add(normalized)
+                    unique.append(q_data)
+            random.shuffle(unique)
+            if unique:
+                per_chunk_questions.append((chunk_index, unique))
+
+        # Visit chunks in random order each round so short quizzes over long documents still spread out
+        selected = []
+        while len(selected) < num_questions and per_chunk_questions:
+            random.shuffle(per_chunk_questions)
+            for chunk_index, unique in per_chunk_questions:
+                if len(selected) == num_questions:
+                    break
+                selected.append((chunk_index, unique.pop()))
+            per_chunk_questions = [(i, q) for i, q in per_chunk_questions if q]
+        # Present questions in document order
+        selected.sort(key=lambda item: item[0])
+        return [q_data for _, q_data in selected]
+
+    @staticmethod
+    def _normalize_question_text(text: str) -> str:
+        return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+    @staticmethod
+    def _chunk_content(content: str, max_chars: int) -> List[str]:
+        """Split content into chunks of at most max_chars, preferring paragraph then sentence boundaries"""
+        content = content.strip()
+        if len(content) <= max_chars:
+            return [content]
+
+        pieces = []
+        for paragraph in re.split(r"\n\s*\n", content):
+            paragraph = paragraph.strip()
+            if len(paragraph) <= max_chars:
+                pieces.append(paragraph)
+                continue
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                # Hard-split anything still too long (e.g. OCR text without punctuation)
+                for start in range(0, len(sentence), max_chars):
+                    pieces.append(sentence[start:start + max_chars])
+
+        chunks = []
+        current = ""
+        for piece in pieces:
+            if not piece:
+                continue
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        return chunks
+
     def _create_content_quiz_prompt(self, content: str, topic: str, difficulty: str, num_questions: int) -> str:
-        """Create specialized prompt for content-based quiz generation"""
-        
-        # Truncate content if too long (to fit within token limits)
-        max_content_length = 8000  # Adjust based on model limits
-        if len(content) > max_content_length:
-            content = content[:max_content_length] + "..."
+        """Prompt for content-based quiz generation; `content` is one chunk (see _chunk_content)"""
         
         difficulty_instructions = {
             'Easy': 'Focus on basic facts, definitions, and direct recall from the content.',
@@ -0,0 +1,151 @@
+"""
+Chapter Slice Service for NCC ABYAS
+Standalone PDFs holding one chapter's pages of the Cadet Handbook, so a cadet studying one
+chapter downloads a fraction of the book. Slices are cut once per handbook version by a
+background job and stored content-addressed (data/chapter_slices/{sha256}.pdf); a manifest maps
+chapter titles to slice digests for the handbook hash and page mapping they were built from.
+"""
+import io
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+from services.handbook_index import handbook_index
+from services.job_service import get_job_service, Job, JobQueueFullError, STAGE_RUNNING, STAGE_DONE
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+CHAPTER_SLICE_DIR = os.path.join(BASE_DIR, "data", "chapter_slices")
+MANIFEST_NAME = "manifest.json"
+
+ChapterMapping = Dict[str, Dict[str, int]]
+
+
+class ChapterSliceService:
+    def __init__(self, slice_dir: str = CHAPTER_SLICE_DIR):
+        self.slice_dir = slice_dir
+        self.manifest: Dict[str, Any] = {}
+        self.job_id: Optional[str] = None
+        os.makedirs(slice_dir, exist_ok=True)
+        try:
+            with open(os.path.join(slice_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable chapter slice manifest: {e}")
+
+    def is_current(self, mapping: ChapterMapping) -> bool:
+        return (
+            bool(handbook_index.sha256)
+            and self.manifest.get("handbook_sha256") == handbook_index.sha256
+            and self.manifest.get("mapping") == mapping
+        )
+
+    def ensure_current(self, mapping: ChapterMapping) -> Optional[str]:
+        """Queue a slicing job unless slices for this handbook version exist or one is running"""
+        if not handbook_index.loaded or self.is_current(mapping):
+            return None
+        job_service = get_job_service()
+        if self.job_id:
+            record = job_service.get(self.job_id)
+            if record and record["status"] in ("queued", "running"):
+                return self.job_id
+        try:
+            record = job_service.submit(
+                "chapter_slices",
+                ["slice"],
+                lambda job: self._run(job, mapping),
+                meta={"handbook_sha256": handbook_index.sha256, "chapters": len(mapping)}
+            )
+        except (JobQueueFullError, RuntimeError) as e:
+            logger.warning(f"Could not queue chapter slicing: {e}")
+            return None
+        self.job_id = record["id"]
+        return self.job_id
+
+    async def _run(self, job: Job, mapping: ChapterMapping) -> Dict[str, Any]:
+        job.stage("slice", STAGE_RUNNING)
+        manifest = await asyncio.to_thread(self._build, handbook_index.pdf_path, handbook_index.sha256, mapping)
+        self.manifest = manifest
+        job.stage("slice", STAGE_DONE, detail=f"{len(manifest['chapters'])} chapters")
+        return {"chapters": len(manifest["chapters"]), "handbook_sha256": manifest["handbook_sha256"]}
+
+    def _build(self, pdf_path: str, handbook_sha256: str, mapping: ChapterMapping) -> Dict[str, Any]:
+        """Cut every chapter into its own PDF. Blocking."""
+        from PyPDF2 import PdfReader, PdfWriter
+        reader = PdfReader(pdf_path)
+        page_count = len(reader.pages)
+        chapters = {}
+        for title, pages in mapping.items():
+            start, end = pages["start"], min(pages["end"], page_count)
+            if start < 1 or start > end:
+                continue
+            writer = PdfWriter()
+            for index in range(start - 1, end):
+                writer.add_page(reader.pages[index])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            content = buffer.getvalue()
+            digest = hashlib.sha256(content).hexdigest()
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            chapters[title] = {"digest": digest, "start": start, "end": end, "size": len(content)}
+
+        manifest = {"handbook_sha256": handbook_sha256, "mapping": mapping, "chapters": chapters, "built_at": time.time()}
+        manifest_path = os.path.join(self.slice_dir, MANIFEST_NAME)
+        with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+        # Slices of older handbook versions are no longer referenced
+        referenced = {f"{chapter['digest']}.pdf" for chapter in chapters.values()}
+        for name in os.listdir(self.slice_dir):
+            if name.endswith(".pdf") and name not in referenced:
+                try:
+                    os.remove(os.path.join(self.slice_dir, name))
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Built {len(chapters)} chapter slices for handbook {handbook_sha256[:12]}")
+        return manifest
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.slice_dir, f"{digest}.pdf")
+
+    def get(self, title: str, mapping: ChapterMapping) -> Optional[Dict[str, Any]]:
+        """Slice entry (with `path`) for a chapter of the current handbook, or None if not built yet"""
+        if not self.is_current(mapping):
+            return None
+        chapter = self.manifest["chapters"].get(title)
+        if chapter is None:
+            return None
+        path = self._object_path(chapter["digest"])
+        if not os.path.exists(path):
+            # Deleted from disk: forget the manifest so the next ensure_current rebuilds
+            self.manifest = {}
+            return None
+        return {**chapter, "path": path}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "handbook_sha256": self.manifest.get("handbook_sha256"),
+            "chapters": len(self.manifest.get("chapters", {})),
+            "bytes": sum(chapter["size"] for chapter in self.manifest.get("chapters", {}).values()),
+            "job_id": self.job_id
+        }
+
+
+# Global chapter slice instance
+chapter_slice_service = ChapterSliceService()
+
+def get_chapter_slice_service() -> ChapterSliceService:
+    """Dependency injection for FastAPI"""
+    return chapter_slice_service
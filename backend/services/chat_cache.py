@@ -0,0 +1,181 @@
+"""
+Chat Answer Cache for NCC ABYAS
+Answers repeated cadet questions without calling Gemini.
+Exact hits use a normalized form of the question; near-duplicates are matched with a
+character n-gram TF-IDF cosine index over the cached questions.
+"""
+import os
+import re
+import math
+import time
+import logging
+from collections import OrderedDict, Counter
+from typing import Dict, Optional, Set, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "2000"))
+CHAT_CACHE_TTL_SECONDS = int(os.getenv("CHAT_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Minimum cosine similarity for a near-duplicate hit; set CHAT_CACHE_FUZZY=false to disable
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0.85"))
+CHAT_CACHE_FUZZY = os.getenv("CHAT_CACHE_FUZZY", "true").lower() == "true"
+# Only the cached questions sharing the most n-grams with the query are scored
+MAX_FUZZY_CANDIDATES = 50
+NGRAM_SIZE = 3
+
+# Filler words that do not change what is being asked; interrogatives stay in the key
+# ("who commands a unit" and "which unit" are different questions)
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "for", "to",
+    "please", "tell", "me", "about", "explain",
+    "can", "could", "you", "i", "do", "does", "give", "list", "describe", "kindly"
+}
+
+
+class ChatAnswerCache:
+    def __init__(
+        self,
+        max_entries: int = CHAT_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = CHAT_CACHE_TTL_SECONDS,
+        similarity_threshold: float = CHAT_CACHE_SIMILARITY,
+        fuzzy: bool = CHAT_CACHE_FUZZY
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.fuzzy = fuzzy
+        # key -> (answer, expires_at, n-gram counts); ordered oldest-used first
+        self._entries: "OrderedDict[str, Tuple[str, float, Counter]]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, strip punctuation and filler words: 'What is the NCC motto?' -> 'what ncc motto'"""
+        tokens = re.sub(r"[^\w\s]", " ", question.lower()).split()
+        content = [t for t in tokens if t not in STOPWORDS]
+        return " ".join(content or tokens)
+
+    @staticmethod
+    def _ngrams(key: str) -> Counter:
+        grams = Counter()
+        for token in key.split():
+            padded = f" {token} "
+            if len(padded) <= NGRAM_SIZE:
+                grams[padded] += 1
+                continue
+            for i in range(len(padded) - NGRAM_SIZE + 1):
+                grams[padded[i:i + NGRAM_SIZE]] += 1
+        return grams
+
+    def _idf(self, gram: str) -> float:
+        return math.log((len(self._entries) + 1) / (len(self._postings.get(gram, ())) + 1)) + 1
+
+    def _weighted_norm(self, grams: Counter, idf: Dict[str, float]) -> float:
+        total = 0.0
+        for gram, count in grams.items():
+            weight = idf.get(gram)
+            if weight is None:
+                weight = idf[gram] = self._idf(gram)
+            total += (count * weight) ** 2
+        return math.sqrt(total)
+
+    def _find_similar(self, grams: Counter, now: float) -> Optional[str]:
+        idf: Dict[str, float] = {}
+        query_norm = self._weighted_norm(grams, idf)
+        # A near-duplicate shares most n-grams, including the rare ones, so only the
+        # rarer half of the query's n-grams is used to collect candidates
+        rare_grams = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        shared = Counter()
+        for gram in rare_grams[:max(1, (len(rare_grams) + 1) // 2)]:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+        best_key, best_score = None, 0.0
+        for key, _ in shared.most_common(MAX_FUZZY_CANDIDATES):
+            # An expired near-duplicate must not outrank a live match
+            if not self._is_live(key, now):
+                continue
+            candidate = self._entries[key][2]
+            dot = sum(count * candidate[g] * idf[g] ** 2 for g, count in grams.items() if g in candidate)
+            score = dot / (query_norm * self._weighted_norm(candidate, idf))
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_key is not None and best_score >= self.similarity_threshold:
+            return best_key
+        return None
+
+    def _remove(self, key: str) -> None:
+        _, _, grams = self._entries.pop(key)
+        for gram in grams:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _is_live(self, key: str, now: float) -> bool:
+        if self._entries[key][1] > now:
+            return True
+        self._remove(key)
+        self.evictions += 1
+        return False
+
+    def get(self, question: str) -> Optional[str]:
+        """Return a cached answer for this (or a near-identical) question, or None"""
+        key = self.normalize(question)
+        now = time.time()
+        if key in self._entries and self._is_live(key, now):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+        if self.fuzzy and key:
+            similar_key = self._find_similar(self._ngrams(key), now)
+            if similar_key is not None:
+                self._entries.move_to_end(similar_key)
+                self.hits += 1
+                self.fuzzy_hits += 1
+                return self._entries[similar_key][0]
+        self.misses += 1
+        return None
+
+    def put(self, question: str, answer: str) -> None:
+        key = self.normalize(question)
+        if not key or not answer:
+            return
+        if key in self._entries:
+            self._remove(key)
+        grams = self._ngrams(key)
+        self._entries[key] = (answer, time.time() + self.ttl_seconds, grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._postings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global cache instance
+chat_cache = ChatAnswerCache()
+
+def get_chat_cache() -> ChatAnswerCache:
+    """Dependency injection for FastAPI"""
+    return chat_cache
@@ -0,0 +1,128 @@
+"""
+Extraction Cache for NCC ABYAS
+Per-page text extracted from uploaded files, keyed by the SHA-256 of the file content, so a file
+uploaded again skips PDF parsing and OCR. Entries live on disk (one JSON file each) and the least
+recently used ones are evicted once the cache exceeds its size budget.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+EXTRACTION_CACHE_DIR = os.path.join(BASE_DIR, "data", "extraction_cache")
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "200"))
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR, max_bytes: int = int(EXTRACTION_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # digest -> (size in bytes, last access time)
+        self._index: Dict[str, Tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(cache_dir, name))
+                self._index[name[:-5]] = (stat.st_size, stat.st_mtime)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for size, _ in self._index.values())
+
+    def get(self, digest: str) -> Optional[List[str]]:
+        """Cached page texts for this content digest, or None"""
+        if digest not in self._index:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(digest), 'r', encoding='utf-8') as f:
+                pages = json.load(f)["pages"]
+        except Exception as e:
+            logger.warning(f"Dropping unreadable extraction cache entry {digest}: {e}")
+            with self._lock:
+                self._drop(digest)
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            if digest in self._index:
+                self._index[digest] = (self._index[digest][0], now)
+        try:
+            # mtime doubles as last access time across restarts
+            os.utime(self._path(digest), (now, now))
+        except OSError:
+            pass
+        self.hits += 1
+        return pages
+
+    def put(self, digest: str, pages: List[str], method: str) -> None:
+        payload = json.dumps({"pages": pages, "method": method, "created_at": time.time()})
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        tmp_path = f"{self._path(digest)}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self._path(digest))
+        except Exception as e:
+            logger.error(f"Error writing extraction cache entry: {e}")
+            return
+        with self._lock:
+            self._index[digest] = (size, time.time())
+            self._evict()
+
+    def _drop(self, digest: str) -> None:
+        self._index.pop(digest, None)
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for digest, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._drop(digest)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "size_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global extraction cache instance
+extraction_cache = ExtractionCache()
+
+def get_extraction_cache() -> ExtractionCache:
+    """Dependency injection for FastAPI"""
+    return extraction_cache
@@ -0,0 +1,238 @@
+"""
+Handbook Index for NCC ABYAS
+Per-page text of the Cadet Handbook, extracted once and persisted as a single binary artifact
+that is memory-mapped at startup. The artifact records the PDF's size, mtime and SHA-256; it is
+rebuilt only when the PDF content actually changes, so a normal boot does no PDF parsing.
+
+Artifact layout (little-endian):
+    8 bytes   magic b"NCCHBIX1"
+    4 bytes   header length H
+    H bytes   JSON header (source size, mtime_ns, sha256, page_count, built_at), padded to 8 bytes
+    (N+1) x 8 byte offsets into the text blob, one per page plus the end
+    UTF-8 text of every page, back to back
+
+Build or refresh offline with:  python -m services.handbook_index
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+HANDBOOK_PATH = os.path.join(BASE_DIR, "data", "Ncc-CadetHandbook.pdf")
+HANDBOOK_INDEX_PATH = os.path.join(BASE_DIR, "data", "handbook_index.bin")
+
+INDEX_MAGIC = b"NCCHBIX1"
+INDEX_VERSION = 1
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class _Mapping:
+    """
+    One opened index artifact. Never closed while it may be in use: a reload swaps in a new
+    mapping and the old one is unmapped once the last reader drops its reference.
+    """
+    __slots__ = ("data", "offsets", "blob_start", "header")
+
+    def __init__(self, data: mmap.mmap, offsets: memoryview, blob_start: int, header: Dict[str, Any]):
+        self.data = data
+        self.offsets = offsets
+        self.blob_start = blob_start
+        self.header = header
+
+    def page_text(self, page_number: int) -> str:
+        start = self.blob_start + self.offsets[page_number - 1]
+        end = self.blob_start + self.offsets[page_number]
+        return self.data[start:end].decode("utf-8")
+
+
+class HandbookIndex:
+    def __init__(self, pdf_path: str = HANDBOOK_PATH, index_path: str = HANDBOOK_INDEX_PATH):
+        self.pdf_path = pdf_path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._mapping: Optional[_Mapping] = None
+        self.builds = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._mapping is not None
+
+    @property
+    def header(self) -> Dict[str, Any]:
+        mapping = self._mapping
+        return mapping.header if mapping is not None else {}
+
+    @property
+    def page_count(self) -> int:
+        return self.header.get("page_count", 0)
+
+    @property
+    def sha256(self) -> Optional[str]:
+        """Content hash of the indexed PDF"""
+        return self.header.get("sha256")
+
+    def load(self) -> bool:
+        """
+        Map the index, rebuilding it first if the PDF changed. Blocking (a rebuild parses the PDF),
+        so run it off the event loop. Returns False when the handbook is missing or unreadable.
+        Readers are never blocked: the rebuilt index is swapped in only once it is fully mapped.
+        """
+        with self._lock:
+            if not os.path.exists(self.pdf_path):
+                logger.warning(f"Handbook not found at {self.pdf_path}; handbook index unavailable")
+                self._mapping = None
+                return False
+            stat = os.stat(self.pdf_path)
+            if self._mapping is None and os.path.exists(self.index_path):
+                try:
+                    self._mapping = self._open()
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable handbook index: {e}")
+            if self._mapping is not None and self._matches(stat):
+                return True
+
+            sha256 = file_sha256(self.pdf_path)
+            if self._mapping is not None and self.header.get("sha256") == sha256:
+                # Touched but unchanged: keep the text, record the new mtime
+                pages = list(self.pages())
+            else:
+                try:
+                    pages = self._extract(self.pdf_path)
+                except Exception as e:
+                    logger.error(f"Error extracting handbook text: {e}")
+                    return self._mapping is not None
+                self.builds += 1
+            try:
+                self._write(pages, stat, sha256)
+            except OSError as e:
+                logger.error(f"Error writing handbook index: {e}")
+                return self._mapping is not None
+            self._mapping = self._open()
+            logger.info(f"Handbook index ready: {self.page_count} pages")
+            return True
+
+    def ensure_loaded(self) -> bool:
+        return self.loaded or self.load()
+
+    def _matches(self, stat: os.stat_result) -> bool:
+        return (
+            self.header.get("version") == INDEX_VERSION
+            and self.header.get("size") == stat.st_size
+            and self.header.get("mtime_ns") == stat.st_mtime_ns
+        )
+
+    @staticmethod
+    def _extract(pdf_path: str) -> List[str]:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(pdf_path)
+        texts = []
+        for page in reader.pages:
+            try:
+                texts.append(page.extract_text() or "")
+            except Exception as e:
+                logger.warning(f"Could not extract text from a handbook page: {e}")
+                texts.append("")
+        return texts
+
+    def _write(self, pages: List[str], stat: os.stat_result, sha256: str) -> None:
+        encoded = [text.encode("utf-8") for text in pages]
+        offsets = array("Q", [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        header = json.dumps({
+            "version": INDEX_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "page_count": len(pages),
+            "built_at": time.time()
+        }).encode("utf-8")
+        header += b" " * (-(len(INDEX_MAGIC) + 4 + len(header)) % 8)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(offsets.tobytes())
+            for data in encoded:
+                f.write(data)
+        os.replace(tmp_path, self.index_path)
+
+    def _open(self) -> _Mapping:
+        with open(self.index_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapped[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                raise ValueError("bad magic")
+            (header_len,) = struct.unpack_from("<I", mapped, len(INDEX_MAGIC))
+            header_start = len(INDEX_MAGIC) + 4
+            header = json.loads(mapped[header_start:header_start + header_len])
+            offsets_start = header_start + header_len
+            offsets_end = offsets_start + (header["page_count"] + 1) * 8
+            offsets = memoryview(mapped)[offsets_start:offsets_end].cast("Q")
+            if offsets_end + offsets[-1] > len(mapped):
+                offsets.release()
+                raise ValueError("truncated")
+        except Exception:
+            mapped.close()
+            raise
+        return _Mapping(mapped, offsets, offsets_end, header)
+
+    def page_text(self, page_number: int) -> str:
+        """Text of a 1-indexed page (decoded from the mapping on demand)"""
+        mapping = self._mapping
+        if mapping is None or not 1 <= page_number <= mapping.header["page_count"]:
+            raise IndexError(f"Page {page_number} is not in the handbook index")
+        return mapping.page_text(page_number)
+
+    def pages(self) -> Iterator[str]:
+        """Text of every page in order (index 0 = page 1), all from the same build"""
+        mapping = self._mapping
+        if mapping is None:
+            return
+        for page_number in range(1, mapping.header["page_count"] + 1):
+            yield mapping.page_text(page_number)
+
+    def stats(self) -> Dict[str, Any]:
+        mapping = self._mapping
+        header = mapping.header if mapping is not None else {}
+        return {
+            "loaded": mapping is not None,
+            "page_count": header.get("page_count", 0),
+            "sha256": header.get("sha256"),
+            "index_bytes": len(mapping.data) if mapping is not None else 0,
+            "built_at": header.get("built_at"),
+            "builds": self.builds
+        }
+
+
+# Global handbook index instance
+handbook_index = HandbookIndex()
+
+def get_handbook_index() -> HandbookIndex:
+    """Dependency injection for FastAPI"""
+    return handbook_index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    handbook_index.load()
+    print(json.dumps({**handbook_index.stats(), "seconds": round(time.perf_counter() - started, 3)}, indent=2))
@@ -0,0 +1,289 @@
+"""
+Handbook Search for NCC ABYAS
+BM25 full-text search over Cadet Handbook pages. Pages come from the memory-mapped handbook
+index; the inverted index maps each term to page-sorted postings, so a page range is applied by
+bisecting into the postings instead of filtering results afterwards. English words are stemmed;
+Devanagari words are transliterated and phonetically folded so "anushasan" finds "अनुशासन".
+"""
+import os
+import re
+import math
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from services.handbook_index import handbook_index
+from services.retrieval_service import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+# Results returned per query unless the caller asks for fewer or more
+PDF_SEARCH_TOP_K = int(os.getenv("PDF_SEARCH_TOP_K", "10"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Snippet (match_text) and surrounding context window sizes, in characters
+SNIPPET_CHARS = 160
+CONTEXT_CHARS = 480
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[ऀ-ॿ]+")
+DEVANAGARI_PATTERN = re.compile(r"[ऀ-ॿ]")
+HINDI_PREFIX = "hi:"
+
+DEVANAGARI_VOWELS = {
+    "अ": "a", "आ": "aa", "इ": "i", "ई": "ii", "उ": "u", "ऊ": "uu", "ऋ": "ri",
+    "ए": "e", "ऐ": "ai", "ओ": "o", "औ": "au"
+}
+DEVANAGARI_MATRAS = {
+    "ा": "aa", "ि": "i", "ी": "ii", "ु": "u", "ू": "uu", "ृ": "ri",
+    "े": "e", "ै": "ai", "ो": "o", "ौ": "au"
+}
+DEVANAGARI_CONSONANTS = {
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n", "च": "ch", "छ": "chh", "ज": "j",
+    "झ": "jh", "ञ": "n", "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n", "त": "t",
+    "थ": "th", "द": "d", "ध": "dh", "न": "n", "प": "p", "फ": "ph", "ब": "b", "भ": "bh",
+    "म": "m", "य": "y", "र": "r", "ल": "l", "व": "v", "श": "sh", "ष": "sh", "स": "s", "ह": "h"
+}
+DEVANAGARI_NUKTA = {"क": "q", "ख": "kh", "ग": "g", "ज": "z", "ड": "r", "ढ": "rh", "फ": "f"}
+DEVANAGARI_SIGNS = {"ं": "n", "ँ": "n", "ः": "h"}
+VIRAMA = "्"
+NUKTA = "़"
+# Spelling variants of romanized Hindi collapsed before matching
+PHONETIC_FOLDS = (("aa", "a"), ("ee", "i"), ("ii", "i"), ("oo", "u"), ("uu", "u"), ("w", "v"), ("ph", "f"), ("z", "j"))
+
+# (suffix, replacement, minimum stem length left behind)
+STEM_RULES = (
+    ("ational", "ate", 3), ("ization", "ize", 3), ("fulness", "ful", 3), ("iveness", "ive", 3),
+    ("ations", "ate", 3), ("ation", "ate", 3), ("ments", "", 4), ("ment", "", 4), ("ness", "", 3),
+    ("sses", "ss", 2), ("ies", "y", 2), ("ing", "", 3), ("ed", "", 3), ("ly", "", 3), ("s", "", 3)
+)
+
+
+def transliterate(word: str) -> str:
+    """
+    Romanize a Devanagari word the way it is spoken: the inherent 'a' is dropped at the end of
+    the word and between a vowel and a consonant-vowel syllable (schwa deletion: एकता -> ektaa)
+    """
+    # [consonant, vowel, nasal/visarga, vowel is the inherent 'a']
+    syllables: List[List[Any]] = []
+    for i, char in enumerate(word):
+        if char in DEVANAGARI_CONSONANTS:
+            syllables.append([DEVANAGARI_CONSONANTS[char], "a", "", True])
+        elif char == NUKTA and syllables and word[i - 1] in DEVANAGARI_NUKTA:
+            syllables[-1][0] = DEVANAGARI_NUKTA[word[i - 1]]
+        elif char in DEVANAGARI_MATRAS and syllables:
+            syllables[-1][1] = DEVANAGARI_MATRAS[char]
+            syllables[-1][3] = False
+        elif char == VIRAMA and syllables:
+            syllables[-1][1] = ""
+            syllables[-1][3] = False
+        elif char in DEVANAGARI_VOWELS:
+            syllables.append(["", DEVANAGARI_VOWELS[char], "", False])
+        elif char in DEVANAGARI_SIGNS and syllables:
+            syllables[-1][2] += DEVANAGARI_SIGNS[char]
+
+    def deletable(syllable: List[Any]) -> bool:
+        return syllable[3] and not syllable[2]
+
+    if len(syllables) > 1 and deletable(syllables[-1]):
+        syllables[-1][1] = ""
+    # Right to left, so a deletion keeps the syllable before it from losing its vowel too
+    for i in range(len(syllables) - 2, 0, -1):
+        following = syllables[i + 1]
+        if deletable(syllables[i]) and syllables[i - 1][1] and following[0] and following[1]:
+            syllables[i][1] = ""
+    return "".join(consonant + vowel + coda for consonant, vowel, coda, _ in syllables)
+
+
+def phonetic_fold(word: str) -> str:
+    """Collapse common romanized-Hindi spelling variants (bhaarat/bharat, sainik/sainika)"""
+    for variant, folded in PHONETIC_FOLDS:
+        word = word.replace(variant, folded)
+    word = re.sub(r"(.)\1+", r"\1", word)
+    if len(word) > 3 and word.endswith("a"):
+        word = word[:-1]
+    return word
+
+
+def stem(word: str) -> str:
+    """Light suffix-stripping English stemmer; the same rules apply to pages and queries"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, replacement, min_stem in STEM_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            if suffix == "s" and word[-2] in "su":
+                return word
+            word = word[:-len(suffix)] + replacement
+            if suffix in ("ing", "ed") and len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                # running -> run, dropped -> drop
+                word = word[:-1]
+            break
+    while len(word) > 3 and word.endswith("e"):
+        # discipline/disciplined -> disciplin, agree/agreed -> agr
+        word = word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def index_term(token: str) -> str:
+    """Index term for a page token (cached: handbook vocabulary is small and repetitive)"""
+    if DEVANAGARI_PATTERN.match(token):
+        return HINDI_PREFIX + phonetic_fold(transliterate(token))
+    return stem(token)
+
+
+def query_terms(token: str) -> List[str]:
+    """Terms a query token may match: a Latin word also matches Devanagari words that sound alike"""
+    if DEVANAGARI_PATTERN.match(token):
+        return [HINDI_PREFIX + phonetic_fold(transliterate(token))]
+    return [stem(token), HINDI_PREFIX + phonetic_fold(token)]
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class HandbookSearch:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # term -> (page-sorted page numbers, term frequencies)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._idf: Dict[str, float] = {}
+        # Per-page BM25 length normalization k1 * (1 - b + b * len / avg_len), index = page number
+        self._norms: List[float] = []
+        self._source_sha: Optional[str] = None
+        self.queries = 0
+
+    def ensure_built(self) -> bool:
+        """(Re)build from the handbook index if it changed. Blocking on first use."""
+        if not handbook_index.ensure_loaded():
+            return False
+        if self._source_sha == handbook_index.sha256:
+            return True
+        with self._lock:
+            if self._source_sha != handbook_index.sha256:
+                self._build()
+        return True
+
+    def _build(self) -> None:
+        postings: Dict[str, Tuple[array, array]] = {}
+        lengths = [0]
+        for page_number, text in enumerate(handbook_index.pages(), start=1):
+            counts = Counter(index_term(token) for token in tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                pages, tfs = postings.setdefault(term, (array("I"), array("I")))
+                pages.append(page_number)
+                tfs.append(tf)
+        page_count = len(lengths) - 1
+        avg_length = (sum(lengths) / page_count) if page_count else 0.0
+        self._norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length) if avg_length else BM25_K1
+                       for length in lengths]
+        self._idf = {
+            term: math.log(1 + (page_count - len(pages) + 0.5) / (len(pages) + 0.5))
+            for term, (pages, _) in postings.items()
+        }
+        self._postings = postings
+        self._source_sha = handbook_index.sha256
+        logger.info(f"Handbook search index built: {page_count} pages, {len(postings)} terms")
+
+    def search(self, query: str, page_range: Optional[List[int]] = None, top_k: int = PDF_SEARCH_TOP_K) -> List[Dict[str, Any]]:
+        """Top-k pages by BM25, each with a snippet (match_text), wider context and score"""
+        self.queries += 1
+        if not self.ensure_built():
+            return []
+        terms = {term for token in tokenize(query) for term in query_terms(token) if term in self._postings}
+        if not terms:
+            return []
+
+        low, high, allowed = 1, len(self._norms) - 1, None
+        if page_range:
+            low, high = min(page_range), max(page_range)
+            if len(set(page_range)) != high - low + 1:
+                allowed = set(page_range)
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            pages, tfs = self._postings[term]
+            idf = self._idf[term]
+            norms = self._norms
+            for i in range(bisect_left(pages, low), len(pages)):
+                page = pages[i]
+                if page > high:
+                    break
+                if allowed is not None and page not in allowed:
+                    continue
+                tf = tfs[i]
+                scores[page] = scores.get(page, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norms[page])
+
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        candidates = self._candidate_pattern(terms)
+        results = []
+        for page, score in top:
+            match_text, context = self._snippet(handbook_index.page_text(page), terms, candidates)
+            results.append({"page_number": page, "match_text": match_text, "context": context, "score": round(score, 4)})
+        return results
+
+    @staticmethod
+    def _candidate_pattern(terms: set) -> "re.Pattern":
+        """
+        Words that might stem to a query term: Latin words sharing a stem's prefix, and any
+        Devanagari word when the query has Hindi terms. Candidates are confirmed with index_term,
+        so snippets skip stemming every word on the page.
+        """
+        prefixes = sorted({re.escape(term[:-1] if len(term) > 3 else term) for term in terms if not term.startswith(HINDI_PREFIX)})
+        alternatives = [rf"(?<![a-z0-9])(?:{'|'.join(prefixes)})[a-z0-9]*"] if prefixes else []
+        if any(term.startswith(HINDI_PREFIX) for term in terms):
+            alternatives.append(r"[ऀ-ॿ]+")
+        return re.compile("|".join(alternatives)) if alternatives else re.compile(r"(?!)")
+
+    @staticmethod
+    def _snippet(text: str, terms: set, candidates: "re.Pattern") -> Tuple[str, str]:
+        """The SNIPPET_CHARS window with the most query hits, and a CONTEXT_CHARS window around it"""
+        text = " ".join(text.split())
+        hits = [
+            match.start() for match in candidates.finditer(text.lower())
+            if index_term(match.group()) in terms
+        ]
+        if not hits:
+            return text[:SNIPPET_CHARS], text[:CONTEXT_CHARS]
+        best_start, best_count, left = hits[0], 0, 0
+        for right, position in enumerate(hits):
+            while position - hits[left] > SNIPPET_CHARS // 2:
+                left += 1
+            if right - left + 1 > best_count:
+                best_start, best_count = hits[left], right - left + 1
+        return HandbookSearch._window(text, best_start, SNIPPET_CHARS), HandbookSearch._window(text, best_start, CONTEXT_CHARS)
+
+    @staticmethod
+    def _window(text: str, anchor: int, size: int) -> str:
+        start = max(0, anchor - size // 4)
+        end = min(len(text), start + size)
+        start = max(0, end - size)
+        # Snap to word boundaries
+        if start > 0:
+            space = text.find(" ", start)
+            start = space + 1 if 0 <= space < anchor else start
+        if end < len(text):
+            space = text.rfind(" ", anchor, end)
+            end = space if space > anchor else end
+        return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pages": max(len(self._norms) - 1, 0),
+            "terms": len(self._postings),
+            "postings": sum(len(pages) for pages, _ in self._postings.values()),
+            "queries": self.queries
+        }
+
+
+# Global handbook search instance
+handbook_search = HandbookSearch()
+
+def get_handbook_search() -> HandbookSearch:
+    """Dependency injection for FastAPI"""
+    return handbook_search
@@ -0,0 +1,147 @@
+"""
+Conditional and range file responses for NCC ABYAS
+Serves files with a strong ETag (SHA-256 of the content) and Last-Modified, answers
+If-None-Match / If-Modified-Since with 304, and honours single byte ranges (206 / 416) so PDF
+viewers such as PDF.js can load large documents progressively.
+"""
+import os
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterator, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from services.handbook_index import file_sha256
+
+logger = logging.getLogger(__name__)
+
+RANGE_CHUNK_BYTES = 64 * 1024
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+# path -> (size, mtime_ns, etag); hashing a file once per version is enough
+_etags: Dict[str, Tuple[int, int, str]] = {}
+
+
+def file_etag(path: str, stat: os.stat_result, digest: Optional[str] = None) -> str:
+    """Strong ETag for the file's current content (`digest` skips hashing when already known)"""
+    cached = _etags.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    etag = f'"{digest or file_sha256(path)}"'
+    _etags[path] = (stat.st_size, stat.st_mtime_ns, etag)
+    return etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/"x" matches "x" """
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return int(mtime) <= since
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single `bytes=` range, None when the header should be ignored
+    (malformed or multiple ranges), or (-1, -1) when it cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return (-1, -1)
+            return (max(0, size - length), size - 1)
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if end is not None and start > end:
+        return None
+    if start >= size:
+        return (-1, -1)
+    return (start, size - 1 if end is None else min(end, size - 1))
+
+
+class _WholeFileResponse(FileResponse):
+    """FileResponse that ignores the request's Range headers; conditional_file_response already applied them"""
+
+    async def __call__(self, scope, receive, send) -> None:
+        headers = [(name, value) for name, value in scope["headers"] if name not in (b"range", b"if-range")]
+        await super().__call__({**scope, "headers": headers}, receive, send)
+
+
+def _iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def conditional_file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    digest: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    cache_control: str = DEFAULT_CACHE_CONTROL
+) -> Response:
+    """
+    File response with validators: 304 when the client's copy is current, 206 for a satisfiable
+    byte range (ignored if If-Range no longer matches), 416 for an unsatisfiable one, else 200.
+    Raises FileNotFoundError if the file is missing.
+    """
+    stat = os.stat(path)
+    etag = file_etag(path, stat, digest)
+    base_headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=base_headers)
+    elif if_modified_since and _not_modified_since(if_modified_since, stat.st_mtime):
+        return Response(status_code=304, headers=base_headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag and if_range.strip() != base_headers["Last-Modified"]:
+        # The client's partial copy is of another version: send the whole file
+        range_header = None
+    byte_range = parse_range(range_header, stat.st_size) if range_header else None
+
+    if byte_range == (-1, -1):
+        return Response(status_code=416, headers={**base_headers, "Content-Range": f"bytes */{stat.st_size}"})
+    if byte_range is not None:
+        start, end = byte_range
+        range_headers = {
+            **base_headers,
+            "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+            "Content-Length": str(end - start + 1)
+        }
+        if request.method == "HEAD":
+            return Response(status_code=206, headers=range_headers, media_type=media_type)
+        return StreamingResponse(_iter_file_range(path, start, end), status_code=206,
+                                 headers=range_headers, media_type=media_type)
+
+    return _WholeFileResponse(path=path, media_type=media_type, headers=base_headers, stat_result=stat)
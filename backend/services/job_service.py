@@ -0,0 +1,232 @@
+"""
+Job Service for NCC ABYAS
+Runs long document-processing work (extraction, OCR, generation) outside the HTTP request.
+Submitting returns a job id at once; a bounded pool of worker tasks executes queued jobs and
+records per-stage progress. Job records are persisted under data/jobs/ and expire after a TTL.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+JOBS_DIR = os.path.join(BASE_DIR, "data", "jobs")
+
+# Jobs executed at the same time per worker process
+DOC_JOB_WORKERS = int(os.getenv("DOC_JOB_WORKERS", "2"))
+# Jobs waiting for a worker; beyond this submissions are rejected
+DOC_JOB_MAX_QUEUE = int(os.getenv("DOC_JOB_MAX_QUEUE", "50"))
+# Finished job records (and their results) are kept this long
+DOC_JOB_TTL_SECONDS = int(os.getenv("DOC_JOB_TTL_SECONDS", str(24 * 3600)))
+# Seconds between sweeps for expired job records
+JOB_SWEEP_INTERVAL = 600
+
+STAGE_PENDING = "pending"
+STAGE_RUNNING = "running"
+STAGE_DONE = "done"
+STAGE_SKIPPED = "skipped"
+STAGE_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when DOC_JOB_MAX_QUEUE jobs are already waiting"""
+
+
+class Job:
+    """Mutable job record; handlers report progress through `stage()`"""
+
+    def __init__(self, record: Dict[str, Any], service: "JobService"):
+        self.record = record
+        self._service = service
+
+    @property
+    def id(self) -> str:
+        return self.record["id"]
+
+    def stage(self, name: str, status: str, progress: Optional[float] = None, detail: Optional[str] = None) -> None:
+        stage = self.record["stages"][name]
+        stage["status"] = status
+        if progress is not None:
+            stage["progress"] = round(min(max(progress, 0.0), 1.0), 3)
+        elif status in (STAGE_DONE, STAGE_SKIPPED):
+            stage["progress"] = 1.0
+        if detail is not None:
+            stage["detail"] = detail
+        self._service._save(self.record)
+
+
+JobHandler = Callable[[Job], Awaitable[Any]]
+
+
+class JobService:
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = DOC_JOB_WORKERS, max_queue: int = DOC_JOB_MAX_QUEUE):
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._last_sweep = 0.0
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, record: Dict[str, Any]) -> None:
+        record["updated_at"] = datetime.now().isoformat()
+        tmp_path = f"{self._path(record['id'])}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.replace(tmp_path, self._path(record["id"]))
+        except Exception as e:
+            logger.error(f"Error saving job {record['id']}: {e}")
+
+    def _recover(self) -> None:
+        """Load persisted jobs; ones interrupted by a restart are marked failed"""
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading job record {name}: {e}")
+                continue
+            if record.get("status") in ("queued", "running"):
+                record["status"] = "failed"
+                record["error"] = "Interrupted by a server restart; please resubmit"
+                record["expires_at"] = time.time() + DOC_JOB_TTL_SECONDS
+                self._save(record)
+            self._records[record["id"]] = record
+        self._sweep(force=True)
+
+    def _sweep(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_sweep < JOB_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for job_id, record in list(self._records.items()):
+            if record.get("expires_at") and record["expires_at"] <= now:
+                del self._records[job_id]
+                try:
+                    os.remove(self._path(job_id))
+                except FileNotFoundError:
+                    pass
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        self._recover()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def submit(self, kind: str, stages: List[str], handler: JobHandler, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Queue a job and return its record; `handler(job)` returns the job result"""
+        if self._queue is None:
+            raise RuntimeError("Job service is not started")
+        if self._queue.qsize() >= self.max_queue:
+            raise JobQueueFullError(f"{self._queue.qsize()} jobs are already waiting; try again shortly")
+        self._sweep()
+        now = datetime.now().isoformat()
+        record = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "stages": {name: {"status": STAGE_PENDING, "progress": 0.0} for name in stages},
+            "meta": meta or {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": None
+        }
+        self._records[record["id"]] = record
+        self._save(record)
+        self._queue.put_nowait((record["id"], handler))
+        return record
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._sweep()
+        record = self._records.get(job_id)
+        if record and record.get("expires_at") and record["expires_at"] <= time.time():
+            return None
+        if record and record["status"] == "queued":
+            # Jobs ahead of this one in the queue
+            record = {**record, "queue_position": self._queue_position(job_id)}
+        return record
+
+    def _queue_position(self, job_id: str) -> Optional[int]:
+        if self._queue is None:
+            return None
+        for position, (queued_id, _) in enumerate(list(self._queue._queue)):
+            if queued_id == job_id:
+                return position
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, handler = await self._queue.get()
+            record = self._records.get(job_id)
+            if record is None:
+                self._queue.task_done()
+                continue
+            job = Job(record, self)
+            record["status"] = "running"
+            record["started_at"] = datetime.now().isoformat()
+            self._save(record)
+            try:
+                record["result"] = await handler(job)
+                record["status"] = "succeeded"
+            except asyncio.CancelledError:
+                record["status"] = "failed"
+                record["error"] = "Cancelled by server shutdown; please resubmit"
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                record["status"] = "failed"
+                record["error"] = str(e)
+                for stage in record["stages"].values():
+                    if stage["status"] == STAGE_RUNNING:
+                        stage["status"] = STAGE_FAILED
+            finally:
+                record["finished_at"] = datetime.now().isoformat()
+                record["expires_at"] = time.time() + DOC_JOB_TTL_SECONDS
+                self._save(record)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for record in self._records.values():
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "jobs": statuses
+        }
+
+
+# Global job service instance
+job_service = JobService()
+
+def get_job_service() -> JobService:
+    """Dependency injection for FastAPI"""
+    return job_service
@@ -0,0 +1,257 @@
+"""
+Text generation backends for NCC ABYAS
+AIQuizService talks to a GenerationBackend instead of the Gemini SDK directly, so a local
+stub can stand in for load and regression testing without network access or API quota.
+
+Select with LLM_BACKEND=gemini (default) or LLM_BACKEND=stub.
+"""
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+from services.resilience import NonRetryableError
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+MODEL_NAME = 'gemini-1.5-flash'
+
+# Stub behaviour: latency spec is "fixed:<ms>", "uniform:<min_ms>,<max_ms>" or "lognormal:<median_ms>,<sigma>"
+LLM_STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:800,0.5")
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+# Characters per streamed chunk
+LLM_STUB_CHUNK_CHARS = int(os.getenv("LLM_STUB_CHUNK_CHARS", "40"))
+
+STUB_VOCABULARY = (
+    "drill parade salute rifle bearing compass contour grid camp tent knot lashing bandage splint "
+    "fracture leadership discipline unity integration flag anthem rank cadet officer wing army navy "
+    "air squadron battalion directorate certificate camouflage section platoon obstacle signal "
+    "stretcher casualty evacuation fire shelter siren blood donation literacy environment tree"
+).split()
+
+
+class GenerationError(Exception):
+    """Raised by a backend when a generation call fails"""
+
+
+class GenerationBlockedError(GenerationError, NonRetryableError):
+    """Raised when the provider refused to answer (safety block); retrying cannot help"""
+
+
+class GenerationBackend(ABC):
+    """Interface every generation backend implements"""
+    name = "base"
+
+    def __init__(self):
+        # Set when the backend cannot serve requests (missing key, failed init, ...)
+        self.error: Optional[str] = None
+
+    @abstractmethod
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Return the full generated text"""
+
+    @abstractmethod
+    def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Yield generated text chunk by chunk (implemented as an async generator)"""
+
+
+class UnavailableBackend(GenerationBackend):
+    """Placeholder for a backend that could not be selected; `error` says why"""
+    name = "unavailable"
+
+    def __init__(self, error: str):
+        super().__init__()
+        self.error = error
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        raise GenerationError(self.error)
+
+    def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        raise GenerationError(self.error)
+
+
+class GeminiBackend(GenerationBackend):
+    name = "gemini"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        super().__init__()
+        self.model = None
+        try:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key or api_key == "your_api_key_here":
+                self.error = "GEMINI_API_KEY environment variable not set"
+                return
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            self.model = genai.GenerativeModel(model_name)
+        except Exception as e:
+            self.error = f"Failed to initialize Gemini model: {str(e)}"
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        response = await self.model.generate_content_async(prompt, generation_config=generation_config)
+        if not response:
+            return ""
+        try:
+            return response.text
+        except ValueError as e:
+            # The SDK raises ValueError from .text when the candidate was blocked and has no parts
+            raise GenerationBlockedError(f"Response blocked: {getattr(response, 'prompt_feedback', None) or e}") from e
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=generation_config,
+            stream=True
+        )
+        async for chunk in response:
+            text = chunk.text if chunk.parts else ""
+            if text:
+                yield text
+
+
+class StubBackend(GenerationBackend):
+    """
+    Offline backend producing well-formed quiz or chat output.
+    Output is deterministic per prompt (and LLM_STUB_SEED); latency and failures are drawn
+    from the configured distributions so server overhead and concurrency can be benchmarked.
+    """
+    name = "stub"
+
+    def __init__(
+        self,
+        latency: str = LLM_STUB_LATENCY,
+        failure_rate: float = LLM_STUB_FAILURE_RATE,
+        seed: int = LLM_STUB_SEED,
+        chunk_chars: int = LLM_STUB_CHUNK_CHARS
+    ):
+        super().__init__()
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.chunk_chars = max(1, chunk_chars)
+        self._jitter = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        try:
+            self._latency_kind, self._latency_args = self._parse_latency(latency)
+        except ValueError as e:
+            self.error = f"Invalid LLM_STUB_LATENCY: {e}"
+
+    @staticmethod
+    def _parse_latency(spec: str):
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v.strip()]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"'{spec}' (use fixed:<ms>, uniform:<min>,<max> or lognormal:<median>,<sigma>)")
+        return kind, values
+
+    def _latency_seconds(self) -> float:
+        if self._latency_kind == "fixed":
+            ms = self._latency_args[0]
+        elif self._latency_kind == "uniform":
+            ms = self._jitter.uniform(*self._latency_args)
+        else:
+            median, sigma = self._latency_args
+            ms = median * self._jitter.lognormvariate(0, sigma)
+        return max(ms, 0) / 1000
+
+    def _maybe_fail(self) -> None:
+        self.calls += 1
+        if self.failure_rate and self._jitter.random() < self.failure_rate:
+            self.failures += 1
+            raise GenerationError("Stub backend injected failure")
+
+    def _rng_for(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def respond(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Deterministic response text for a prompt"""
+        rng = self._rng_for(prompt)
+        if "ANSWER:" in prompt and "EXPLANATION:" in prompt:
+            count_match = re.search(r"(?:generate|create)\s+(?:exactly\s+)?(\d+)", prompt, re.IGNORECASE)
+            topic_match = (re.search(r'NCC topic:\s*"([^"]+)"', prompt)
+                           or re.search(r"Topic:\s*(.+)", prompt))
+            count = int(count_match.group(1)) if count_match else 5
+            topic = topic_match.group(1).strip() if topic_match else "NCC"
+            questions = self._quiz_questions(topic, count, rng)
+            if (generation_config or {}).get("response_mime_type") == "application/json":
+                return json.dumps(questions)
+            return "\n---\n".join(
+                f"Q: {q['question']}\n"
+                + "".join(f"{letter}) {text}\n" for letter, text in q["options"].items())
+                + f"ANSWER: {q['answer']}\nEXPLANATION: {q['explanation']}"
+                for q in questions
+            )
+        return self._chat_text(prompt, rng)
+
+    @staticmethod
+    def _quiz_questions(topic: str, count: int, rng: random.Random) -> List[Dict[str, Any]]:
+        # Varied vocabulary so stub questions do not look like near-duplicates of each other
+        questions = []
+        for i in range(count):
+            token = rng.randrange(10 ** 6)
+            answer = rng.choice("ABCD")
+            subject = " ".join(rng.sample(STUB_VOCABULARY, 4))
+            questions.append({
+                "question": f"[{topic}] Stub question {i + 1} (ref {token:06d}): which applies to {subject}?",
+                "options": {letter: " ".join(rng.sample(STUB_VOCABULARY, 3)) for letter in "ABCD"},
+                "answer": answer,
+                "explanation": f"The stub backend marked option {answer} as correct for reference {token:06d}."
+            })
+        return questions
+
+    @staticmethod
+    def _chat_text(prompt: str, rng: random.Random) -> str:
+        question_match = re.search(r"User(?:'s question)?:\s*(.+?)\s*(?:\n\s*\n|Assistant:|$)", prompt, re.DOTALL)
+        question = question_match.group(1).strip() if question_match else "your question"
+        sentences = [
+            "NCC training builds discipline, leadership and a spirit of selfless service.",
+            "Cadets should revise this topic from the Cadet Handbook before their certificate exams.",
+            "Practical drill and regular camps help reinforce what is learned in theory classes.",
+            "Ask your ANO or PI staff if any part of this needs a demonstration."
+        ]
+        rng.shuffle(sentences)
+        return f"(stub reply) Regarding \"{question[:200]}\": " + " ".join(sentences[:rng.randint(2, 4)])
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        await asyncio.sleep(self._latency_seconds())
+        self._maybe_fail()
+        return self.respond(prompt, generation_config)
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        text = self.respond(prompt, generation_config)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        total = self._latency_seconds()
+        # Spend roughly a fifth of the latency before the first chunk, spread the rest over the stream
+        await asyncio.sleep(total * 0.2)
+        self._maybe_fail()
+        per_chunk = total * 0.8 / max(len(chunks), 1)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(per_chunk)
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def create_backend(name: str = LLM_BACKEND) -> GenerationBackend:
+    """Instantiate the backend selected by LLM_BACKEND"""
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        return UnavailableBackend(f"Unknown LLM_BACKEND '{name}'. Use one of: {', '.join(BACKENDS)}")
+    backend = backend_cls()
+    if backend.error:
+        logger.warning(f"{backend.name} backend unavailable: {backend.error}")
+    else:
+        logger.info(f"Using {backend.name} generation backend")
+    return backend
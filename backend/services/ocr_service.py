@@ -0,0 +1,407 @@
+"""
+OCR Service for NCC ABYAS
+Runs PDF text extraction, rasterization and Tesseract OCR in a bounded process pool so uploads
+never block the event loop. Scanned PDFs are split into page ranges that are OCRed in parallel.
+Workers read the spooled upload from disk and rasterize one page at a time, so memory per upload
+stays flat however many pages it has.
+"""
+import os
+import math
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+from services.extraction_cache import extraction_cache
+from services.upload_spool import SpooledUpload
+from services.job_service import STAGE_RUNNING, STAGE_DONE, STAGE_SKIPPED
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for OCR and PDF work
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+# Jobs (page ranges or images) allowed queued or running at once; beyond this uploads get a 503
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", str(OCR_WORKERS * 8)))
+# Deadline for one job, and the Tesseract/poppler timeout applied to each page inside it
+OCR_JOB_TIMEOUT_SECONDS = float(os.getenv("OCR_JOB_TIMEOUT_SECONDS", "180"))
+OCR_PAGE_TIMEOUT_SECONDS = int(os.getenv("OCR_PAGE_TIMEOUT_SECONDS", "60"))
+
+# Preprocessing before Tesseract: grayscale, downscale, Otsu binarization and deskew
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+# Scanned PDF pages are rendered in grayscale at this DPI; pages yielding almost no text are
+# rendered once more at OCR_RETRY_DPI in case the print was too small
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "150"))
+OCR_RETRY_DPI = int(os.getenv("OCR_RETRY_DPI", "300"))
+OCR_RETRY_MIN_CHARS = 25
+# Uploaded images are downscaled so their longer side is at most this many pixels (~200 DPI A4)
+OCR_MAX_IMAGE_SIDE = int(os.getenv("OCR_MAX_IMAGE_SIDE", "2400"))
+# Skew is searched within +/- this many degrees
+OCR_DESKEW_MAX_ANGLE = float(os.getenv("OCR_DESKEW_MAX_ANGLE", "5"))
+DESKEW_STEP = 0.5
+DESKEW_SAMPLE_WIDTH = 800
+# Stop OCRing further pages once this many characters are extracted (0 = no limit)
+OCR_MAX_CHARS = int(os.getenv("OCR_MAX_CHARS", "20000"))
+
+IMAGE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/jpg", "image/gif"}
+
+# on_stage(stage, status, progress=None, detail=None), e.g. Job.stage
+StageCallback = Callable[..., None]
+
+
+class OCRQueueFullError(Exception):
+    """Raised when the OCR queue is at OCR_MAX_QUEUE"""
+
+
+# Worker functions run in child processes, so they import their libraries themselves
+
+def _extract_pdf_text(pdf_path: str) -> List[str]:
+    from PyPDF2 import PdfReader
+    # PdfReader parses pages lazily from the file
+    reader = PdfReader(pdf_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    """Gray level that best separates ink from paper (maximum between-class variance)"""
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    weight_background = 0
+    sum_background = 0
+    best_threshold, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def _estimate_skew(binary, max_angle: float) -> float:
+    """
+    Rotation (degrees) that straightens text lines: the angle whose horizontal projection
+    profile has the highest variance, i.e. rows alternate sharply between ink and gaps.
+    """
+    from PIL import Image, ImageOps
+    if max_angle <= 0:
+        return 0.0
+    sample = binary
+    if binary.width > DESKEW_SAMPLE_WIDTH:
+        sample = binary.resize((DESKEW_SAMPLE_WIDTH, max(1, round(binary.height * DESKEW_SAMPLE_WIDTH / binary.width))))
+    ink = ImageOps.invert(sample)
+    best_angle, best_score = 0.0, -1.0
+    steps = int(2 * max_angle / DESKEW_STEP)
+    for i in range(steps + 1):
+        angle = -max_angle + i * DESKEW_STEP
+        rotated = ink.rotate(angle, resample=Image.NEAREST, fillcolor=0)
+        # Resizing to one column averages each row in C
+        profile = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        mean = sum(profile) / len(profile)
+        score = sum((value - mean) ** 2 for value in profile)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess_image(image, max_side: int = OCR_MAX_IMAGE_SIDE, max_skew: float = OCR_DESKEW_MAX_ANGLE):
+    """Grayscale, downscale, binarize (Otsu) and deskew an image for Tesseract"""
+    from PIL import Image
+    gray = image.convert("L")
+    longest = max(gray.size)
+    if longest > max_side:
+        scale = max_side / longest
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.LANCZOS)
+    threshold = _otsu_threshold(gray.histogram())
+    binary = gray.point([0 if level <= threshold else 255 for level in range(256)])
+    angle = _estimate_skew(binary, max_skew)
+    if angle:
+        binary = binary.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    return binary
+
+
+def _tesseract(image, page_timeout: int) -> str:
+    import pytesseract
+    prepared = preprocess_image(image) if OCR_PREPROCESS else image
+    try:
+        return pytesseract.image_to_string(prepared, timeout=page_timeout)
+    except RuntimeError as e:
+        # pytesseract raises RuntimeError when its timeout kills Tesseract
+        logger.warning(f"OCR timed out: {e}")
+        return ""
+    finally:
+        if prepared is not image:
+            prepared.close()
+
+
+def _ocr_pdf_page(pdf_path: str, page: int, dpi: int, page_timeout: int) -> str:
+    from pdf2image import convert_from_path
+    # One page at a time keeps only a single rasterized page in memory
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page,
+                               grayscale=OCR_PREPROCESS, timeout=page_timeout)
+    texts = []
+    for image in images:
+        try:
+            texts.append(_tesseract(image, page_timeout))
+        finally:
+            image.close()
+    return "\n".join(texts)
+
+
+def _ocr_pdf_pages(pdf_path: str, first_page: int, last_page: int, page_timeout: int, char_budget: int = 0) -> List[str]:
+    texts = []
+    extracted = 0
+    for page in range(first_page, last_page + 1):
+        if char_budget and extracted >= char_budget:
+            texts.append("")
+            continue
+        text = _ocr_pdf_page(pdf_path, page, OCR_PDF_DPI, page_timeout)
+        if len(text.strip()) < OCR_RETRY_MIN_CHARS and OCR_RETRY_DPI > OCR_PDF_DPI:
+            retry = _ocr_pdf_page(pdf_path, page, OCR_RETRY_DPI, page_timeout)
+            if len(retry.strip()) > len(text.strip()):
+                text = retry
+        texts.append(text)
+        extracted += len(text)
+    return texts
+
+
+def _ocr_image(image_path: str, page_timeout: int) -> str:
+    from PIL import Image
+    with Image.open(image_path) as image:
+        if OCR_PREPROCESS:
+            # JPEG can decode straight to a smaller grayscale image
+            image.draft("L", (OCR_MAX_IMAGE_SIDE, OCR_MAX_IMAGE_SIDE))
+        return _tesseract(image, page_timeout)
+
+
+class OCRService:
+    def __init__(self, workers: int = OCR_WORKERS, max_queue: int = OCR_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.pages_skipped = 0
+        self.pool_restarts = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that already runs threads (thread pool, TestClient, ...) can deadlock the child
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def _reserve(self, jobs: int) -> None:
+        if self.queued + jobs > self.max_queue:
+            self.rejected += 1
+            raise OCRQueueFullError(f"OCR queue is full ({self.queued} jobs pending); try again shortly")
+        self.queued += jobs
+
+    def _discard_pool(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next `_pool()` call starts fresh workers"""
+        if self._executor is executor:
+            self._executor = None
+            self.pool_restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, completed: bool = True) -> None:
+        """Free one reserved queue slot; `completed` is False for jobs that never ran"""
+        self.queued -= 1
+        if completed:
+            self.completed += 1
+
+    async def _run(self, func, *args, default):
+        """
+        Run one job in the pool with the per-job deadline; failures and timeouts yield `default`.
+        If a worker died (OOM kill, unpicklable exception, ...) the pool is rebuilt and the job
+        retried once. The job's queue slot is held until its worker is actually done with it.
+        """
+        loop = asyncio.get_running_loop()
+        job = None
+        try:
+            for attempt in range(2):
+                executor = self._pool()
+                try:
+                    job = executor.submit(func, *args)
+                    return await asyncio.wait_for(asyncio.wrap_future(job), timeout=OCR_JOB_TIMEOUT_SECONDS)
+                except BrokenProcessPool as e:
+                    logger.warning(f"OCR pool broken during {func.__name__} (attempt {attempt + 1}): {e}")
+                    self._discard_pool(executor)
+                    job = None
+            return default
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            # The worker keeps running until Tesseract's own per-page timeout stops it
+            logger.warning(f"OCR job {func.__name__} exceeded {OCR_JOB_TIMEOUT_SECONDS:.0f}s")
+            return default
+        except Exception as e:
+            logger.warning(f"OCR job {func.__name__} failed: {e}")
+            return default
+        finally:
+            if job is not None and not job.done():
+                job.add_done_callback(lambda _: self._release_threadsafe(loop))
+            else:
+                self._release()
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            pass
+
+    async def pdf_text(self, pdf_path: str) -> Optional[List[str]]:
+        """Embedded text of every page (no OCR), or None if the PDF could not be read"""
+        self._reserve(1)
+        return await self._run(_extract_pdf_text, pdf_path, default=None)
+
+    async def ocr_pdf(
+        self,
+        pdf_path: str,
+        page_count: int,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[Optional[str]]:
+        """
+        OCR every page, spreading contiguous page ranges across the worker processes.
+        Pages whose job failed or timed out are None. Once OCR_MAX_CHARS characters are extracted,
+        remaining pages are skipped (empty text).
+        `on_progress(pages_done, page_count)` is called as each range finishes.
+        """
+        if page_count <= 0:
+            return []
+        jobs = min(page_count, self.workers * 2)
+        per_job = math.ceil(page_count / jobs)
+        ranges = [(first, min(first + per_job - 1, page_count)) for first in range(1, page_count + 1, per_job)]
+        self._reserve(len(ranges))
+        # Ranges start in page order, at most one per worker, so the character budget can stop the tail early
+        slots = asyncio.Semaphore(self.workers)
+        pages_done = 0
+        extracted = 0
+
+        async def run_range(first: int, last: int) -> List[str]:
+            nonlocal pages_done, extracted
+            # _run releases the slot of a job it started; a skipped or cancelled range releases its own
+            submitted = False
+            try:
+                async with slots:
+                    budget = OCR_MAX_CHARS - extracted if OCR_MAX_CHARS else 0
+                    if OCR_MAX_CHARS and budget <= 0:
+                        self.pages_skipped += last - first + 1
+                        texts = [""] * (last - first + 1)
+                    else:
+                        submitted = True
+                        texts = await self._run(_ocr_pdf_pages, pdf_path, first, last, OCR_PAGE_TIMEOUT_SECONDS,
+                                                budget, default=[None] * (last - first + 1))
+                        extracted += sum(len(text or "") for text in texts)
+            finally:
+                if not submitted:
+                    self._release(completed=False)
+            pages_done += last - first + 1
+            if on_progress:
+                on_progress(pages_done, page_count)
+            return texts
+
+        results = await asyncio.gather(*(run_range(first, last) for first, last in ranges))
+        return [text for texts in results for text in texts]
+
+    async def ocr_image(self, image_path: str) -> Optional[str]:
+        """OCR text of an image, or None if the job failed"""
+        self._reserve(1)
+        return await self._run(_ocr_image, image_path, OCR_PAGE_TIMEOUT_SECONDS, default=None)
+
+    async def extract_pages(
+        self,
+        upload: SpooledUpload,
+        on_stage: Optional[StageCallback] = None
+    ) -> List[str]:
+        """
+        Per-page text of an uploaded PDF (OCR fallback for scans) or image.
+        Results are cached by content hash; a repeat upload skips extraction and OCR entirely.
+        Progress is reported through `on_stage` for the "extract" and "ocr" stages.
+        """
+        report = on_stage or (lambda *args, **kwargs: None)
+        content_type = upload.content_type
+        if content_type != "application/pdf" and content_type not in IMAGE_CONTENT_TYPES:
+            report("extract", STAGE_SKIPPED)
+            report("ocr", STAGE_SKIPPED)
+            return []
+
+        digest = upload.digest
+        cached = extraction_cache.get(digest)
+        if cached is not None:
+            report("extract", STAGE_SKIPPED, detail="cached")
+            report("ocr", STAGE_SKIPPED, detail="cached")
+            return cached
+
+        if content_type == "application/pdf":
+            report("extract", STAGE_RUNNING)
+            pages = await self.pdf_text(upload.path)
+            if pages is None:
+                report("extract", STAGE_DONE, detail="unreadable PDF")
+                report("ocr", STAGE_SKIPPED)
+                return []
+            report("extract", STAGE_DONE, detail=f"{len(pages)} pages")
+            method = "text"
+            if pages and not "".join(pages).strip():
+                # Scanned PDF: no embedded text layer
+                report("ocr", STAGE_RUNNING, progress=0.0)
+                pages = await self.ocr_pdf(
+                    upload.path, len(pages),
+                    on_progress=lambda done, total: report("ocr", STAGE_RUNNING, progress=done / total,
+                                                           detail=f"{done}/{total} pages")
+                )
+                report("ocr", STAGE_DONE)
+                method = "ocr"
+            else:
+                report("ocr", STAGE_SKIPPED)
+        else:
+            report("extract", STAGE_SKIPPED)
+            report("ocr", STAGE_RUNNING)
+            pages = [await self.ocr_image(upload.path)]
+            report("ocr", STAGE_DONE)
+            method = "image_ocr"
+
+        # Failed or timed-out pages are not cached, so a later upload gets another try
+        if None not in pages:
+            extraction_cache.put(digest, pages, method)
+        return [text or "" for text in pages]
+
+    async def extract_text(self, upload: SpooledUpload) -> Optional[str]:
+        """Readable text of an uploaded PDF (OCR fallback for scans) or image, or None"""
+        text = "\n".join(await self.extract_pages(upload))
+        return text if text.strip() else None
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "pages_skipped": self.pages_skipped,
+            "pool_restarts": self.pool_restarts,
+            "extraction_cache": extraction_cache.stats()
+        }
+
+
+# Global OCR service instance
+ocr_service = OCRService()
+
+def get_ocr_service() -> OCRService:
+    """Dependency injection for FastAPI"""
+    return ocr_service
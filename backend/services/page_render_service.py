@@ -0,0 +1,305 @@
+"""
+Page Render Service for NCC ABYAS
+Rasterizes single Cadet Handbook pages to WebP/PNG so clients can show one page without
+downloading the whole PDF. Renders run in a process pool and are cached in two tiers: an
+in-memory LRU for hot pages and an on-disk cache that survives restarts. Cache keys include the
+handbook's content hash, so a new handbook never serves stale images. Widths snap to a few
+buckets to keep the number of cached variants small. Pages requested most often are recorded
+and prerendered at the next startup.
+"""
+import io
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+from services.handbook_index import handbook_index
+from services.request_coalescer import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+PAGE_CACHE_DIR = os.path.join(BASE_DIR, "data", "page_cache")
+POPULARITY_PATH = os.path.join(PAGE_CACHE_DIR, "popularity.json")
+
+# Worker processes rasterizing pages
+PAGE_RENDER_WORKERS = int(os.getenv("PAGE_RENDER_WORKERS", "2"))
+PAGE_RENDER_TIMEOUT_SECONDS = int(os.getenv("PAGE_RENDER_TIMEOUT_SECONDS", "30"))
+# In-memory LRU and on-disk cache budgets for rendered images
+PAGE_RENDER_MEMORY_MB = float(os.getenv("PAGE_RENDER_MEMORY_MB", "64"))
+PAGE_RENDER_DISK_MB = float(os.getenv("PAGE_RENDER_DISK_MB", "512"))
+# Pages prerendered at startup (most requested first, then chapter openings)
+PAGE_PRERENDER_COUNT = int(os.getenv("PAGE_PRERENDER_COUNT", "20"))
+# Requested widths are rounded up to the nearest bucket
+PAGE_IMAGE_WIDTHS = (320, 480, 640, 800, 1024, 1280, 1600)
+PAGE_IMAGE_DEFAULT_WIDTH = 800
+WEBP_QUALITY = 80
+
+
+class PageRenderError(Exception):
+    """Raised when a page could not be rasterized"""
+
+
+def webp_supported() -> bool:
+    from PIL import features
+    return bool(features.check("webp"))
+
+
+def snap_width(width: Optional[int]) -> int:
+    if not width:
+        return PAGE_IMAGE_DEFAULT_WIDTH
+    for bucket in PAGE_IMAGE_WIDTHS:
+        if width <= bucket:
+            return bucket
+    return PAGE_IMAGE_WIDTHS[-1]
+
+
+def _render_page(pdf_path: str, page: int, width: int, image_format: str, timeout: int) -> bytes:
+    from pdf2image import convert_from_path
+    images = convert_from_path(pdf_path, first_page=page, last_page=page, size=(width, None), timeout=timeout)
+    if not images:
+        raise PageRenderError(f"Page {page} produced no image")
+    image = images[0]
+    try:
+        buffer = io.BytesIO()
+        if image_format == "webp":
+            image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+        else:
+            image.save(buffer, "PNG", optimize=True)
+        return buffer.getvalue()
+    finally:
+        image.close()
+
+
+class PageRenderService:
+    def __init__(
+        self,
+        cache_dir: str = PAGE_CACHE_DIR,
+        workers: int = PAGE_RENDER_WORKERS,
+        memory_bytes: int = int(PAGE_RENDER_MEMORY_MB * 1024 * 1024),
+        disk_bytes: int = int(PAGE_RENDER_DISK_MB * 1024 * 1024)
+    ):
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        # file name -> (size in bytes, last access time)
+        self._disk: Dict[str, Tuple[int, float]] = {}
+        self._disk_lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._popularity: Counter = Counter()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+        self.failures = 0
+        self.pool_restarts = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.endswith((".webp", ".png")):
+                stat = os.stat(os.path.join(cache_dir, name))
+                self._disk[name] = (stat.st_size, stat.st_mtime)
+        try:
+            with open(POPULARITY_PATH, 'r', encoding='utf-8') as f:
+                self._popularity.update({int(page): hits for page, hits in json.load(f).items()})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable page popularity file: {e}")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that already runs threads (thread pool, TestClient, ...) can deadlock the child
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    @staticmethod
+    def _key(page: int, width: int, image_format: str) -> str:
+        return f"{handbook_index.sha256[:16]}-p{page}-w{width}.{image_format}"
+
+    async def render(self, page: int, width: Optional[int] = None, image_format: str = "webp") -> bytes:
+        """Encoded image of a handbook page; raises ValueError for a page out of range"""
+        if not handbook_index.loaded and not await asyncio.to_thread(handbook_index.load):
+            raise PageRenderError("Handbook is not available")
+        if page < 1 or page > handbook_index.page_count:
+            raise ValueError(f"Page number {page} is out of range (1-{handbook_index.page_count})")
+        if image_format == "webp" and not webp_supported():
+            image_format = "png"
+        self._popularity[page] += 1
+        key = self._key(page, snap_width(width), image_format)
+
+        content = self._memory.get(key)
+        if content is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return content
+        content = await asyncio.to_thread(self._disk_get, key)
+        if content is not None:
+            self.disk_hits += 1
+        else:
+            content = await self._flight.do(key, lambda: self._render(key, page, snap_width(width), image_format))
+        self._memory_put(key, content)
+        return content
+
+    def _discard_pool(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next `_pool()` call starts fresh workers"""
+        if self._executor is executor:
+            self._executor = None
+            self.pool_restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _render(self, key: str, page: int, width: int, image_format: str) -> bytes:
+        content = None
+        try:
+            for attempt in range(2):
+                executor = self._pool()
+                try:
+                    future = executor.submit(_render_page, handbook_index.pdf_path, page, width,
+                                             image_format, PAGE_RENDER_TIMEOUT_SECONDS)
+                    content = await asyncio.wait_for(asyncio.wrap_future(future), timeout=PAGE_RENDER_TIMEOUT_SECONDS + 5)
+                    break
+                except BrokenProcessPool as e:
+                    # A worker died (OOM kill, unpicklable exception, ...): replace the pool and retry once
+                    logger.warning(f"Render pool broken on page {page} (attempt {attempt + 1}): {e}")
+                    self._discard_pool(executor)
+            if content is None:
+                raise PageRenderError("Render workers kept crashing")
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Rendering page {page} at {width}px failed: {e}")
+            raise PageRenderError(f"Could not render page {page}") from e
+        self.renders += 1
+        await asyncio.to_thread(self._disk_put, key, content)
+        return content
+
+    def _memory_put(self, key: str, content: bytes) -> None:
+        if len(content) > self.memory_bytes or key in self._memory:
+            return
+        self._memory[key] = content
+        self._memory_used += len(content)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if key not in self._disk:
+            return None
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            with self._disk_lock:
+                self._disk.pop(key, None)
+            return None
+        now = time.time()
+        with self._disk_lock:
+            if key in self._disk:
+                self._disk[key] = (self._disk[key][0], now)
+        try:
+            # mtime doubles as last access time across restarts
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return content
+
+    def _disk_put(self, key: str, content: bytes) -> None:
+        if len(content) > self.disk_bytes:
+            return
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing page render cache entry: {e}")
+            return
+        with self._disk_lock:
+            self._disk[key] = (len(content), time.time())
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        # Renders of an older handbook go first, then least recently used
+        current = f"{handbook_index.sha256[:16]}-" if handbook_index.sha256 else ""
+        total = sum(size for size, _ in self._disk.values())
+        for name, (size, _) in sorted(self._disk.items(), key=lambda item: (item[0].startswith(current), item[1][1])):
+            if total <= self.disk_bytes and name.startswith(current):
+                break
+            self._disk.pop(name, None)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def popular_pages(self, fallback: Iterable[int] = (), count: int = PAGE_PRERENDER_COUNT) -> List[int]:
+        """Most requested pages, topped up from `fallback` (e.g. chapter openings)"""
+        pages = [page for page, _ in self._popularity.most_common(count)]
+        for page in fallback:
+            if len(pages) >= count:
+                break
+            if page not in pages:
+                pages.append(page)
+        return [page for page in pages if 1 <= page <= handbook_index.page_count]
+
+    async def prerender(self, pages: Iterable[int], image_format: str = "webp") -> int:
+        """Warm both cache tiers for `pages` at the default width, one render at a time"""
+        rendered = 0
+        for page in pages:
+            try:
+                await self.render(page, PAGE_IMAGE_DEFAULT_WIDTH, image_format)
+                self._popularity[page] -= 1  # warming is not a request
+                rendered += 1
+            except (ValueError, PageRenderError):
+                continue
+        if rendered:
+            logger.info(f"Prerendered {rendered} handbook pages")
+        return rendered
+
+    def save_popularity(self) -> None:
+        tmp_path = f"{POPULARITY_PATH}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({str(page): hits for page, hits in self._popularity.most_common(500) if hits > 0}, f)
+            os.replace(tmp_path, POPULARITY_PATH)
+        except OSError as e:
+            logger.error(f"Error saving page popularity: {e}")
+
+    def shutdown(self) -> None:
+        self.save_popularity()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "disk_entries": len(self._disk),
+            "disk_bytes": sum(size for size, _ in self._disk.values()),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "renders": self.renders,
+            "failures": self.failures,
+            "pool_restarts": self.pool_restarts,
+            "render_coalescing": self._flight.stats()
+        }
+
+
+# Global page render instance
+page_render_service = PageRenderService()
+
+def get_page_render_service() -> PageRenderService:
+    """Dependency injection for FastAPI"""
+    return page_render_service
@@ -4,14 +4,14 @@ Handles PDF file operations including metadata, page serving, and content search
 """
 import os
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict
 from pathlib import Path
 from datetime import datetime
+from services.handbook_index import handbook_index
+from services.handbook_search import handbook_search, PDF_SEARCH_TOP_K
 from models.pdf_models import (
     PDFMetadata, 
-    PDFPageRequest, 
     PDFPageResponse, 
-    PDFSearchRequest, 
     PDFSearchResult, 
     PDFSearchResponse
 )
@@ -32,13 +32,9 @@ class PDFService:
         try:
             stat = self.pdf_path.stat()
             
-            # For a real implementation, you'd use PyPDF2 or similar to get actual page count
-            # For now, using a reasonable estimate for the NCC handbook
-            estimated_pages = 300  # This should be determined from actual PDF
-            
             return PDFMetadata(
                 title="NCC Cadet Handbook",
-                total_pages=estimated_pages,
+                total_pages=self.get_page_count(),
                 version="2024",
                 file_size=stat.st_size,
                 last_modified=datetime.fromtimestamp(stat.st_mtime).isoformat()
@@ -47,10 +43,24 @@ class PDFService:
             logger.error(f"Error getting PDF metadata: {e}")
             raise
     
+    def get_page_count(self) -> int:
+        """Real page count, from the handbook index once it is loaded"""
+        if handbook_index.loaded:
+            return handbook_index.page_count
+        # Index still building at startup: counting pages is cheap, extracting text is not
+        from PyPDF2 import PdfReader
+        return len(PdfReader(str(self.pdf_path)).pages)
+
     def get_pdf_file_path(self) -> str:
         """Get the absolute path to the PDF file for serving."""
         return str(self.pdf_path.absolute())
     
+    def get_pdf_digest(self) -> Optional[str]:
+        """SHA-256 of the handbook if the index already computed it for this file"""
+        if handbook_index.loaded and os.path.samefile(handbook_index.pdf_path, self.pdf_path):
+            return handbook_index.sha256
+        return None
+    
     def get_page_content_url(self, page_number: int) -> PDFPageResponse:
         """Get URL for specific page content."""
         metadata = self.get_pdf_metadata()
@@ -64,87 +74,29 @@ class PDFService:
         return PDFPageResponse(
             page_number=page_number,
             total_pages=metadata.total_pages,
-            content_url=content_url
+            content_url=content_url,
+            image_url=f"/api/pdf/page/{page_number}/image"
         )
     
-    def search_pdf_content(self, query: str, page_range: Optional[List[int]] = None) -> PDFSearchResponse:
-        """
-        Search for content within the PDF.
-        For now, this is a placeholder that would integrate with PDF text extraction.
-        In a full implementation, you'd use libraries like PyPDF2, pdfplumber, or Tesseract for OCR.
-        """
+    def search_pdf_content(self, query: str, page_range: Optional[List[int]] = None, top_k: Optional[int] = None) -> PDFSearchResponse:
+        """Search handbook pages with the BM25 index, best matches first."""
         start_time = datetime.now()
         
-        # Placeholder results - in real implementation, this would:
-        # 1. Extract text from PDF pages
-        # 2. Search for query terms
-        # 3. Return matches with context and page numbers
-        
-        mock_results = []
-        query_lower = query.lower()
-        
-        # Generate mock results based on common NCC topics
-        if "ncc" in query_lower:
-            mock_results = [
-                PDFSearchResult(
-                    page_number=1,
-                    match_text="National Cadet Corps (NCC) is a premier organization...",
-                    context="The NCC is the largest uniformed youth organization in the world, with a mission to develop character, leadership, and service orientation.",
-                    relevance_score=0.98
-                ),
-                PDFSearchResult(
-                    page_number=5,
-                    match_text="...the NCC aims to develop qualities of character, discipline...",
-                    context="NCC training programs focus on developing essential life skills through various activities and training modules.",
-                    relevance_score=0.92
-                ),
-                PDFSearchResult(
-                    page_number=25,
-                    match_text="...NCC cadets participate in various camps and competitions...",
-                    context="Regular participation in NCC activities helps cadets build confidence and leadership capabilities.",
-                    relevance_score=0.85
-                )
-            ]
-        elif query_lower in ["drill", "training", "discipline"]:
-            mock_results = [
-                PDFSearchResult(
-                    page_number=45,
-                    match_text=f"...{query} is an essential part of NCC training...",
-                    context=f"This section covers the importance of {query} in cadet development and its role in building character.",
-                    relevance_score=0.95
-                ),
-                PDFSearchResult(
-                    page_number=78,
-                    match_text=f"...advanced {query} techniques for senior cadets...",
-                    context=f"Advanced concepts related to {query} are covered in this chapter for senior cadets.",
-                    relevance_score=0.87
-                )
-            ]
-        elif query_lower in ["leadership", "character", "service"]:
-            mock_results = [
-                PDFSearchResult(
-                    page_number=191,
-                    match_text=f"...{query} development through NCC activities...",
-                    context=f"The {query} chapter outlines key principles and practical exercises for cadet development.",
-                    relevance_score=0.93
-                ),
-                PDFSearchResult(
-                    page_number=205,
-                    match_text=f"...practical examples of {query} in action...",
-                    context=f"Real-world scenarios demonstrating the application of {query} skills in various situations.",
-                    relevance_score=0.88
-                )
-            ]
-        
-        # Filter by page range if specified
-        if page_range:
-            mock_results = [r for r in mock_results if r.page_number in page_range]
+        results = [
+            PDFSearchResult(
+                page_number=hit["page_number"],
+                match_text=hit["match_text"],
+                context=hit["context"],
+                relevance_score=hit["score"]
+            )
+            for hit in handbook_search.search(query, page_range=page_range, top_k=top_k or PDF_SEARCH_TOP_K)
+        ]
         
         search_time_ms = (datetime.now() - start_time).total_seconds() * 1000
         
         return PDFSearchResponse(
-            results=mock_results,
-            total_results=len(mock_results),
+            results=results,
+            total_results=len(results),
             query=query,
             search_time_ms=search_time_ms
         )
@@ -173,6 +125,10 @@ class PDFService:
             "Miscellaneous": {"start": 296, "end": 300}
         }
     
+    def get_chapter_start_pages(self) -> List[int]:
+        """First page of every chapter, in handbook order"""
+        return sorted({pages["start"] for pages in self.get_chapter_page_mapping().values()})
+
     def get_page_for_chapter(self, chapter_title: str) -> Optional[Dict[str, int]]:
         """Get the page range for a specific chapter."""
         mapping = self.get_chapter_page_mapping()
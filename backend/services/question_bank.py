@@ -0,0 +1,261 @@
+"""
+Question Bank for NCC ABYAS
+Keeps every generated quiz question in a local SQLite database with a full-text index, tagged by
+topic, difficulty and source, so practice papers can be assembled without calling Gemini.
+Falls back to LIKE queries when the SQLite build lacks FTS5. Methods block on SQLite, so async
+callers run them with asyncio.to_thread.
+"""
+import os
+import json
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from app_models import QuizQuestion
+from services.similarity_index import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join(BASE_DIR, "data", "question_bank.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    question TEXT NOT NULL,
+    options TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    explanation TEXT,
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_topic_difficulty ON questions (topic, difficulty);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+    question, explanation, topic, content='questions', content_rowid='id'
+);
+"""
+
+
+def _fingerprint(question: str) -> str:
+    normalized = " ".join("".join(c if c.isalnum() else " " for c in question.lower()).split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def apportion(weights: Dict[str, float], total: int) -> Dict[str, int]:
+    """Split `total` across keys in proportion to `weights` (largest remainder method)"""
+    weight_sum = sum(w for w in weights.values() if w > 0)
+    if weight_sum <= 0 or total <= 0:
+        return {key: 0 for key in weights}
+    exact = {key: max(w, 0) / weight_sum * total for key, w in weights.items()}
+    counts = {key: int(value) for key, value in exact.items()}
+    leftover = total - sum(counts.values())
+    for key in sorted(exact, key=lambda k: exact[k] - counts[k], reverse=True)[:leftover]:
+        counts[key] += 1
+    return counts
+
+
+class QuestionBank:
+    def __init__(self, db_path: str = QUESTION_BANK_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            logger.warning("SQLite FTS5 unavailable; question bank search falls back to LIKE")
+            self.has_fts = False
+        # (topic, difficulty) -> question ids, so exam sampling never scans the table
+        self._ids: Dict[Tuple[str, str], List[int]] = {}
+        # Catches reworded repeats that the exact fingerprint misses
+        self.similarity = SimilarityIndex()
+        for row in self._conn.execute("SELECT id, question, options, topic, difficulty FROM questions"):
+            self._ids.setdefault((row["topic"], row["difficulty"]), []).append(row["id"])
+            self.similarity.add(row["id"], row["question"], list(json.loads(row["options"]).values()),
+                                scope=self._scope(row["topic"], row["difficulty"]))
+
+    def add(self, questions: Iterable[QuizQuestion], source: str, topic: Optional[str] = None,
+            difficulty: Optional[str] = None) -> int:
+        """Store questions, skipping ones already banked or near-duplicates of them. Returns number added."""
+        added = 0
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            for question in questions:
+                option_texts = list(question.options.values())
+                q_topic = question.topic or topic or "General"
+                q_difficulty = question.difficulty or difficulty or "Medium"
+                # Repeats only matter within a topic and difficulty: each feeds its own blueprint share
+                scope = self._scope(q_topic, q_difficulty)
+                if self.similarity.find_duplicate(question.question, option_texts, scope=scope) is not None:
+                    self.similarity.rejected += 1
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO questions "
+                    "(fingerprint, question, options, answer, explanation, topic, difficulty, source, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (_fingerprint(question.question), question.question, json.dumps(question.options),
+                     question.answer, question.explanation or "", q_topic, q_difficulty, source, now)
+                )
+                if not cursor.rowcount:
+                    continue
+                row_id = cursor.lastrowid
+                if self.has_fts:
+                    self._conn.execute(
+                        "INSERT INTO questions_fts (rowid, question, explanation, topic) VALUES (?, ?, ?, ?)",
+                        (row_id, question.question, question.explanation or "", q_topic)
+                    )
+                self._ids.setdefault((q_topic, q_difficulty), []).append(row_id)
+                self.similarity.add(row_id, question.question, option_texts, scope=scope)
+                added += 1
+        return added
+
+    @staticmethod
+    def _scope(topic: str, difficulty: str) -> str:
+        return f"{topic}|{difficulty}"
+
+    @staticmethod
+    def _to_question(row: sqlite3.Row) -> QuizQuestion:
+        return QuizQuestion(
+            id=f"bank_{row['id']}",
+            question=row["question"],
+            options=json.loads(row["options"]),
+            answer=row["answer"],
+            explanation=row["explanation"],
+            topic=row["topic"],
+            difficulty=row["difficulty"],
+            created_at=row["created_at"]
+        )
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        # Quote each term so user input cannot inject FTS5 operators
+        terms = ["".join(c for c in term if c.isalnum()) for term in query.split()]
+        return " ".join(f'"{term}"' for term in terms if term)
+
+    def search(self, query: str, topic: Optional[str] = None, difficulty: Optional[str] = None,
+               limit: int = 20) -> List[QuizQuestion]:
+        """Full-text search over question, explanation and topic, best matches first"""
+        filters, params = [], []
+        if topic:
+            filters.append("q.topic = ?")
+            params.append(topic)
+        if difficulty:
+            filters.append("q.difficulty = ?")
+            params.append(difficulty)
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        if self.has_fts:
+            sql = ("SELECT q.* FROM questions_fts f JOIN questions q ON q.id = f.rowid "
+                   "WHERE questions_fts MATCH ?" + "".join(f" AND {f}" for f in filters) +
+                   " ORDER BY bm25(questions_fts) LIMIT ?")
+            args = [fts_query, *params, limit]
+        else:
+            terms = fts_query.replace('"', "").split()
+            term_filters = ["(q.question LIKE ? OR q.explanation LIKE ?)"] * len(terms)
+            sql = ("SELECT q.* FROM questions q WHERE " + " AND ".join(term_filters + filters) +
+                   " ORDER BY q.id DESC LIMIT ?")
+            args = [p for term in terms for p in (f"%{term}%", f"%{term}%")] + params + [limit]
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [self._to_question(row) for row in rows]
+
+    def get(self, question_id: int) -> Optional[QuizQuestion]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM questions WHERE id = ?", (question_id,)).fetchone()
+        return self._to_question(row) if row else None
+
+    def similar(self, question: str, options: Optional[List[str]] = None, limit: int = 5,
+                exclude_id: Optional[int] = None) -> List[Tuple[QuizQuestion, float]]:
+        """Banked questions resembling this one, with estimated similarity, most similar first"""
+        with self._lock:
+            candidates = self.similarity.similar(question, options, limit=limit + 1)
+        matches = [(question_id, score) for question_id, score in candidates if question_id != exclude_id][:limit]
+        if not matches:
+            return []
+        ids = [question_id for question_id, _ in matches]
+        with self._lock:
+            rows = {
+                row["id"]: row
+                for row in self._conn.execute(
+                    f"SELECT * FROM questions WHERE id IN ({','.join('?' * len(ids))})", ids
+                )
+            }
+        return [(self._to_question(rows[i]), score) for i, score in matches if i in rows]
+
+    def available(self, topic: str, difficulties: Optional[List[str]] = None) -> List[int]:
+        # Snapshot: add() may be appending from another thread
+        return [
+            question_id
+            for (t, d), ids in list(self._ids.items())
+            if t == topic and (not difficulties or d in difficulties)
+            for question_id in ids
+        ]
+
+    def assemble_exam(self, blueprint: Dict[str, float], total_questions: int,
+                      difficulties: Optional[List[str]] = None) -> Tuple[List[QuizQuestion], Dict[str, int]]:
+        """
+        Sample a paper of `total_questions` whose topic mix follows the blueprint weights.
+        Topics the bank cannot cover hand their remaining seats to topics with spare questions.
+        Returns (questions grouped by blueprint topic, questions drawn per topic).
+        """
+        available = {topic: self.available(topic, difficulties) for topic in blueprint}
+        quotas = apportion(blueprint, total_questions)
+        drawn = {topic: min(quotas[topic], len(available[topic])) for topic in blueprint}
+        shortfall = total_questions - sum(drawn.values())
+        while shortfall > 0:
+            spare = {t: blueprint[t] for t in blueprint if blueprint[t] > 0 and len(available[t]) > drawn[t]}
+            if not spare:
+                break
+            extra = apportion(spare, shortfall)
+            if not any(extra.values()):
+                extra[max(spare, key=spare.get)] = 1
+            for topic, count in extra.items():
+                drawn[topic] += min(count, len(available[topic]) - drawn[topic])
+            shortfall = total_questions - sum(drawn.values())
+
+        chosen_ids = [
+            question_id
+            for topic in blueprint
+            for question_id in random.sample(available[topic], drawn[topic])
+        ]
+        if not chosen_ids:
+            return [], drawn
+        with self._lock:
+            rows = {
+                row["id"]: row
+                for row in self._conn.execute(
+                    f"SELECT * FROM questions WHERE id IN ({','.join('?' * len(chosen_ids))})", chosen_ids
+                )
+            }
+        return [self._to_question(rows[i]) for i in chosen_ids if i in rows], drawn
+
+    def stats(self) -> Dict[str, Any]:
+        by_topic: Dict[str, Dict[str, int]] = {}
+        for (topic, difficulty), ids in list(self._ids.items()):
+            by_topic.setdefault(topic, {})[difficulty] = len(ids)
+        return {
+            "total_questions": sum(len(ids) for ids in list(self._ids.values())),
+            "full_text_index": "fts5" if self.has_fts else "like",
+            "similarity": self.similarity.stats(),
+            "by_topic": by_topic
+        }
+
+
+# Global question bank instance
+question_bank = QuestionBank()
+
+def get_question_bank() -> QuestionBank:
+    """Dependency injection for FastAPI"""
+    return question_bank
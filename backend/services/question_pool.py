@@ -0,0 +1,210 @@
+"""
+Question Pool for NCC ABYAS
+Keeps a persistent reserve of pre-generated quiz questions per (topic, difficulty)
+so standard quizzes are served instantly instead of waiting on Gemini.
+"""
+import os
+import json
+import random
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime
+from app_models import QuizQuestion
+from services.question_bank import question_bank
+from services.similarity_index import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend dir
+POOL_PATH = os.path.join(BASE_DIR, "data", "quiz_pool.json")
+
+# Refill every (topic, difficulty) pool up to this many questions
+POOL_WATERMARK = int(os.getenv("QUIZ_POOL_WATERMARK", "30"))
+# Questions requested from Gemini per refill call
+POOL_REFILL_BATCH = int(os.getenv("QUIZ_POOL_REFILL_BATCH", "10"))
+# A question is retired after being served this many times, so the pool keeps rotating
+POOL_MAX_SERVES = int(os.getenv("QUIZ_POOL_MAX_SERVES", "25"))
+# Seconds between refill passes
+POOL_REFILL_INTERVAL = int(os.getenv("QUIZ_POOL_REFILL_INTERVAL", "60"))
+POOL_REFILL_ENABLED = os.getenv("QUIZ_POOL_REFILL", "true").lower() == "true"
+
+
+class QuestionPool:
+    def __init__(self, pool_path: str = POOL_PATH):
+        self.pool_path = pool_path
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._dirty = False
+        self._refill_task: Optional[asyncio.Task] = None
+        # Near-duplicate check within each (topic, difficulty) pool
+        self.similarity = SimilarityIndex()
+        self._load()
+
+    @staticmethod
+    def _key(topic: str, difficulty: str) -> str:
+        return f"{topic}|{difficulty}"
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def _load(self) -> None:
+        """Load the pool from disk, starting empty if the file is missing or unreadable"""
+        if not os.path.exists(self.pool_path):
+            return
+        try:
+            with open(self.pool_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            logger.info(f"Loaded quiz pool with {self.total_size()} questions")
+        except Exception as e:
+            logger.error(f"Error loading quiz pool: {e}")
+            self.entries = {}
+        for key, entries in self.entries.items():
+            for entry in entries:
+                self._index(key, entry)
+
+    def _index(self, key: str, entry: Dict[str, Any]) -> None:
+        question = entry["question"]
+        self.similarity.add((key, self._normalize(question["question"])), question["question"],
+                            list(question["options"].values()), scope=key)
+
+    async def save(self) -> None:
+        """Write the pool to disk if it changed since the last save (in a worker thread)"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        if not await asyncio.to_thread(self._write, self._snapshot()):
+            self._dirty = True
+
+    def _snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        # draw() keeps updating serve counts on the event loop while the copy is written
+        return {key: [dict(entry) for entry in entries] for key, entries in self.entries.items()}
+
+    def _write(self, entries: Dict[str, List[Dict[str, Any]]]) -> bool:
+        tmp_path = f"{self.pool_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.pool_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving quiz pool: {e}")
+            return False
+
+    def size(self, topic: str, difficulty: str) -> int:
+        return len(self.entries.get(self._key(topic, difficulty), []))
+
+    def total_size(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
+
+    def add(self, topic: str, difficulty: str, questions: Iterable[QuizQuestion]) -> int:
+        """Add freshly generated questions, skipping ones already pooled or reworded repeats. Returns number added."""
+        key = self._key(topic, difficulty)
+        entries = self.entries.setdefault(key, [])
+        seen = {self._normalize(e["question"]["question"]) for e in entries}
+        added = 0
+        for question in questions:
+            normalized = self._normalize(question.question)
+            if normalized in seen:
+                continue
+            if self.similarity.find_duplicate(question.question, list(question.options.values()), scope=key) is not None:
+                self.similarity.rejected += 1
+                continue
+            seen.add(normalized)
+            entry = {
+                "question": question.dict(exclude={"id"}),
+                "served": 0,
+                "added_at": datetime.now().isoformat()
+            }
+            entries.append(entry)
+            self._index(key, entry)
+            added += 1
+        if added:
+            self._dirty = True
+        return added
+
+    def draw(self, topic: str, difficulty: str, count: int, allow_partial: bool = False) -> List[QuizQuestion]:
+        """
+        Draw `count` questions for a quiz, or an empty list if the pool cannot cover it
+        (with allow_partial, as many as are available).
+        Least-served questions go first (random tie-break) so repeat takers rotate through the pool.
+        """
+        key = self._key(topic, difficulty)
+        entries = self.entries.get(key, [])
+        if count <= 0 or not entries or (len(entries) < count and not allow_partial):
+            return []
+
+        chosen = sorted(entries, key=lambda e: (e["served"], random.random()))[:count]
+        random.shuffle(chosen)
+        for entry in chosen:
+            entry["served"] += 1
+        # Retire worn-out questions; the refiller replaces them with fresh ones
+        for entry in chosen:
+            if entry["served"] >= POOL_MAX_SERVES:
+                self.similarity.remove((key, self._normalize(entry["question"]["question"])))
+        self.entries[key] = [e for e in entries if e["served"] < POOL_MAX_SERVES]
+        self._dirty = True
+
+        slug = topic.lower().replace(' ', '_')
+        now = datetime.now().isoformat()
+        return [
+            QuizQuestion(**{**entry["question"], "id": f"{slug}_{i+1}", "created_at": now})
+            for i, entry in enumerate(chosen)
+        ]
+
+    async def refill(self, ai_service, topics: List[str], difficulties: List[str]) -> None:
+        """Top up every (topic, difficulty) pool that is below the watermark"""
+        for topic in topics:
+            for difficulty in difficulties:
+                missing = POOL_WATERMARK - self.size(topic, difficulty)
+                if missing <= 0:
+                    continue
+                questions, error = await ai_service.generate_quiz_questions(
+                    topic=topic,
+                    difficulty=difficulty,
+                    num_questions=min(missing, POOL_REFILL_BATCH)
+                )
+                if error:
+                    logger.warning(f"Quiz pool refill failed for {topic}/{difficulty}: {error}")
+                    continue
+                self.add(topic, difficulty, questions)
+                await asyncio.to_thread(question_bank.add, questions, source="pool_refill")
+        await self.save()
+
+    async def _refill_forever(self, ai_service, topics: List[str], difficulties: List[str]) -> None:
+        while True:
+            try:
+                await self.refill(ai_service, topics, difficulties)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Quiz pool refill pass failed: {e}")
+            await asyncio.sleep(POOL_REFILL_INTERVAL)
+
+    def start_refiller(self, ai_service, topics: List[str], difficulties: List[str]) -> None:
+        """Start the background refill loop on the running event loop"""
+        if not POOL_REFILL_ENABLED or self._refill_task is not None:
+            return
+        if ai_service.model_error or not ai_service.model:
+            logger.warning(f"Quiz pool refiller not started: {ai_service.model_error}")
+            return
+        self._refill_task = asyncio.create_task(self._refill_forever(ai_service, topics, difficulties))
+
+    async def stop_refiller(self) -> None:
+        """Cancel the refill loop and flush the pool to disk"""
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        await self.save()
+
+
+# Global pool instance
+question_pool = QuestionPool()
+
+def get_question_pool() -> QuestionPool:
+    """Dependency injection for FastAPI"""
+    return question_pool
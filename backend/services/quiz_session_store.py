@@ -0,0 +1,124 @@
+"""
+Quiz Session Store for NCC ABYAS
+Remembers the answer key of every quiz handed out, under its quiz_id, so /api/submit can grade
+without the client sending questions back. Answer keys and per-question topics are packed into
+byte strings; sessions expire after a TTL and the store is bounded in size.
+The store is per worker process: with several workers, submissions must reach the worker that
+generated the quiz (sticky sessions) or the store must be moved out of process.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from app_models import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+QUIZ_SESSION_TTL_SECONDS = int(os.getenv("QUIZ_SESSION_TTL_SECONDS", str(6 * 3600)))
+QUIZ_SESSION_MAX_ENTRIES = int(os.getenv("QUIZ_SESSION_MAX_ENTRIES", "50000"))
+
+
+class QuizSession:
+    """Answer key for one quiz; index i of every field describes question i"""
+    __slots__ = ("topic", "difficulty", "answer_key", "topic_ids", "topics", "questions", "explanations", "expires_at")
+
+    def __init__(self, topic: str, difficulty: str, questions: List[QuizQuestion], expires_at: float):
+        self.topic = topic
+        self.difficulty = difficulty
+        # One ASCII letter per question
+        self.answer_key = "".join(q.answer.strip().upper()[:1] or "?" for q in questions).encode("ascii", "replace")
+        # Per-question topic as an index into the (short) tuple of distinct topics
+        topics: Dict[str, int] = {}
+        self.topic_ids = bytes(topics.setdefault(q.topic or topic, len(topics)) for q in questions)
+        self.topics = tuple(topics)
+        # Kept for the wrong-answer review only
+        self.questions = tuple(q.question for q in questions)
+        self.explanations = tuple(q.explanation or "" for q in questions)
+        self.expires_at = expires_at
+
+    def __len__(self) -> int:
+        return len(self.answer_key)
+
+    def grade(self, answers: List[Optional[str]]) -> Tuple[int, List[Dict[str, Any]], Dict[str, float]]:
+        """
+        Grade answers against the key in one pass.
+        Returns (correct count, wrong question details, accuracy percentage per topic).
+        Missing or blank answers count as wrong.
+        """
+        correct = 0
+        wrong_questions = []
+        topic_correct = [0] * len(self.topics)
+        topic_total = [0] * len(self.topics)
+        for index, expected in enumerate(self.answer_key):
+            given = answers[index] if index < len(answers) else None
+            given = (given or "").strip().upper()[:1]
+            topic_id = self.topic_ids[index]
+            topic_total[topic_id] += 1
+            if given and ord(given) == expected:
+                correct += 1
+                topic_correct[topic_id] += 1
+            else:
+                wrong_questions.append({
+                    "question_index": index,
+                    "question": self.questions[index],
+                    "user_answer": given,
+                    "correct_answer": chr(expected),
+                    "explanation": self.explanations[index],
+                    "topic": self.topics[topic_id]
+                })
+        accuracy_by_topic = {
+            topic: round(topic_correct[i] / topic_total[i] * 100, 1)
+            for i, topic in enumerate(self.topics)
+        }
+        return correct, wrong_questions, accuracy_by_topic
+
+
+class QuizSessionStore:
+    def __init__(self, ttl_seconds: int = QUIZ_SESSION_TTL_SECONDS, max_entries: int = QUIZ_SESSION_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Insertion order equals expiry order because every session gets the same TTL
+        self._sessions: "OrderedDict[str, QuizSession]" = OrderedDict()
+        self.evictions = 0
+
+    def _evict_expired(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.expires_at > now:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, quiz_id: str, topic: str, difficulty: str, questions: List[QuizQuestion]) -> None:
+        now = time.time()
+        self._evict_expired(now)
+        self._sessions.pop(quiz_id, None)
+        self._sessions[quiz_id] = QuizSession(topic, difficulty, questions, now + self.ttl_seconds)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, quiz_id: str) -> Optional[QuizSession]:
+        """Return the live session for quiz_id, or None if unknown or expired"""
+        self._evict_expired(time.time())
+        return self._sessions.get(quiz_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions
+        }
+
+
+# Global session store instance
+quiz_session_store = QuizSessionStore()
+
+def get_quiz_session_store() -> QuizSessionStore:
+    """Dependency injection for FastAPI"""
+    return quiz_session_store
@@ -0,0 +1,48 @@
+"""
+Request coalescing for NCC ABYAS
+Concurrent callers asking for the same expensive result share one in-flight computation.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Single-flight coalescer: the first caller for a key starts the work, later callers
+    with the same key await the same task instead of starting their own.
+    The work runs as its own task, so a disconnecting caller does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the outcome as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, work: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of `work()`, sharing it with concurrent callers using the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
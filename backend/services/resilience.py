@@ -0,0 +1,279 @@
+"""
+Resilience layer for NCC ABYAS generation calls
+Per-call deadlines, jittered exponential retries, optional hedged requests and a circuit
+breaker, so provider incidents fail fast instead of piling up workers.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Deadline for a single provider call (excludes time spent queueing for a generation slot)
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+# Hedging: if a call is still running after the observed p95 latency, race a second identical call
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+# Hedge delay used until enough latency samples exist to compute a p95
+LLM_HEDGE_DEFAULT_MS = float(os.getenv("LLM_HEDGE_DEFAULT_MS", "8000"))
+HEDGE_MIN_SAMPLES = 20
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+
+class CallTimeoutError(Exception):
+    """Raised when a provider call exceeds its deadline"""
+
+
+class NonRetryableError(Exception):
+    """
+    Raised by a call that would fail the same way if repeated (e.g. a safety-blocked prompt).
+    It is not retried and, since the provider did answer, not counted against the breaker.
+    """
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now. In half-open state only one probe is let through."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Give up a half-open probe slot without recording an outcome"""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Generation circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+
+class ResilientCaller:
+    def __init__(
+        self,
+        timeout: float = LLM_CALL_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def record_latency(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def p95_latency(self) -> Optional[float]:
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _hedge_delay(self) -> float:
+        p95 = self.p95_latency()
+        return p95 if p95 is not None else LLM_HEDGE_DEFAULT_MS / 1000
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def _timed(self, make_call: Callable[[], Awaitable[Any]], slots: Optional[asyncio.Semaphore]) -> Any:
+        if slots is None:
+            return await self._with_deadline(make_call)
+        async with slots:
+            return await self._with_deadline(make_call)
+
+    async def _with_deadline(self, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(make_call(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise CallTimeoutError(f"Generation call exceeded {self.timeout:.0f}s deadline")
+        self.record_latency(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, make_call: Callable[[], Awaitable[Any]], slots: Optional[asyncio.Semaphore]) -> Any:
+        """One logical attempt: the primary call, plus a hedged duplicate if the primary is slow"""
+        tasks = [asyncio.ensure_future(self._timed(make_call, slots))]
+        try:
+            if self.hedge:
+                done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+                if not done:
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._timed(make_call, slots)))
+            last_error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(
+        self,
+        make_call: Callable[[], Awaitable[Any]],
+        slots: Optional[asyncio.Semaphore] = None
+    ) -> Any:
+        """
+        Run `make_call` with deadline, retries, hedging and the circuit breaker.
+        `slots` (if given) is held around each individual provider call.
+        """
+        self.calls += 1
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise CircuitOpenError("AI provider is degraded; failing fast") from last_error
+            try:
+                result = await self._attempt(make_call, slots)
+                self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except NonRetryableError:
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Generation attempt {attempt + 1} failed: {e}")
+                if self.breaker.state == CircuitBreaker.HALF_OPEN:
+                    # The probe failed: reopen at once instead of retrying against a degraded provider
+                    self.breaker.record_failure()
+                    raise
+                if attempt < self.max_retries:
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff(attempt))
+        # One failure per exhausted logical call, not per attempt
+        self.breaker.record_failure()
+        raise last_error
+
+    async def stream(
+        self,
+        make_stream: Callable[[], AsyncIterator[Any]],
+        slots: Optional[asyncio.Semaphore] = None
+    ) -> AsyncIterator[Any]:
+        """
+        Yield from `make_stream()` under the circuit breaker, with the deadline applied to the first
+        item and to each wait between items. Streams are not retried once started.
+        The provider counts as healthy as soon as the first item arrives, so a consumer that stops
+        early (it has what it needs, or the client went away) still closes a half-open breaker.
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError("AI provider is degraded; failing fast")
+        self.calls += 1
+        if slots is not None:
+            await slots.acquire()
+        items: Optional[AsyncIterator[Any]] = None
+        healthy = False
+        try:
+            items = make_stream()
+            while True:
+                try:
+                    item = await asyncio.wait_for(items.__anext__(), timeout=self.timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise CallTimeoutError(f"Generation stream stalled for {self.timeout:.0f}s")
+                if not healthy:
+                    self.breaker.record_success()
+                    healthy = True
+                yield item
+            if not healthy:
+                self.breaker.record_success()
+                healthy = True
+        except NonRetryableError:
+            if not healthy:
+                self.breaker.record_success()
+                healthy = True
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            healthy = True
+            raise
+        finally:
+            if not healthy:
+                # Closed or cancelled before any output: says nothing about provider health
+                self.breaker.release_probe()
+            try:
+                if items is not None:
+                    await items.aclose()
+            finally:
+                if slots is not None:
+                    slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95_latency()
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_times_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedged_requests": self.hedges,
+            "timeouts": self.timeouts,
+            "rejected_while_open": self.rejected,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
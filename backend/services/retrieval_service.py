@@ -0,0 +1,176 @@
+"""
+Retrieval Service for NCC ABYAS
+Builds a local TF-IDF index over syllabus sections and Cadet Handbook pages and returns the
+top-k passages for a chat question, so prompts are grounded with a bounded context size.
+"""
+import os
+import re
+import math
+import asyncio
+import logging
+from collections import Counter
+from typing import List, Dict, Any
+from services.syllabus_service import syllabus_service
+from services.handbook_index import handbook_index
+
+logger = logging.getLogger(__name__)
+
+# Passages injected into each chat prompt
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+# Hard cap on characters of retrieved context per prompt
+RAG_MAX_CONTEXT_CHARS = int(os.getenv("RAG_MAX_CONTEXT_CHARS", "3000"))
+# Passages scoring below this cosine similarity are not worth the prompt tokens
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.08"))
+# Handbook pages are split into passages of roughly this many characters
+PASSAGE_CHARS = 800
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "of", "in", "on", "at", "for",
+    "to", "and", "or", "by", "with", "as", "from", "that", "this", "it", "its", "what", "which",
+    "who", "how", "why", "when", "where", "do", "does", "can", "should", "will", "me", "tell",
+    "about", "explain", "please", "i", "you", "we", "they", "their", "there", "these", "those"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and one-letter tokens removed"""
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class RetrievalService:
+    def __init__(self):
+        self.passages: List[Dict[str, Any]] = []
+        self._vectors: List[Dict[str, float]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._idf: Dict[str, float] = {}
+        self._built = False
+        self._build_lock = asyncio.Lock()
+
+    def _syllabus_passages(self) -> List[Dict[str, Any]]:
+        data = syllabus_service.get_all_chapters()
+        if not data:
+            return []
+        passages = []
+        for chapter in data.chapters:
+            for section in chapter.sections:
+                parts = [section.content or ""]
+                if section.topics:
+                    parts.append("Topics: " + "; ".join(section.topics))
+                if section.keywords:
+                    parts.append("Keywords: " + ", ".join(section.keywords))
+                passages.append({
+                    "source": "syllabus",
+                    "title": f"{chapter.title} - {section.name}",
+                    "page": section.page_number,
+                    "text": " ".join(p for p in parts if p)
+                })
+        return passages
+
+    def _handbook_page_texts(self) -> List[str]:
+        """Plain text of every handbook page (index 0 = page 1)"""
+        if not handbook_index.ensure_loaded():
+            logger.warning("Handbook index unavailable; retrieval uses syllabus only")
+            return []
+        return list(handbook_index.pages())
+
+    def _handbook_passages(self) -> List[Dict[str, Any]]:
+        passages = []
+        for page_index, text in enumerate(self._handbook_page_texts()):
+            text = " ".join(text.split())
+            for start in range(0, len(text), PASSAGE_CHARS):
+                piece = text[start:start + PASSAGE_CHARS]
+                if len(tokenize(piece)) < 5:
+                    continue
+                passages.append({
+                    "source": "handbook",
+                    "title": "Cadet Handbook",
+                    "page": page_index + 1,
+                    "text": piece
+                })
+        return passages
+
+    def build(self) -> None:
+        """Build the TF-IDF index. Blocking: extracts handbook text, so run it off the event loop."""
+        try:
+            handbook = self._handbook_passages()
+        except Exception as e:
+            logger.error(f"Error extracting handbook text for retrieval: {e}")
+            handbook = []
+        passages = self._syllabus_passages() + handbook
+
+        term_counts = [Counter(tokenize(f"{p['title']} {p['text']}")) for p in passages]
+        document_frequency = Counter()
+        for counts in term_counts:
+            document_frequency.update(counts.keys())
+        total = len(passages)
+        idf = {term: math.log((total + 1) / (df + 1)) + 1 for term, df in document_frequency.items()}
+
+        vectors = []
+        postings: Dict[str, List[int]] = {}
+        for doc_id, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(tf)) * idf[term] for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            vectors.append({term: w / norm for term, w in weights.items()})
+            for term in counts:
+                postings.setdefault(term, []).append(doc_id)
+
+        self.passages, self._vectors, self._postings, self._idf = passages, vectors, postings, idf
+        self._built = True
+        logger.info(f"Retrieval index built with {len(passages)} passages ({len(handbook)} from the handbook)")
+
+    async def ensure_built(self) -> None:
+        if self._built:
+            return
+        async with self._build_lock:
+            if not self._built:
+                await asyncio.to_thread(self.build)
+
+    def search(self, query: str, top_k: int = RAG_TOP_K) -> List[Dict[str, Any]]:
+        """Return up to top_k passages by cosine similarity, each with a `score`"""
+        counts = Counter(t for t in tokenize(query) if t in self._idf)
+        if not counts:
+            return []
+        weights = {term: (1 + math.log(tf)) * self._idf[term] for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+
+        scores: Dict[int, float] = {}
+        for term, weight in weights.items():
+            for doc_id in self._postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight / norm * self._vectors[doc_id][term]
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [
+            {**self.passages[doc_id], "score": round(score, 4)}
+            for doc_id, score in ranked[:top_k]
+            if score >= RAG_MIN_SCORE
+        ]
+
+    async def retrieve(self, query: str, top_k: int = RAG_TOP_K) -> List[Dict[str, Any]]:
+        await self.ensure_built()
+        return self.search(query, top_k)
+
+    @staticmethod
+    def format_context(passages: List[Dict[str, Any]], max_chars: int = RAG_MAX_CONTEXT_CHARS) -> str:
+        """Render passages with page references, trimmed to the context budget"""
+        lines = []
+        used = 0
+        for number, passage in enumerate(passages, start=1):
+            page = f" (p. {passage['page']})" if passage.get("page") else ""
+            header = f"[{number}] {passage['title']}{page}: "
+            room = max_chars - used - len(header)
+            if room <= 100:
+                break
+            text = passage["text"]
+            if len(text) > room:
+                text = text[:room].rsplit(" ", 1)[0] + "..."
+            lines.append(header + text)
+            used += len(lines[-1])
+        return "\n".join(lines)
+
+
+# Global retrieval instance
+retrieval_service = RetrievalService()
+
+def get_retrieval_service() -> RetrievalService:
+    """Dependency injection for FastAPI"""
+    return retrieval_service
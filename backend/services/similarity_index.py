@@ -0,0 +1,146 @@
+"""
+Near-duplicate index for NCC ABYAS quiz questions
+MinHash signatures over question and option words, bucketed with LSH, so a reworded repeat of a
+stored question is found without comparing against every stored question.
+Signatures use one-permutation hashing (one hash per shingle, binned), which keeps an insert at a
+few dozen hash operations. Signatures rely on Python's per-process string hashing, so the index
+lives in memory and is rebuilt from its owner's data at startup.
+"""
+import os
+import re
+from array import array
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+# Estimated Jaccard similarity at or above which a new question counts as a repeat
+DUPLICATE_THRESHOLD = float(os.getenv("QUESTION_DUPLICATE_THRESHOLD", "0.6"))
+# Signature length = bands * rows; candidates share at least one band.
+# With 8 bands of 4 rows, pairs near 0.6 similarity collide about 2/3 of the time, pairs at 0.8 almost always.
+SIGNATURE_BANDS = 8
+SIGNATURE_ROWS = 4
+SIGNATURE_SIZE = SIGNATURE_BANDS * SIGNATURE_ROWS
+HASH_MASK = 0xFFFFFFFF
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "at", "for", "to", "and",
+    "or", "by", "with", "as", "from", "that", "this", "it", "its", "what", "which", "who", "how",
+    "why", "when", "where", "do", "does", "following", "correct", "true", "best", "most"
+}
+
+
+def shingles(question: str, options: Optional[Sequence[str]] = None) -> set:
+    """Content words and word pairs of the question, plus option words (order-independent)"""
+    words = [w for w in re.findall(r"[a-z0-9]+", question.lower()) if w not in STOPWORDS]
+    grams = set(words)
+    grams.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for option in options or ():
+        grams.update(f"o:{w}" for w in re.findall(r"[a-z0-9]+", option.lower()) if w not in STOPWORDS)
+    return grams
+
+
+def signature(grams: set) -> array:
+    """One-permutation MinHash: each shingle hash goes to one bin, each bin keeps its minimum"""
+    bins = [HASH_MASK] * SIGNATURE_SIZE
+    for gram in grams:
+        h = hash(gram) & HASH_MASK
+        slot = h % SIGNATURE_SIZE
+        if h < bins[slot]:
+            bins[slot] = h
+    # Densify: an empty bin borrows the next filled bin's value so short questions still compare
+    filled = [i for i, v in enumerate(bins) if v != HASH_MASK]
+    if filled and len(filled) < SIGNATURE_SIZE:
+        for i in range(SIGNATURE_SIZE):
+            if bins[i] == HASH_MASK:
+                donor = next((j for j in filled if j > i), filled[0])
+                bins[i] = (bins[donor] + (donor - i) % SIGNATURE_SIZE * 0x9E3779B1) & HASH_MASK
+    return array("I", bins)
+
+
+class SimilarityIndex:
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        # item id -> (signature, scope)
+        self._items: Dict[Hashable, Tuple[array, Optional[str]]] = {}
+        # band bucket key -> item id, or a list of ids once the bucket is shared
+        self._buckets: Dict[int, Union[Hashable, List[Hashable]]] = {}
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def _band_keys(sig: array) -> List[int]:
+        return [
+            hash((band, tuple(sig[band * SIGNATURE_ROWS:(band + 1) * SIGNATURE_ROWS])))
+            for band in range(SIGNATURE_BANDS)
+        ]
+
+    @staticmethod
+    def _estimate(a: array, b: array) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / SIGNATURE_SIZE
+
+    def add(self, item_id: Hashable, question: str, options: Optional[Sequence[str]] = None,
+            scope: Optional[str] = None) -> None:
+        if item_id in self._items:
+            self.remove(item_id)
+        sig = signature(shingles(question, options))
+        self._items[item_id] = (sig, scope)
+        for key in self._band_keys(sig):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = item_id
+            elif isinstance(bucket, list):
+                bucket.append(item_id)
+            else:
+                self._buckets[key] = [bucket, item_id]
+
+    def remove(self, item_id: Hashable) -> None:
+        entry = self._items.pop(item_id, None)
+        if entry is None:
+            return
+        for key in self._band_keys(entry[0]):
+            bucket = self._buckets.get(key)
+            if isinstance(bucket, list):
+                if item_id in bucket:
+                    bucket.remove(item_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket[0]
+            elif bucket == item_id:
+                del self._buckets[key]
+
+    def similar(self, question: str, options: Optional[Sequence[str]] = None, limit: int = 10,
+                min_score: float = 0.0, scope: Optional[str] = None) -> List[Tuple[Hashable, float]]:
+        """Stored items sharing an LSH band with the query, as (item id, estimated Jaccard), best first"""
+        sig = signature(shingles(question, options))
+        candidates = set()
+        for key in self._band_keys(sig):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            if isinstance(bucket, list):
+                candidates.update(bucket)
+            else:
+                candidates.add(bucket)
+        scored = []
+        for item_id in candidates:
+            item_sig, item_scope = self._items[item_id]
+            if scope is not None and item_scope != scope:
+                continue
+            score = self._estimate(sig, item_sig)
+            if score >= min_score:
+                scored.append((item_id, round(score, 3)))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:limit]
+
+    def find_duplicate(self, question: str, options: Optional[Sequence[str]] = None,
+                       scope: Optional[str] = None) -> Optional[Hashable]:
+        """Id of a stored near-duplicate of this question, or None"""
+        matches = self.similar(question, options, limit=1, min_score=self.threshold, scope=scope)
+        return matches[0][0] if matches else None
+
+    def stats(self):
+        return {
+            "indexed_questions": len(self._items),
+            "buckets": len(self._buckets),
+            "duplicate_threshold": self.threshold,
+            "near_duplicates_rejected": self.rejected
+        }
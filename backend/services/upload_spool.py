@@ -0,0 +1,132 @@
+"""
+Upload spooling for NCC ABYAS
+Streams an uploaded file to a temporary file in fixed-size chunks, hashing as it goes and
+enforcing a hard size limit, so no handler ever holds a whole upload in memory.
+
+Starlette parses (and spools) the whole multipart body before a handler runs, so
+UploadSizeLimitMiddleware turns oversized uploads away up front from their Content-Length;
+the check in spool_upload is the backstop for chunked bodies that declare no length.
+"""
+import os
+import time
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+from fastapi import UploadFile
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "25"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "ncc_abyas_uploads"))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+# Allowance for multipart boundaries, part headers and small form fields next to the file
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+# Spool files older than this are leftovers of interrupted requests or jobs
+STALE_SPOOL_SECONDS = 24 * 3600
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds UPLOAD_MAX_MB"""
+
+
+class SpooledUpload:
+    """An upload written to disk; call cleanup() (or use as a context manager) when done"""
+
+    def __init__(self, path: str, size: int, digest: str, content_type: Optional[str], file_name: Optional[str]):
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.content_type = content_type
+        self.file_name = file_name
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
+
+
+def _limit_message(max_bytes: int) -> str:
+    return f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Answer 413 to multipart requests whose Content-Length is over the upload limit before any
+    of the body is read. Bodies without a Content-Length pass through to spool_upload's check.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int = int(UPLOAD_MAX_MB * 1024 * 1024)):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            declared = headers.get(b"content-length", b"")
+            if (headers.get(b"content-type", b"").startswith(b"multipart/form-data")
+                    and declared.isdigit()
+                    and int(declared) > self.max_bytes + UPLOAD_FORM_OVERHEAD_BYTES):
+                response = JSONResponse(status_code=413, content={"detail": _limit_message(self.max_bytes)},
+                                        headers={"Connection": "close"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = int(UPLOAD_MAX_MB * 1024 * 1024)) -> SpooledUpload:
+    """
+    Copy an UploadFile to a temp file chunk by chunk, computing its SHA-256 on the way.
+    By now the request body has already been received, so this limit only catches uploads
+    that got past UploadSizeLimitMiddleware without a Content-Length.
+    """
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=UPLOAD_SPOOL_DIR, suffix=".upload")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(_limit_message(max_bytes))
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    return SpooledUpload(path, size, hasher.hexdigest(), file.content_type, file.filename)
+
+
+def purge_stale_spool_files(max_age: int = STALE_SPOOL_SECONDS) -> int:
+    """Delete spool files left behind by crashed requests or interrupted jobs"""
+    if not os.path.isdir(UPLOAD_SPOOL_DIR):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(UPLOAD_SPOOL_DIR):
+        path = os.path.join(UPLOAD_SPOOL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} stale upload spool files")
+    return removed
@@ -0,0 +1,83 @@
+import pytest
+import services.chat_cache as chat_cache_module
+from services.chat_cache import ChatAnswerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_cache_module.time, "time", clock)
+    return clock
+
+
+def test_normalize_drops_punctuation_and_filler_but_keeps_interrogatives():
+    assert ChatAnswerCache.normalize("What is the NCC motto?") == "what ncc motto"
+    assert ChatAnswerCache.normalize("Please tell me: WHAT is the NCC motto!!") == "what ncc motto"
+    assert ChatAnswerCache.normalize("who commands a unit") != ChatAnswerCache.normalize("which unit")
+
+
+def test_rephrased_question_is_an_exact_hit():
+    cache = ChatAnswerCache(fuzzy=False)
+    cache.put("What is the NCC motto?", "Unity and Discipline")
+    assert cache.get("please tell me what the ncc motto is") == "Unity and Discipline"
+    assert cache.stats()["hits"] == 1 and cache.stats()["fuzzy_hits"] == 0
+
+
+def test_near_duplicate_is_a_fuzzy_hit():
+    cache = ChatAnswerCache(similarity_threshold=0.8)
+    cache.put("What are the duties of a cadet sergeant major during the annual training camp?", "Duties")
+    cache.put("How is a map oriented with a prismatic compass?", "Orienting")
+    assert cache.get("What are the duties of the cadet sergeant-major during annual training camps") == "Duties"
+    assert cache.stats()["fuzzy_hits"] == 1
+
+
+def test_unrelated_question_misses_and_fuzzy_can_be_disabled():
+    cache = ChatAnswerCache(similarity_threshold=0.8)
+    cache.put("What are the duties of a cadet sergeant major during the annual training camp?", "Duties")
+    assert cache.get("How many cadets are in a section?") is None
+    strict = ChatAnswerCache(fuzzy=False)
+    strict.put("What are the duties of a cadet sergeant major during the annual training camp?", "Duties")
+    assert strict.get("What are the duties of the cadet sergeant-major during annual training camps") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ChatAnswerCache(ttl_seconds=60)
+    cache.put("What is the NCC motto?", "Unity and Discipline")
+    clock.now += 59
+    assert cache.get("What is the NCC motto?") == "Unity and Discipline"
+    clock.now += 2
+    assert cache.get("What is the NCC motto?") is None
+    assert cache.get("What is the motto of NCC") is None, "expired entries are not fuzzy hits either"
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["evictions"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ChatAnswerCache(max_entries=2, fuzzy=False)
+    cache.put("What is the NCC motto?", "Unity and Discipline")
+    cache.put("When was NCC founded?", "1948")
+    assert cache.get("What is the NCC motto?") == "Unity and Discipline"
+    cache.put("Who heads the NCC?", "The Director General")
+    assert cache.get("When was NCC founded?") is None
+    assert cache.get("What is the NCC motto?") == "Unity and Discipline"
+    assert cache.get("Who heads the NCC?") == "The Director General"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_put_replaces_an_answer_and_clear_empties_the_cache():
+    cache = ChatAnswerCache()
+    cache.put("What is the NCC motto?", "old")
+    cache.put("what is the ncc motto", "Unity and Discipline")
+    assert cache.get("What is the NCC motto?") == "Unity and Discipline"
+    assert cache.stats()["entries"] == 1
+    cache.clear()
+    assert cache.get("What is the NCC motto?") is None
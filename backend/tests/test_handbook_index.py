@@ -0,0 +1,72 @@
+import threading
+import pytest
+from services.handbook_index import HandbookIndex
+
+OLD = ["Drill is the foundation of discipline.", "Map reading needs a compass.", "एकता और अनुशासन"]
+NEW = ["Drill, revised.", "Map reading, revised.", "First aid, revised.", "Camp life, revised."]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    pdf = tmp_path / "handbook.pdf"
+    pdf.write_bytes(b"old edition")
+    texts = {b"old edition": OLD, b"new edition": NEW}
+    monkeypatch.setattr(HandbookIndex, "_extract", staticmethod(lambda path: texts[open(path, "rb").read()]))
+    handbook = HandbookIndex(pdf_path=str(pdf), index_path=str(tmp_path / "handbook_index.bin"))
+    assert handbook.load()
+    return handbook
+
+
+def _publish_new_edition(index):
+    with open(index.pdf_path, "wb") as f:
+        f.write(b"new edition")
+    assert index.load()
+
+
+def test_pages_round_trip_through_the_mapping(index):
+    assert list(index.pages()) == OLD
+    assert index.page_text(3) == OLD[2]
+    with pytest.raises(IndexError):
+        index.page_text(4)
+
+
+def test_unchanged_pdf_is_not_rebuilt(index):
+    reopened = HandbookIndex(pdf_path=index.pdf_path, index_path=index.index_path)
+    assert reopened.load()
+    assert reopened.builds == 0
+    assert list(reopened.pages()) == OLD
+
+
+def test_reload_does_not_pull_the_mapping_from_under_a_reader(index):
+    reading = index.pages()
+    assert next(reading) == OLD[0]
+    _publish_new_edition(index)
+    assert list(reading) == OLD[1:]
+    assert list(index.pages()) == NEW
+    assert index.builds == 2
+
+
+def test_concurrent_reads_survive_reloads(index):
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                index.page_text(1)
+                list(index.pages())
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for edition in (b"new edition", b"old edition") * 10:
+        with open(index.pdf_path, "wb") as f:
+            f.write(edition)
+        index.load()
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
@@ -0,0 +1,113 @@
+import pytest
+import services.handbook_search as search_module
+from services.handbook_search import HandbookSearch, index_term, phonetic_fold, query_terms, stem, transliterate
+
+PAGES = [
+    "Drill is the foundation of discipline. Drill drill drill on the parade ground every morning.",
+    "Map reading: a compass and a map help cadets find direction during a trek.",
+    "Discipline and unity are the NCC motto. A disciplined cadet obeys orders.",
+    "एकता और अनुशासन एनसीसी का आदर्श वाक्य है।",
+    "First aid covers bandages, fractures and burns, with a note on discipline in camp."
+]
+
+
+class FakeHandbookIndex:
+    sha256 = "fake"
+
+    def ensure_loaded(self):
+        return True
+
+    def pages(self):
+        return iter(PAGES)
+
+    def page_text(self, page):
+        return PAGES[page - 1]
+
+
+@pytest.fixture
+def search(monkeypatch):
+    monkeypatch.setattr(search_module, "handbook_index", FakeHandbookIndex())
+    return HandbookSearch()
+
+
+@pytest.mark.parametrize("words, expected", [
+    (("discipline", "disciplined", "disciplines"), "disciplin"),
+    (("organization", "organized", "organizes"), "organiz"),
+    (("agree", "agreed", "agrees"), "agr"),
+    (("run", "running"), "run"),
+    (("duty", "duties"), "duty"),
+])
+def test_inflections_share_a_stem(words, expected):
+    assert {stem(word) for word in words} == {expected}
+
+
+def test_short_words_numbers_and_latin_plurals_are_left_alone():
+    assert stem("map") == "map"
+    assert stem("2024") == "2024"
+    assert stem("focus") == "focus"
+
+
+@pytest.mark.parametrize("devanagari, spoken", [
+    ("एकता", "ektaa"),
+    ("अनुशासन", "anushaasan"),
+    ("समझना", "samajhnaa"),
+    ("भारत", "bhaarat"),
+    ("क़ानून", "qaanuun"),
+])
+def test_transliteration_drops_unspoken_schwas(devanagari, spoken):
+    assert transliterate(devanagari) == spoken
+
+
+@pytest.mark.parametrize("romanized, devanagari", [
+    ("ekta", "एकता"),
+    ("anushasan", "अनुशासन"),
+    ("anushaasan", "अनुशासन"),
+    ("bharat", "भारत"),
+])
+def test_romanized_query_matches_devanagari_term(romanized, devanagari):
+    assert index_term(devanagari) in query_terms(romanized)
+
+
+def test_phonetic_fold_collapses_spelling_variants():
+    assert phonetic_fold("bhaarat") == phonetic_fold("bharat")
+    assert phonetic_fold("sainika") == phonetic_fold("sainik")
+
+
+def test_bm25_ranks_term_frequency_and_short_pages_higher(search):
+    results = search.search("drill")
+    assert [r["page_number"] for r in results] == [1]
+    pages = [r["page_number"] for r in search.search("discipline")]
+    # Page 3 mentions discipline twice (discipline, disciplined); page 1 and 5 once
+    assert pages[0] == 3
+    assert set(pages) == {1, 3, 5}
+    scores = [r["score"] for r in search.search("discipline")]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_rare_terms_outweigh_common_ones(search):
+    results = search.search("discipline compass")
+    assert results[0]["page_number"] == 2
+
+
+def test_page_range_filters_postings(search):
+    assert [r["page_number"] for r in search.search("discipline", page_range=[4, 5])] == [5]
+    assert [r["page_number"] for r in search.search("discipline", page_range=[2, 3, 4])] == [3]
+    # Non-contiguous page lists are honoured too
+    assert sorted(r["page_number"] for r in search.search("discipline", page_range=[1, 5])) == [1, 5]
+
+
+def test_hindi_query_finds_devanagari_page(search):
+    for query in ("ekta", "एकता", "anushasan"):
+        assert [r["page_number"] for r in search.search(query)] == [4]
+
+
+def test_snippet_contains_a_matching_word(search):
+    result = search.search("compass")[0]
+    assert "compass" in result["match_text"]
+    assert result["context"].startswith("Map reading")
+
+
+def test_unknown_and_stopword_queries_return_nothing(search):
+    assert search.search("helicopter") == []
+    assert search.search("the and of") == []
+    assert search.stats()["queries"] == 2
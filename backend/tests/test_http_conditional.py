@@ -0,0 +1,120 @@
+import hashlib
+import pytest
+from email.utils import formatdate
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from services.http_conditional import _etag_matches, conditional_file_response, parse_range
+
+CONTENT = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=-100", (924, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    (" Bytes = 10-19", (10, 19)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    assert parse_range(header, len(CONTENT)) == (-1, -1)
+
+
+@pytest.mark.parametrize("header", ["bytes=5-2", "bytes=0-1,5-6", "items=0-1", "bytes=a-b", "bytes=-x"])
+def test_malformed_or_multiple_ranges_are_ignored(header):
+    assert parse_range(header, len(CONTENT)) is None
+
+
+def test_if_none_match_uses_weak_comparison():
+    assert _etag_matches('"abc"', '"abc"')
+    assert _etag_matches('W/"abc"', '"abc"')
+    assert _etag_matches('"old", "abc"', '"abc"')
+    assert _etag_matches("*", '"abc"')
+    assert not _etag_matches('"old"', '"abc"')
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "handbook.pdf"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.api_route("/file", methods=["GET", "HEAD"])
+    async def serve(request: Request):
+        return conditional_file_response(request, str(path), media_type="application/pdf")
+
+    return TestClient(app)
+
+
+def test_full_response_carries_validators(client):
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "last-modified" in response.headers
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get("/file").headers["etag"]
+    response = client.get("/file", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert client.get("/file", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since(client):
+    future = formatdate(4102444800, usegmt=True)  # 2100
+    assert client.get("/file", headers={"If-Modified-Since": future}).status_code == 304
+    response = client.get("/file", headers={"If-None-Match": '"stale"', "If-Modified-Since": future})
+    assert response.status_code == 200
+
+
+def test_byte_range_is_partial_content(client):
+    response = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == "bytes 100-199/1024"
+    assert response.headers["content-length"] == "100"
+
+
+def test_suffix_range_returns_the_tail(client):
+    response = client.get("/file", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-24:]
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+
+
+@pytest.mark.parametrize("header", ["bytes=4096-", "bytes=1024-", "bytes=-0"])
+def test_unsatisfiable_range_is_416(client, header):
+    response = client.get("/file", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,10-11", "bytes=5-2", "pages=1-2"])
+def test_ignored_ranges_fall_back_to_the_whole_file(client, header):
+    response = client.get("/file", headers={"Range": header})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_if_range_mismatch_sends_the_whole_file(client):
+    etag = client.get("/file").headers["etag"]
+    assert client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"other-version"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_head_range_has_headers_but_no_body(client):
+    response = client.head("/file", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+import services.ocr_service as ocr_module
+from services.ocr_service import OCRService
+
+
+def _crash_worker():
+    os._exit(1)
+
+
+def _square(value):
+    return value * value
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return "late"
+
+
+def test_pool_is_rebuilt_after_a_worker_dies():
+    service = OCRService(workers=1, max_queue=4)
+
+    async def scenario():
+        service._reserve(1)
+        assert await service._run(_crash_worker, default="fallback") == "fallback"
+        assert service.queued == 0
+        service._reserve(1)
+        assert await service._run(_square, 7, default=None) == 49
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
+    assert service.queued == 0
+    assert service.pool_restarts >= 1
+
+
+def test_timed_out_job_keeps_its_slot_until_the_worker_finishes(monkeypatch):
+    service = OCRService(workers=1, max_queue=4)
+
+    async def scenario():
+        # Warm the pool under the normal deadline so a slow worker start-up cannot time out
+        service._reserve(1)
+        assert await service._run(_square, 2, default=None) == 4
+        monkeypatch.setattr(ocr_module, "OCR_JOB_TIMEOUT_SECONDS", 0.5)
+        service._reserve(1)
+        assert await service._run(_sleep, 2, default="timed out") == "timed out"
+        assert service.queued == 1
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            if service.queued == 0:
+                break
+        assert service.queued == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
+    assert service.timeouts == 1
+
+
+def _fake_run(service, started=None):
+    async def run(func, pdf_path, first, last, *args, default):
+        try:
+            if started is not None:
+                started.set()
+                await asyncio.sleep(10)
+            return ["cadet drill"] * (last - first + 1)
+        finally:
+            service._release()
+    return run
+
+
+def test_skipped_ranges_release_their_slots(monkeypatch):
+    monkeypatch.setattr(ocr_module, "OCR_MAX_CHARS", 5)
+    service = OCRService(workers=1, max_queue=4)
+    monkeypatch.setattr(service, "_run", _fake_run(service))
+    texts = asyncio.run(service.ocr_pdf("unused.pdf", 4))
+    assert texts == ["cadet drill", "cadet drill", "", ""]
+    assert service.queued == 0
+    assert service.completed == 1
+    assert service.pages_skipped == 2
+
+
+def test_cancelled_ocr_releases_every_slot(monkeypatch):
+    service = OCRService(workers=1, max_queue=4)
+
+    async def scenario():
+        started = asyncio.Event()
+        monkeypatch.setattr(service, "_run", _fake_run(service, started))
+        task = asyncio.ensure_future(service.ocr_pdf("unused.pdf", 4))
+        await started.wait()
+        assert service.queued == 2
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert service.queued == 0
@@ -0,0 +1,55 @@
+import uuid
+import pytest
+from app_models import QuizQuestion
+from services.question_bank import QuestionBank, apportion
+
+
+@pytest.mark.parametrize("weights, total, expected", [
+    ({"Drill": 1, "Map Reading": 1, "First Aid": 1}, 10, {"Drill": 4, "Map Reading": 3, "First Aid": 3}),
+    ({"Drill": 0.5, "Map Reading": 0.3, "First Aid": 0.2}, 7, {"Drill": 4, "Map Reading": 2, "First Aid": 1}),
+    ({"Drill": 2, "Map Reading": 1}, 6, {"Drill": 4, "Map Reading": 2}),
+    ({"Drill": 3, "Map Reading": 0, "First Aid": -1}, 5, {"Drill": 5, "Map Reading": 0, "First Aid": 0}),
+])
+def test_apportion_uses_largest_remainders(weights, total, expected):
+    counts = apportion(weights, total)
+    assert counts == expected
+    assert sum(counts.values()) == total
+
+
+def test_apportion_without_positive_weights_or_seats_is_empty():
+    assert apportion({"Drill": 0, "Map Reading": 0}, 5) == {"Drill": 0, "Map Reading": 0}
+    assert apportion({"Drill": 1}, 0) == {"Drill": 0}
+
+
+def _unique_question(topic):
+    words = [uuid.uuid4().hex for _ in range(4)]
+    return QuizQuestion(question=" ".join(words), options={letter: uuid.uuid4().hex for letter in "ABCD"},
+                        answer="A", topic=topic, difficulty="Medium")
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = QuestionBank(db_path=str(tmp_path / "question_bank.db"))
+    for topic, count in (("Drill", 10), ("Map Reading", 2), ("First Aid", 10)):
+        assert bank.add([_unique_question(topic) for _ in range(count)], source="test") == count
+    return bank
+
+
+def test_exam_follows_the_blueprint_when_the_bank_covers_it(bank):
+    questions, drawn = bank.assemble_exam({"Drill": 2, "First Aid": 1}, 9)
+    assert drawn == {"Drill": 6, "First Aid": 3}
+    assert len(questions) == 9
+    assert [q.topic for q in questions] == ["Drill"] * 6 + ["First Aid"] * 3
+
+
+def test_exam_shortfall_moves_to_topics_with_spare_questions(bank):
+    # Map Reading's quota is 6 but only 2 are banked; the other 4 seats split 1:1
+    questions, drawn = bank.assemble_exam({"Drill": 1, "Map Reading": 1, "First Aid": 1}, 18)
+    assert drawn == {"Drill": 8, "Map Reading": 2, "First Aid": 8}
+    assert len({q.id for q in questions}) == 18
+
+
+def test_exam_larger_than_the_bank_returns_everything_it_has(bank):
+    questions, drawn = bank.assemble_exam({"Drill": 1, "Map Reading": 1, "Parade": 1}, 30)
+    assert drawn == {"Drill": 10, "Map Reading": 2, "Parade": 0}
+    assert len(questions) == 12
@@ -0,0 +1,85 @@
+import random
+from app_models import QuizQuestion
+from routers.quiz import _shuffle_for_requester
+from services.quiz_session_store import QuizSessionStore
+
+
+def _question(number, answer="B", topic=None, explanation=""):
+    return QuizQuestion(
+        id=f"q{number}",
+        question=f"Question {number}?",
+        options={"A": f"alpha {number}", "B": f"bravo {number}", "C": f"charlie {number}", "D": f"delta {number}"},
+        answer=answer,
+        explanation=explanation,
+        topic=topic
+    )
+
+
+def test_grade_counts_correct_answers_and_reports_wrong_ones():
+    store = QuizSessionStore()
+    store.put("quiz", "Drill", "Easy", [_question(1, "A"), _question(2, "B"), _question(3, "C")])
+    correct, wrong, accuracy = store.get("quiz").grade(["a", " B ", "D"])
+    assert correct == 2
+    assert [(w["question_index"], w["user_answer"], w["correct_answer"]) for w in wrong] == [(2, "D", "C")]
+    assert accuracy == {"Drill": 66.7}
+
+
+def test_missing_and_blank_answers_count_as_wrong():
+    store = QuizSessionStore()
+    store.put("quiz", "Drill", "Easy", [_question(1, "A"), _question(2, "B"), _question(3, "C")])
+    correct, wrong, _ = store.get("quiz").grade(["A", ""])
+    assert correct == 1
+    assert [w["question_index"] for w in wrong] == [1, 2]
+    assert wrong[1]["user_answer"] == ""
+
+
+def test_accuracy_is_reported_per_question_topic():
+    store = QuizSessionStore()
+    questions = [_question(1, "A", "Drill"), _question(2, "A", "Map Reading"), _question(3, "A", "Map Reading")]
+    store.put("exam", "Mock Exam", "Mixed", questions)
+    _, wrong, accuracy = store.get("exam").grade(["A", "A", "B"])
+    assert accuracy == {"Drill": 100.0, "Map Reading": 50.0}
+    assert wrong[0]["topic"] == "Map Reading"
+
+
+def test_expired_sessions_are_not_graded():
+    store = QuizSessionStore(ttl_seconds=-1)
+    store.put("quiz", "Drill", "Easy", [_question(1)])
+    assert store.get("quiz") is None
+    assert store.evictions == 1
+
+
+def test_store_is_bounded():
+    store = QuizSessionStore(max_entries=2)
+    for quiz_id in ("one", "two", "three"):
+        store.put(quiz_id, "Drill", "Easy", [_question(1)])
+    assert store.get("one") is None
+    assert len(store) == 2
+
+
+def test_shuffle_keeps_each_answer_on_its_option_text():
+    random.seed(7)
+    questions = [_question(i, answer) for i, answer in enumerate("ABCDABCD")]
+    shuffled = _shuffle_for_requester(questions)
+    assert sorted(q.id for q in shuffled) == sorted(q.id for q in questions)
+    originals = {q.id: q for q in questions}
+    for question in shuffled:
+        original = originals[question.id]
+        assert sorted(question.options.values()) == sorted(original.options.values())
+        assert question.options[question.answer] == original.options[original.answer]
+
+
+def test_shuffled_quiz_grades_against_its_own_key():
+    random.seed(3)
+    shuffled = _shuffle_for_requester([_question(i, "C") for i in range(6)])
+    store = QuizSessionStore()
+    store.put("quiz", "Drill", "Easy", shuffled)
+    correct, wrong, _ = store.get("quiz").grade([q.answer for q in shuffled])
+    assert correct == 6 and wrong == []
+
+
+def test_options_stay_put_when_the_explanation_names_a_letter():
+    question = _question(1, "B", explanation="Option B is right because ...")
+    shuffled = _shuffle_for_requester([question])[0]
+    assert shuffled.options == question.options
+    assert shuffled.answer == "B"
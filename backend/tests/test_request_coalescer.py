@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from services.request_coalescer import SingleFlight
+
+
+class Work:
+    """Counts calls; each call waits until `release` is set"""
+
+    def __init__(self, result="quiz", error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        callers = [asyncio.create_task(flight.do("drill|easy|5", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flight.stats() == {"in_flight": 1, "started": 1, "coalesced": 4}
+        work.release.set()
+        assert await asyncio.gather(*callers) == ["quiz"] * 5
+        assert work.calls == 1
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        work.release.set()
+        await asyncio.gather(flight.do("drill", work), flight.do("map reading", work))
+        assert work.calls == 2
+        assert flight.stats()["coalesced"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_finished_key_starts_fresh_work():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        work.release.set()
+        await flight.do("drill", work)
+        await flight.do("drill", work)
+        assert work.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    async def scenario():
+        flight, work = SingleFlight(), Work(error=RuntimeError("provider down"))
+        callers = [asyncio.create_task(flight.do("drill", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        work.error = None
+        assert await flight.do("drill", work) == "quiz"
+        assert work.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        leaving = asyncio.create_task(flight.do("drill", work))
+        staying = asyncio.create_task(flight.do("drill", work))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        work.release.set()
+        assert await staying == "quiz"
+        assert work.calls == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,211 @@
+import asyncio
+import pytest
+import services.resilience as resilience_module
+from services.resilience import (
+    CallTimeoutError, CircuitBreaker, CircuitOpenError, NonRetryableError, ResilientCaller
+)
+
+
+class Blocked(NonRetryableError):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience_module, "LLM_RETRY_BASE_DELAY", 0)
+
+
+def _caller(threshold=2, max_retries=2, timeout=1.0):
+    return ResilientCaller(timeout=timeout, max_retries=max_retries,
+                           breaker=CircuitBreaker(failure_threshold=threshold, reset_seconds=30))
+
+
+def _expire_open_period(breaker):
+    breaker.opened_at -= breaker.reset_seconds
+
+
+class Provider:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def test_breaker_cycles_closed_open_half_open_closed():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open
+    assert not breaker.allow()
+
+    _expire_open_period(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow(), "only one probe at a time"
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.consecutive_failures == 0
+    assert breaker.times_opened == 1
+
+
+def test_failed_probe_reopens_immediately():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+    _expire_open_period(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+
+def test_released_probe_lets_the_next_call_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    _expire_open_period(breaker)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_exhausted_call_counts_one_failure():
+    caller = _caller(threshold=2)
+    provider = Provider(RuntimeError("500"), RuntimeError("500"), RuntimeError("500"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(caller.call(provider))
+    assert provider.calls == 3
+    assert caller.retries == 2
+    assert caller.breaker.consecutive_failures == 1
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_success_resets_the_breaker():
+    caller = _caller()
+    caller.breaker.record_failure()
+    assert asyncio.run(caller.call(Provider(RuntimeError("500"), "quiz"))) == "quiz"
+    assert caller.breaker.consecutive_failures == 0
+
+
+def test_open_circuit_fails_fast():
+    caller = _caller(threshold=1, max_retries=0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(caller.call(Provider(RuntimeError("500"))))
+    provider = Provider()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(caller.call(provider))
+    assert provider.calls == 0
+    assert caller.rejected == 1
+
+
+def test_non_retryable_error_is_raised_once_and_not_counted():
+    caller = _caller(threshold=1)
+    provider = Provider(Blocked("safety"))
+    with pytest.raises(Blocked):
+        asyncio.run(caller.call(provider))
+    assert provider.calls == 1
+    assert caller.retries == 0
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_call_deadline_raises_timeout():
+    caller = _caller(max_retries=0, timeout=0.05)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    with pytest.raises(CallTimeoutError):
+        asyncio.run(caller.call(hang))
+    assert caller.timeouts == 1
+
+
+async def _chunks(*items, stall_after=None):
+    for index, item in enumerate(items):
+        if index == stall_after:
+            await asyncio.sleep(1)
+        yield item
+
+
+def _half_open_caller(timeout=1.0):
+    caller = _caller(threshold=1, timeout=timeout)
+    caller.breaker.record_failure()
+    _expire_open_period(caller.breaker)
+    return caller
+
+
+def test_stream_closed_early_still_closes_a_half_open_breaker():
+    caller = _half_open_caller()
+
+    async def scenario():
+        stream = caller.stream(lambda: _chunks("Q1", "Q2", "Q3"))
+        assert await stream.__anext__() == "Q1"
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+    assert caller.calls == 1
+
+
+def test_stream_closed_before_output_releases_the_probe():
+    caller = _half_open_caller(timeout=5)
+    slots = asyncio.Semaphore(1)
+
+    async def scenario():
+        stream = caller.stream(lambda: _chunks("Q1", stall_after=0), slots=slots)
+        task = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+    assert caller.breaker.allow()
+    assert not slots.locked()
+
+
+def test_stalled_stream_times_out_and_counts_a_failure():
+    caller = _caller(threshold=1, timeout=0.05)
+    slots = asyncio.Semaphore(1)
+
+    async def scenario():
+        return [item async for item in caller.stream(lambda: _chunks("Q1", "Q2", stall_after=1), slots=slots)]
+
+    with pytest.raises(CallTimeoutError):
+        asyncio.run(scenario())
+    assert caller.timeouts == 1
+    assert caller.breaker.state == CircuitBreaker.OPEN
+    assert not slots.locked()
+
+
+def test_stream_rejected_while_open():
+    caller = _caller(threshold=1)
+    caller.breaker.record_failure()
+
+    async def scenario():
+        return [item async for item in caller.stream(lambda: _chunks("Q1"))]
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(scenario())
+    assert caller.rejected == 1 and caller.calls == 0
+
+
+def test_stream_that_fails_to_start_frees_its_slot():
+    caller = _caller(threshold=1)
+    slots = asyncio.Semaphore(1)
+
+    def refuse():
+        raise RuntimeError("bad request")
+
+    async def scenario():
+        return [item async for item in caller.stream(refuse, slots=slots)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+    assert not slots.locked()
+    assert caller.breaker.state == CircuitBreaker.OPEN
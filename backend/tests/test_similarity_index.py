@@ -0,0 +1,65 @@
+from services.similarity_index import SimilarityIndex, shingles
+
+# Long enough that one changed word keeps the Jaccard similarity near 0.9, so the
+# per-process hash seed cannot push the estimate below the 0.6 threshold
+QUESTION = ("Which drill command is given to bring a squad from the at ease position back to attention "
+            "before the parade commander begins the general salute on the ceremonial ground")
+OPTIONS = ["Savdhan", "Vishram", "Dahine Salute", "Aaram Se"]
+
+
+def test_shingles_drop_stopwords_and_tag_option_words():
+    grams = shingles("What is the motto of NCC?", ["Unity and Discipline"])
+    assert grams == {"motto", "ncc", "motto ncc", "o:unity", "o:discipline"}
+
+
+def test_identical_question_is_a_duplicate():
+    index = SimilarityIndex()
+    index.add(1, QUESTION, OPTIONS)
+    assert index.find_duplicate(QUESTION, OPTIONS) == 1
+    assert index.similar(QUESTION, OPTIONS) == [(1, 1.0)]
+
+
+def test_option_order_does_not_matter():
+    index = SimilarityIndex()
+    index.add(1, QUESTION, OPTIONS)
+    assert index.find_duplicate(QUESTION, list(reversed(OPTIONS))) == 1
+
+
+def test_reworded_repeat_is_caught():
+    index = SimilarityIndex()
+    index.add(1, QUESTION, OPTIONS)
+    assert index.find_duplicate(QUESTION.replace("ceremonial", "main"), OPTIONS) == 1
+
+
+def test_unrelated_and_loosely_related_questions_pass():
+    index = SimilarityIndex()
+    index.add(1, QUESTION, OPTIONS)
+    assert index.find_duplicate("How many cadets form a section in a camp tent group?", ["6", "8", "10", "12"]) is None
+    # Shares a few words (Jaccard well under 0.6)
+    assert index.find_duplicate("Which command brings a squad to attention?", OPTIONS) is None
+
+
+def test_threshold_is_configurable():
+    strict = SimilarityIndex(threshold=1.01)
+    strict.add(1, QUESTION, OPTIONS)
+    assert strict.find_duplicate(QUESTION, OPTIONS) is None
+
+
+def test_scope_limits_matches():
+    index = SimilarityIndex()
+    index.add("a", QUESTION, OPTIONS, scope="Drill|Easy")
+    assert index.find_duplicate(QUESTION, OPTIONS, scope="Drill|Hard") is None
+    assert index.find_duplicate(QUESTION, OPTIONS, scope="Drill|Easy") == "a"
+    assert index.find_duplicate(QUESTION, OPTIONS) == "a"
+
+
+def test_remove_clears_buckets():
+    index = SimilarityIndex()
+    index.add(1, QUESTION, OPTIONS)
+    index.add(2, QUESTION, OPTIONS)
+    index.remove(1)
+    assert index.find_duplicate(QUESTION, OPTIONS) == 2
+    index.remove(2)
+    assert index.find_duplicate(QUESTION, OPTIONS) is None
+    assert len(index) == 0
+    assert index.stats()["buckets"] == 0
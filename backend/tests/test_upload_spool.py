@@ -0,0 +1,56 @@
+import os
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+import services.upload_spool as spool_module
+from services.upload_spool import UploadSizeLimitMiddleware, UploadTooLargeError, spool_upload
+
+LIMIT = 1024
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool_module, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(spool_module, "UPLOAD_FORM_OVERHEAD_BYTES", 512)
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=LIMIT)
+    app.state.handled = 0
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        app.state.handled += 1
+        try:
+            with await spool_upload(file, max_bytes=LIMIT) as spooled:
+                return {"size": spooled.size, "digest": spooled.digest}
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+    return app
+
+
+def test_upload_under_the_limit_is_spooled_and_cleaned_up(app, tmp_path):
+    response = TestClient(app).post("/upload", files={"file": ("notes.txt", b"x" * LIMIT)})
+    assert response.status_code == 200
+    assert response.json()["size"] == LIMIT
+    assert os.listdir(tmp_path) == []
+
+
+def test_declared_oversized_upload_is_refused_before_the_handler(app):
+    response = TestClient(app).post("/upload", files={"file": ("scan.pdf", b"x" * (LIMIT * 4))})
+    assert response.status_code == 413
+    assert "upload limit" in response.json()["detail"]
+    assert app.state.handled == 0
+
+
+def test_oversized_upload_without_length_hits_the_spool_backstop(app, tmp_path):
+    boundary = "limit-test"
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"scan.pdf\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n").encode() + b"x" * (LIMIT * 4) + f"\r\n--{boundary}--\r\n".encode()
+    response = TestClient(app).post(
+        "/upload",
+        content=iter([body[:100], body[100:]]),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert response.status_code == 413
+    assert app.state.handled == 1
+    assert os.listdir(tmp_path) == []